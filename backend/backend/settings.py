@@ -26,6 +26,10 @@ load_dotenv(os.path.join(BASE_DIR, '.env')) # Load .env file
 SECRET_KEY = 'django-insecure-*&u8g3=m0jz&wsy54^=*lu^&1tpb(jse_z#whvgv@q8f_pf4p+'
 SYSTEM_ED25519_PRIVATE_KEY_B64 = os.environ.get('SYSTEM_ED25519_PRIVATE_KEY_B64')
 SYSTEM_ED25519_PUBLIC_KEY_B64 = os.environ.get('SYSTEM_ED25519_PUBLIC_KEY_B64')
+# Optional JSON key ring for rotating the results signing key without a restart (see crypto_utils.load_system_key_ring):
+# {"active_key_id": "...", "keys": [{"private_key_b64": "...", "public_key_b64": "..."}, {"public_key_b64": "..."}]}
+SYSTEM_ED25519_KEYRING_FILE = os.environ.get('SYSTEM_ED25519_KEYRING_FILE')
+SYSTEM_ED25519_KEYRING_CHECK_SECONDS = int(os.environ.get('SYSTEM_ED25519_KEYRING_CHECK_SECONDS', 10)) # How often the file is checked for changes
 
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = False
@@ -193,3 +197,61 @@ EMAIL_HOST_PASSWORD = 'gtcy zvhk orox mpfu' # The app password you generated (OR
 DEFAULT_FROM_EMAIL = 'E-Voting System <evotingsystemtest@gmail.com>' # What users see as sender
 
 FRONTEND_URL = 'https://gtuevoting.com' # Change for production
+
+# --- Caching ---
+# Parsed election public keys kept per process (least recently used are evicted)
+ELECTION_PUBLIC_KEY_CACHE_SIZE = int(os.environ.get('ELECTION_PUBLIC_KEY_CACHE_SIZE', 256))
+# Election state (voting window, candidates, key id) used by the vote paths: 'local' (per process LRU)
+# or 'django' (the cache framework alias below, shared between workers)
+ELECTION_CACHE_BACKEND = os.environ.get('ELECTION_CACHE_BACKEND', 'local')
+ELECTION_CACHE_ALIAS = os.environ.get('ELECTION_CACHE_ALIAS', 'default')
+ELECTION_CACHE_SIZE = int(os.environ.get('ELECTION_CACHE_SIZE', 1024))
+ELECTION_CACHE_TIMEOUT = int(os.environ.get('ELECTION_CACHE_TIMEOUT', 30)) # Seconds; bounds staleness across workers
+# Rendered results of closed elections (same backend as the election state cache; see voting/results_cache.py)
+RESULTS_CACHE_SIZE = int(os.environ.get('RESULTS_CACHE_SIZE', 256))
+RESULTS_MAX_AGE = int(os.environ.get('RESULTS_MAX_AGE', 0)) # Cache-Control max-age; 0 makes clients revalidate with their ETag
+
+# --- Election key pool ---
+# Pre-generated RSA key pairs so creating an election does not wait on key generation (0 disables the pool)
+ELECTION_KEY_POOL_SIZE = int(os.environ.get('ELECTION_KEY_POOL_SIZE', 10))
+ELECTION_KEY_POOL_LOW_WATERMARK = int(os.environ.get('ELECTION_KEY_POOL_LOW_WATERMARK', 3))
+# Secret the pooled private keys are encrypted under in the database (default: derived from SECRET_KEY).
+# Keep it out of the database and its backups; changing it discards the keys already pooled.
+ELECTION_KEY_POOL_SECRET = os.environ.get('ELECTION_KEY_POOL_SECRET')
+
+# --- Client-side ballot encryption ---
+# Largest encrypted ballot accepted from a voter's device (binary ballot format, before base64)
+CLIENT_BALLOT_MAX_BYTES = int(os.environ.get('CLIENT_BALLOT_MAX_BYTES', 4096))
+
+# --- Ballot storage ---
+# 'database': ballots are stored in Ballot.encrypted_vote_data. 'log': ballots are appended to per-election
+# segment files under BALLOT_LOG_DIR and the Ballot row only records where (see voting/ballot_log.py)
+BALLOT_STORE = os.environ.get('BALLOT_STORE', 'database')
+BALLOT_LOG_DIR = os.environ.get('BALLOT_LOG_DIR', os.path.join(BASE_DIR, 'ballot_log'))
+BALLOT_LOG_SEGMENT_BYTES = int(os.environ.get('BALLOT_LOG_SEGMENT_BYTES', 64 * 1024 * 1024)) # A new segment is started past this size
+
+# --- Vote ingestion ---
+# 'direct': each reveal stores its vote in its own transaction. 'group': reveals are handed to one writer
+# thread per process that stores them in batches (one transaction per batch), fewer SQLite write locks/fsyncs
+VOTE_INGEST_MODE = os.environ.get('VOTE_INGEST_MODE', 'direct')
+VOTE_INGEST_BATCH_SIZE = int(os.environ.get('VOTE_INGEST_BATCH_SIZE', 64)) # Most votes per batch
+VOTE_INGEST_MAX_DELAY_MS = int(os.environ.get('VOTE_INGEST_MAX_DELAY_MS', 5)) # Longest a batch waits to fill up
+
+# --- Tallying ---
+# Number of processes used to decrypt ballots in tally-and-sign-results (1 = decrypt inline)
+TALLY_WORKERS = int(os.environ.get('TALLY_WORKERS', os.cpu_count() or 1))
+# Number of ballots handed to a tally worker at a time
+TALLY_CHUNK_SIZE = int(os.environ.get('TALLY_CHUNK_SIZE', 500))
+# Background threads (per web server process) that run queued tally jobs
+TALLY_JOB_THREADS = int(os.environ.get('TALLY_JOB_THREADS', 1))
+# A running tally job with no progress for this long is considered dead
+TALLY_JOB_STALE_SECONDS = int(os.environ.get('TALLY_JOB_STALE_SECONDS', 300))
+# Rows the running encrypted sum of an ElGamal election is spread over (fewer rows = more lock contention)
+ELECTION_AGGREGATE_SHARDS = int(os.environ.get('ELECTION_AGGREGATE_SHARDS', 8))
+# Rows the commitment/ballot/decryption error counters of an election are spread over
+ELECTION_COUNTER_SHARDS = int(os.environ.get('ELECTION_COUNTER_SHARDS', 8))
+
+# --- Election listing ---
+# Elections per page of the voters' election list (clients may ask for up to 100 with ?page_size=)
+ELECTION_LIST_PAGE_SIZE = int(os.environ.get('ELECTION_LIST_PAGE_SIZE', 20))
+
@@ -0,0 +1,191 @@
+# backend/e_voting/ballot_format.py
+"""
+Binary storage format for encrypted ballots (Ballot.encrypted_vote_data).
+
+Every ballot starts with a fixed 14-byte header:
+
+    offset  size  field
+    0       1     format version (BALLOT_FORMAT_VERSION)
+    1       1     scheme code (see SCHEME_CODES)
+    2       8     key id: first 8 bytes of the election public key's SHA-256 fingerprint
+    10      1     IV length
+    11      1     tag length
+    12      2     wrapped key length (big endian)
+
+followed by the scheme's body:
+
+    rsa-aes-gcm      wrapped AES key | IV | GCM tag | AES-GCM ciphertext (rest of the ballot)
+    x25519-aes-gcm   same layout, with the 32-byte ephemeral X25519 public key as the wrapped key
+    ec-elgamal-p256  one 134-byte entry per candidate: candidate id (4 bytes, big endian),
+                     C1 and C2 as 65-byte SEC1 uncompressed points (all zero for infinity)
+
+parse_ballot() slices the fields out of a memoryview, so reading a ballot
+copies nothing. Ballots stored before this format existed are JSON objects of
+base64 fields; they always start with '{', which is never a valid version
+byte, and parse_ballot() still accepts them.
+"""
+import base64
+import json
+import struct
+from collections import namedtuple
+
+from .crypto_utils import crypto_utils, SCHEME_RSA_AES_GCM, SCHEME_EC_ELGAMAL, SCHEME_X25519_AES_GCM
+
+BALLOT_FORMAT_VERSION = 1
+HEADER = struct.Struct('>BB8sBBH')
+KEY_ID_LENGTH = 8
+POINT_LENGTH = 65
+ELGAMAL_ENTRY = struct.Struct('>I')
+ELGAMAL_ENTRY_LENGTH = ELGAMAL_ENTRY.size + 2 * POINT_LENGTH
+
+SCHEME_CODES = {
+    SCHEME_RSA_AES_GCM: 1,
+    SCHEME_EC_ELGAMAL: 2,
+    SCHEME_X25519_AES_GCM: 3,
+}
+# Schemes whose body is wrapped key | IV | tag | ciphertext
+HYBRID_SCHEMES = {SCHEME_RSA_AES_GCM, SCHEME_X25519_AES_GCM}
+SCHEMES_BY_CODE = {code: scheme for scheme, code in SCHEME_CODES.items()}
+
+# key_id is None for legacy JSON ballots, which do not record their key.
+# Hybrid ballots fill encrypted_key (the ephemeral public key for X25519)
+# and iv/tag/ciphertext; ElGamal ballots fill
+# ciphertexts with (candidate_id, C1 bytes, C2 bytes) triples.
+ParsedBallot = namedtuple(
+    'ParsedBallot',
+    ['scheme', 'key_id', 'encrypted_key', 'iv', 'tag', 'ciphertext', 'ciphertexts']
+)
+
+
+def key_id(public_key):
+    """Short identifier of an election public key, stored in every ballot header."""
+    return bytes.fromhex(crypto_utils.public_key_fingerprint(public_key))[:KEY_ID_LENGTH]
+
+
+def _point(encoded):
+    # _ec_encode writes the point at infinity as one zero byte; pad it to the fixed width
+    return encoded.ljust(POINT_LENGTH, b'\x00')
+
+
+def encode_ballot(scheme, ballot_key_id, payload):
+    """
+    Encode an encrypted ballot, as returned by crypto_utils.encrypt_vote or
+    encrypt_vote_homomorphic, in the binary format.
+    """
+    if scheme in HYBRID_SCHEMES:
+        encrypted_key = base64.b64decode(payload['ephemeral_public_key' if scheme == SCHEME_X25519_AES_GCM else 'encrypted_key'])
+        iv = base64.b64decode(payload['iv'])
+        tag = base64.b64decode(payload['tag'])
+        header = HEADER.pack(BALLOT_FORMAT_VERSION, SCHEME_CODES[scheme], ballot_key_id, len(iv), len(tag), len(encrypted_key))
+        return b''.join((header, encrypted_key, iv, tag, base64.b64decode(payload['ciphertext'])))
+    if scheme == SCHEME_EC_ELGAMAL:
+        if len(payload['candidate_ids']) != len(payload['ciphertexts']):
+            raise ValueError("Ballot candidate list does not match its ciphertexts.")
+        parts = [HEADER.pack(BALLOT_FORMAT_VERSION, SCHEME_CODES[scheme], ballot_key_id, 0, 0, 0)]
+        for candidate_id, (c1, c2) in zip(payload['candidate_ids'], payload['ciphertexts']):
+            parts.append(ELGAMAL_ENTRY.pack(candidate_id))
+            parts.append(_point(base64.b64decode(c1)))
+            parts.append(_point(base64.b64decode(c2)))
+        return b''.join(parts)
+    raise ValueError(f"Unknown ballot encryption scheme '{scheme}'.")
+
+
+def _parse_legacy_ballot(data):
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    payload = json.loads(data)
+    if payload.get('scheme') == SCHEME_EC_ELGAMAL:
+        candidate_ids = payload['candidate_ids']
+        if len(candidate_ids) != len(payload['ciphertexts']):
+            raise ValueError("Ballot candidate list does not match its ciphertexts.")
+        return ParsedBallot(SCHEME_EC_ELGAMAL, None, None, None, None, None, [
+            (candidate_id, base64.b64decode(c1), base64.b64decode(c2))
+            for candidate_id, (c1, c2) in zip(candidate_ids, payload['ciphertexts'])
+        ])
+    if 'scheme' in payload:
+        raise ValueError(f"Unknown ballot encryption scheme '{payload['scheme']}'.")
+    return ParsedBallot(
+        SCHEME_RSA_AES_GCM, None,
+        base64.b64decode(payload['encrypted_key']),
+        base64.b64decode(payload['iv']),
+        base64.b64decode(payload['tag']),
+        base64.b64decode(payload['ciphertext']),
+        None
+    )
+
+
+def parse_ballot(data):
+    """
+    Parse a stored ballot (binary or legacy JSON, as bytes, memoryview or str)
+    into a ParsedBallot. Binary ballots are returned as memoryview slices of
+    `data`. Raises ValueError on malformed ballots.
+    """
+    if isinstance(data, str):
+        data = data.encode()
+    view = memoryview(data)
+    if not len(view):
+        raise ValueError("Empty ballot.")
+    if view[0] == ord('{'):
+        return _parse_legacy_ballot(view)
+    if len(view) < HEADER.size:
+        raise ValueError("Ballot is shorter than its header.")
+
+    version, scheme_code, ballot_key_id, iv_length, tag_length, key_length = HEADER.unpack_from(view)
+    if version != BALLOT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported ballot format version {version}.")
+    scheme = SCHEMES_BY_CODE.get(scheme_code)
+    body = view[HEADER.size:]
+
+    if scheme in HYBRID_SCHEMES:
+        iv_start = key_length
+        tag_start = iv_start + iv_length
+        ciphertext_start = tag_start + tag_length
+        if len(body) < ciphertext_start:
+            raise ValueError("Ballot is shorter than its header declares.")
+        return ParsedBallot(
+            scheme, ballot_key_id,
+            body[:iv_start], body[iv_start:tag_start], body[tag_start:ciphertext_start], body[ciphertext_start:],
+            None
+        )
+    if scheme == SCHEME_EC_ELGAMAL:
+        if len(body) % ELGAMAL_ENTRY_LENGTH:
+            raise ValueError("ElGamal ballot body is not a whole number of entries.")
+        ciphertexts = []
+        for offset in range(0, len(body), ELGAMAL_ENTRY_LENGTH):
+            c1_start = offset + ELGAMAL_ENTRY.size
+            c2_start = c1_start + POINT_LENGTH
+            ciphertexts.append((
+                ELGAMAL_ENTRY.unpack_from(body, offset)[0],
+                body[c1_start:c2_start],
+                body[c2_start:c2_start + POINT_LENGTH]
+            ))
+        return ParsedBallot(scheme, ballot_key_id, None, None, None, None, ciphertexts)
+    raise ValueError(f"Unknown ballot scheme code {scheme_code}.")
+
+
+GCM_IV_LENGTHS = (12, 16)
+GCM_TAG_LENGTH = 16
+
+
+def check_hybrid_ballot(data, scheme, expected_key_id, wrapped_key_length, max_size):
+    """
+    Structural checks for a hybrid ballot encrypted by someone else (e.g. a
+    voter's device): size, binary format, scheme, key id and field lengths.
+    No decryption is attempted. Returns the ParsedBallot; raises ValueError.
+    """
+    if len(data) > max_size:
+        raise ValueError(f"Ballot is larger than {max_size} bytes.")
+    if data[:1] == b'{':
+        raise ValueError("Ballot must use the binary ballot format.")
+    ballot = parse_ballot(data)
+    if ballot.scheme != scheme or scheme not in HYBRID_SCHEMES:
+        raise ValueError(f"Ballot uses scheme '{ballot.scheme}', expected '{scheme}'.")
+    if ballot.key_id != expected_key_id:
+        raise ValueError("Ballot was encrypted for a different election key.")
+    if len(ballot.encrypted_key) != wrapped_key_length:
+        raise ValueError(f"Ballot key field must be {wrapped_key_length} bytes.")
+    if len(ballot.iv) not in GCM_IV_LENGTHS or len(ballot.tag) != GCM_TAG_LENGTH:
+        raise ValueError("Ballot IV or tag has an invalid length.")
+    if not len(ballot.ciphertext):
+        raise ValueError("Ballot ciphertext is empty.")
+    return ballot
@@ -5,12 +5,325 @@ from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey, Ed25519PublicKey
-from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.asymmetric import rsa, ec
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey, X25519PublicKey
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from collections import namedtuple
+from functools import lru_cache
+from math import isqrt
+from types import MappingProxyType
+import logging
 import os
+import threading
+import time
+import hashlib
+import hmac
 import json
 import base64
+import struct
 from datetime import datetime
 from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+# Ballot encryption schemes (stored on Election.encryption_scheme)
+SCHEME_RSA_AES_GCM = 'rsa-aes-gcm'
+SCHEME_EC_ELGAMAL = 'ec-elgamal-p256'
+SCHEME_X25519_AES_GCM = 'x25519-aes-gcm'
+
+# HKDF context for X25519 ballot keys; changing it makes existing ballots undecryptable
+_X25519_HKDF_INFO = b'e-voting ballot x25519-aes-gcm v1'
+
+# --- Vote commitments ---
+# Version 1 commitments are the Base64 SHA3-256 of json.dumps({'vote': ..., 'nonce': ...}),
+# which depends on key order and on ids being ints or strings. Version 2 commitments are the
+# raw 32-byte SHA3-256 of a fixed binary encoding:
+#     version (1) | election id (8) | kind (1) | candidate id (8) or ballot SHA-256 (32) | nonce (UTF-8)
+# hashed after a domain prefix. Changing any of this makes existing commitments unverifiable.
+COMMITMENT_VERSION = 2
+COMMITMENT_DIGEST_SIZE = 32
+_COMMITMENT_HEADER = struct.Struct('>BQB') # version, election id, kind
+_COMMITMENT_CANDIDATE = 1
+_COMMITMENT_BALLOT_DIGEST = 2
+_COMMITMENT_HASH = hashlib.sha3_256(b'e-voting vote commitment v2\x00') # Copied for each commitment
+
+# --- NIST P-256 arithmetic for exponential ElGamal ---
+# The cryptography library does not expose EC point addition, so the
+# homomorphic scheme does its own arithmetic in Jacobian coordinates
+# (X, Y, Z) ~ (X/Z^2, Y/Z^3); Z == 0 is the point at infinity.
+_P256_P = 0xffffffff00000001000000000000000000000000ffffffffffffffffffffffff
+_P256_B = 0x5ac635d8aa3a93e7b3ebbd55769886bc651d06b0cc53b0f63bce3c3e27d2604b
+_P256_N = 0xffffffff00000000ffffffffffffffffbce6faada7179e84f3b9cac2fc632551
+_P256_G = (
+    0x6b17d1f2e12c4247f8bce6e563a440f277037d812deb33a0f4a13945d898c296,
+    0x4fe342e2fe1a7f9b8ee7eb4a7c0f9e162bce33576b315ececbb6406837bf51f5,
+    1
+)
+_INFINITY = (1, 1, 0)
+_WINDOW_BITS = 4
+
+
+def _ec_double(point):
+    x1, y1, z1 = point
+    if not z1 or not y1:
+        return _INFINITY
+    p = _P256_P
+    delta = z1 * z1 % p
+    gamma = y1 * y1 % p
+    beta = x1 * gamma % p
+    alpha = 3 * (x1 - delta) * (x1 + delta) % p
+    x3 = (alpha * alpha - 8 * beta) % p
+    z3 = ((y1 + z1) ** 2 - gamma - delta) % p
+    y3 = (alpha * (4 * beta - x3) - 8 * gamma * gamma) % p
+    return (x3, y3, z3)
+
+
+def _ec_add(point1, point2):
+    x1, y1, z1 = point1
+    x2, y2, z2 = point2
+    if not z1:
+        return point2
+    if not z2:
+        return point1
+    p = _P256_P
+    z1z1 = z1 * z1 % p
+    z2z2 = z2 * z2 % p
+    u1 = x1 * z2z2 % p
+    u2 = x2 * z1z1 % p
+    s1 = y1 * z2 * z2z2 % p
+    s2 = y2 * z1 * z1z1 % p
+    h = (u2 - u1) % p
+    r = (s2 - s1) % p
+    if not h:
+        return _ec_double(point1) if not r else _INFINITY
+    i = 4 * h * h % p
+    j = h * i % p
+    r = 2 * r % p
+    v = u1 * i % p
+    x3 = (r * r - j - 2 * v) % p
+    y3 = (r * (v - x3) - 2 * s1 * j) % p
+    z3 = ((z1 + z2) ** 2 - z1z1 - z2z2) * h % p
+    return (x3, y3, z3)
+
+
+def _ec_negate(point):
+    x, y, z = point
+    return (x, (-y) % _P256_P, z)
+
+
+def _ec_swap(swap, point1, point2):
+    """(point2, point1) if swap == 1 else (point1, point2), chosen with masks rather than a branch."""
+    mask = -swap
+    swapped = []
+    for a, b in zip(point1, point2):
+        t = mask & (a ^ b)
+        swapped.append((a ^ t, b ^ t))
+    return tuple(a for a, _ in swapped), tuple(b for _, b in swapped)
+
+
+def _ec_multiply(point, scalar):
+    """
+    scalar * point for secret scalars (the ElGamal private key), by a Montgomery ladder:
+    every bit costs one addition and one doubling, and the bit only picks, through
+    _ec_swap, which of the two running points each goes to. The scalar is first
+    replaced by scalar + N or scalar + 2N, whichever has bit 256 set, so the ladder
+    always runs over 257 bits and the key's bit length doesn't show either.
+
+    Python integers make no timing guarantees, so this removes the key-dependent
+    branches and additions, not every key-dependent timing difference: keep
+    decryption off request paths (it only runs in tally jobs).
+    """
+    scalar %= _P256_N
+    padded = scalar + _P256_N
+    padded += _P256_N * (1 - (padded >> 256)) # Bit 256 set either way
+    r0, r1 = point, _ec_double(point)
+    for i in range(255, -1, -1):
+        bit = (padded >> i) & 1
+        r0, r1 = _ec_swap(bit, r0, r1)
+        r0, r1 = _ec_double(r0), _ec_add(r0, r1)
+        r0, r1 = _ec_swap(bit, r0, r1)
+    return r0
+
+
+@lru_cache(maxsize=64)
+def _fixed_base_table(affine_point):
+    """table[j][d] = d * 16^j * P, so a scalar multiple of P costs ~64 additions."""
+    table = []
+    base = (affine_point[0], affine_point[1], 1)
+    for _ in range(0, 256, _WINDOW_BITS):
+        row = [_INFINITY]
+        for _ in range((1 << _WINDOW_BITS) - 1):
+            row.append(_ec_add(row[-1], base))
+        table.append(row)
+        base = _ec_add(row[-1], base)
+    return table
+
+
+def _ec_multiply_fixed(affine_point, scalar):
+    scalar %= _P256_N
+    result = _INFINITY
+    mask = (1 << _WINDOW_BITS) - 1
+    for row in _fixed_base_table(affine_point):
+        digit = scalar & mask
+        if digit:
+            result = _ec_add(result, row[digit])
+        scalar >>= _WINDOW_BITS
+    return result
+
+
+def _ec_to_affine(point):
+    x, y, z = point
+    if not z:
+        return None
+    z_inv = pow(z, -1, _P256_P)
+    z_inv2 = z_inv * z_inv % _P256_P
+    return (x * z_inv2 % _P256_P, y * z_inv2 * z_inv % _P256_P)
+
+
+def _ec_encode(point):
+    """SEC1 uncompressed encoding (65 bytes); the point at infinity is a single zero byte."""
+    affine = _ec_to_affine(point)
+    if affine is None:
+        return b'\x00'
+    return b'\x04' + affine[0].to_bytes(32, 'big') + affine[1].to_bytes(32, 'big')
+
+
+def _ec_decode(data):
+    """Decode a SEC1 uncompressed point (bytes or memoryview); all-zero input is the point at infinity."""
+    if data[:1] == b'\x00' and not any(data):
+        return _INFINITY
+    if len(data) != 65 or data[0] != 4:
+        raise ValueError("Invalid encoded P-256 point.")
+    x = int.from_bytes(data[1:33], 'big')
+    y = int.from_bytes(data[33:], 'big')
+    p = _P256_P
+    if x >= p or y >= p or (y * y - (x * x * x - 3 * x + _P256_B)) % p:
+        raise ValueError("Point is not on the P-256 curve.")
+    return (x, y, 1)
+
+
+_G_AFFINE = _P256_G[:2]
+
+# --- System signing keys ---
+# The Ed25519 keys that sign tallied results, parsed once into an immutable SystemKeyRing with
+# the raw and Base64 public keys precomputed. Keys are identified by the first 16 hex digits of
+# the SHA-256 of their DER SubjectPublicKeyInfo. private_key is None for keys that only verify.
+SystemSigningKey = namedtuple('SystemSigningKey', ['key_id', 'private_key', 'public_key', 'public_key_bytes', 'public_key_b64'])
+
+
+def load_system_signing_key(private_key_b64=None, public_key_b64=None):
+    if private_key_b64:
+        private_key = Ed25519PrivateKey.from_private_bytes(base64.b64decode(private_key_b64))
+        public_key = private_key.public_key()
+    elif public_key_b64:
+        private_key = None
+        public_key = Ed25519PublicKey.from_public_bytes(base64.b64decode(public_key_b64))
+    else:
+        raise ValueError("A system key needs a private or a public key.")
+    public_key_bytes = public_key.public_bytes(encoding=serialization.Encoding.Raw, format=serialization.PublicFormat.Raw)
+    if public_key_b64 and base64.b64decode(public_key_b64) != public_key_bytes:
+        raise ValueError("System Ed25519 public key does not match its private key.")
+    key_id = hashlib.sha256(public_key.public_bytes(
+        encoding=serialization.Encoding.DER,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    )).hexdigest()[:16]
+    return SystemSigningKey(key_id, private_key, public_key, public_key_bytes, base64.b64encode(public_key_bytes).decode())
+
+
+class SystemKeyRing:
+    """System Ed25519 keys by key id. The active key signs; the others are kept to verify older signatures."""
+    def __init__(self, keys, active_key_id=None):
+        self.keys = MappingProxyType({key.key_id: key for key in keys})
+        if active_key_id is not None and active_key_id not in self.keys:
+            raise ValueError(f"Active system key {active_key_id} is not in the key ring.")
+        self.active = self.keys.get(active_key_id)
+
+    def get(self, key_id=None):
+        """The key with this id, or the active key when key_id is None. None if there is no such key."""
+        return self.active if key_id is None else self.keys.get(key_id)
+
+
+def load_system_key_ring(private_key_b64=None, public_key_b64=None, keyring_file=None):
+    """
+    Key ring of the key in SYSTEM_ED25519_PRIVATE_KEY_B64/PUBLIC_KEY_B64 and those in the optional
+    SYSTEM_ED25519_KEYRING_FILE, a JSON object
+    {"active_key_id": ..., "keys": [{"private_key_b64": ..., "public_key_b64": ...}, ...]}.
+    The file's active_key_id, if any, takes precedence over the settings key.
+    """
+    keys = []
+    active_key_id = None
+    if private_key_b64 or public_key_b64:
+        settings_key = load_system_signing_key(private_key_b64, public_key_b64)
+        keys.append(settings_key)
+        active_key_id = settings_key.key_id
+    if keyring_file:
+        with open(keyring_file) as f:
+            keyring = json.load(f)
+        keys.extend(load_system_signing_key(entry.get('private_key_b64'), entry.get('public_key_b64')) for entry in keyring.get('keys', []))
+        active_key_id = keyring.get('active_key_id') or active_key_id
+    return SystemKeyRing(keys, active_key_id)
+
+
+class SystemKeyRingLoader:
+    """
+    Holds the current SystemKeyRing. The key settings and the key ring file are checked at most
+    every SYSTEM_ED25519_KEYRING_CHECK_SECONDS, and a new ring is loaded if either changed, so keys
+    can be rotated without a restart. A ring that fails to load keeps the previous one in use; the
+    error is logged, and the load is retried (and logged again) at every check until it succeeds.
+    """
+    def __init__(self):
+        self._ring = None
+        self._loaded_from = None # (settings, key ring file mtime) the ring was loaded from
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def _settings(self):
+        return (
+            getattr(settings, 'SYSTEM_ED25519_PRIVATE_KEY_B64', None),
+            getattr(settings, 'SYSTEM_ED25519_PUBLIC_KEY_B64', None),
+            getattr(settings, 'SYSTEM_ED25519_KEYRING_FILE', None),
+        )
+
+    def expire(self):
+        """Check for changed keys on the next get()"""
+        self._next_check = 0.0
+
+    def get(self):
+        if time.monotonic() < self._next_check:
+            return self._ring
+        with self._lock:
+            key_settings = self._settings()
+            keyring_file = key_settings[2]
+            try:
+                mtime = os.stat(keyring_file).st_mtime_ns if keyring_file else None
+            except OSError:
+                mtime = None
+            self._next_check = time.monotonic() + getattr(settings, 'SYSTEM_ED25519_KEYRING_CHECK_SECONDS', 10)
+            if self._loaded_from != (key_settings, mtime):
+                try:
+                    self._ring = load_system_key_ring(*key_settings)
+                except (OSError, ValueError) as e:
+                    if self._ring is None:
+                        self._next_check = 0.0
+                        raise
+                    logger.error(
+                        "Error reloading the system key ring from %s, keeping the current keys: %s",
+                        keyring_file or 'settings', e, exc_info=True
+                    )
+                else:
+                    self._loaded_from = (key_settings, mtime)
+            return self._ring
+
+
+system_key_rings = SystemKeyRingLoader()
+
+
+@receiver(setting_changed)
+def _expire_system_key_ring(setting, **kwargs):
+    if setting.startswith('SYSTEM_ED25519_'):
+        system_key_rings.expire()
 
 class CryptoUtils:
     def __init__(self):
@@ -36,21 +349,47 @@ class CryptoUtils:
         public_key = private_key.public_key()
         return private_key, public_key
 
+    def generate_elgamal_key_pair(self):
+        """Generate a P-256 key pair for exponential ElGamal ballots"""
+        private_key = ec.generate_private_key(ec.SECP256R1(), backend=self.backend)
+        return private_key, private_key.public_key()
+
+    def generate_x25519_key_pair(self):
+        """Generate an X25519 key pair for ECIES ballots"""
+        private_key = X25519PrivateKey.generate()
+        return private_key, private_key.public_key()
+
+    def generate_election_key_pair(self, scheme=SCHEME_RSA_AES_GCM):
+        """Generate the election key pair for a ballot encryption scheme"""
+        if scheme == SCHEME_EC_ELGAMAL:
+            return self.generate_elgamal_key_pair()
+        if scheme == SCHEME_X25519_AES_GCM:
+            return self.generate_x25519_key_pair()
+        return self.generate_rsa_key_pair()
+
+    def _canonical_json(self, data):
+        """JSON with sorted keys and no whitespace, so equal data always signs the same bytes"""
+        return json.dumps(data, sort_keys=True, separators=(',', ':')).encode()
+
     def sign_data(self, data, private_key):
         """Sign data using Ed25519"""
-        signature = private_key.sign(json.dumps(data).encode())
+        signature = private_key.sign(self._canonical_json(data))
         return base64.b64encode(signature).decode()
 
     def verify_signature(self, data, signature, public_key):
         """Verify Ed25519 signature"""
         try:
-            public_key.verify(
-                base64.b64decode(signature),
-                json.dumps(data).encode()
-            )
-            return True
+            signature = base64.b64decode(signature)
         except Exception:
             return False
+        # Signatures made before canonical JSON covered plain json.dumps(data)
+        for message in (self._canonical_json(data), json.dumps(data).encode()):
+            try:
+                public_key.verify(signature, message)
+                return True
+            except Exception:
+                continue
+        return False
 
     def encrypt_vote(self, vote_data, public_key):
         """Encrypt vote data using hybrid encryption (RSA + AES)"""
@@ -88,10 +427,19 @@ class CryptoUtils:
 
     def decrypt_vote(self, encrypted_data, private_key):
         """Decrypt vote data using RSA private key"""
-        # Decrypt the AES key
-        encrypted_key = base64.b64decode(encrypted_data['encrypted_key'])
+        return self.decrypt_vote_parts(
+            base64.b64decode(encrypted_data['encrypted_key']),
+            base64.b64decode(encrypted_data['iv']),
+            base64.b64decode(encrypted_data['ciphertext']),
+            base64.b64decode(encrypted_data['tag']),
+            private_key
+        )
+
+    def decrypt_vote_parts(self, encrypted_key, iv, ciphertext, tag, private_key):
+        """Decrypt a hybrid ballot from its raw fields (bytes or memoryview slices)"""
+        # Decrypt the AES key. The RSA key and GCM tag must be bytes; IV and ciphertext can stay views.
         aes_key = private_key.decrypt(
-            encrypted_key,
+            bytes(encrypted_key),
             padding.OAEP(
                 mgf=padding.MGF1(algorithm=hashes.SHA256()),
                 algorithm=hashes.SHA256(),
@@ -100,13 +448,9 @@ class CryptoUtils:
         )
 
         # Decrypt the vote data
-        iv = base64.b64decode(encrypted_data['iv'])
-        ciphertext = base64.b64decode(encrypted_data['ciphertext'])
-        tag = base64.b64decode(encrypted_data['tag'])
-
         cipher = Cipher(
             algorithms.AES(aes_key),
-            modes.GCM(iv, tag),
+            modes.GCM(iv, bytes(tag)),
             backend=self.backend
         )
         decryptor = cipher.decryptor()
@@ -115,21 +459,220 @@ class CryptoUtils:
         plaintext = decryptor.update(ciphertext) + decryptor.finalize()
         return json.loads(plaintext.decode())
 
+    def _x25519_ballot_key(self, shared_secret, ephemeral_public_bytes, recipient_public_bytes):
+        # Binding both public keys into the KDF ties the AES key to this exact key exchange
+        return HKDF(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=None,
+            info=_X25519_HKDF_INFO + ephemeral_public_bytes + recipient_public_bytes,
+            backend=self.backend
+        ).derive(shared_secret)
+
+    def encrypt_vote_x25519(self, vote_data, public_key):
+        """Encrypt vote data using ECIES: ephemeral X25519 ECDH, HKDF-SHA256 and AES-GCM"""
+        ephemeral_private_key = X25519PrivateKey.generate()
+        ephemeral_public_bytes = ephemeral_private_key.public_key().public_bytes(
+            encoding=serialization.Encoding.Raw,
+            format=serialization.PublicFormat.Raw
+        )
+        recipient_public_bytes = public_key.public_bytes(
+            encoding=serialization.Encoding.Raw,
+            format=serialization.PublicFormat.Raw
+        )
+        aes_key = self._x25519_ballot_key(
+            ephemeral_private_key.exchange(public_key), ephemeral_public_bytes, recipient_public_bytes
+        )
+        iv = os.urandom(12)
+        encryptor = Cipher(algorithms.AES(aes_key), modes.GCM(iv), backend=self.backend).encryptor()
+        ciphertext = encryptor.update(json.dumps(vote_data).encode()) + encryptor.finalize()
+
+        return {
+            'scheme': SCHEME_X25519_AES_GCM,
+            'ephemeral_public_key': base64.b64encode(ephemeral_public_bytes).decode(),
+            'iv': base64.b64encode(iv).decode(),
+            'ciphertext': base64.b64encode(ciphertext).decode(),
+            'tag': base64.b64encode(encryptor.tag).decode()
+        }
+
+    def decrypt_vote_x25519(self, encrypted_data, private_key):
+        """Decrypt an ECIES vote using the election's X25519 private key"""
+        return self.decrypt_vote_x25519_parts(
+            base64.b64decode(encrypted_data['ephemeral_public_key']),
+            base64.b64decode(encrypted_data['iv']),
+            base64.b64decode(encrypted_data['ciphertext']),
+            base64.b64decode(encrypted_data['tag']),
+            private_key
+        )
+
+    def decrypt_vote_x25519_parts(self, ephemeral_public_key, iv, ciphertext, tag, private_key):
+        """Decrypt an ECIES ballot from its raw fields (bytes or memoryview slices)"""
+        ephemeral_public_bytes = bytes(ephemeral_public_key)
+        recipient_public_bytes = private_key.public_key().public_bytes(
+            encoding=serialization.Encoding.Raw,
+            format=serialization.PublicFormat.Raw
+        )
+        shared_secret = private_key.exchange(X25519PublicKey.from_public_bytes(ephemeral_public_bytes))
+        aes_key = self._x25519_ballot_key(shared_secret, ephemeral_public_bytes, recipient_public_bytes)
+        decryptor = Cipher(algorithms.AES(aes_key), modes.GCM(iv, bytes(tag)), backend=self.backend).decryptor()
+        plaintext = decryptor.update(ciphertext) + decryptor.finalize()
+        return json.loads(plaintext.decode())
+
+    def encrypt_vote_homomorphic(self, candidate_id, candidate_ids, public_key):
+        """
+        Encrypt a vote as a vector of exponential ElGamal ciphertexts, one per
+        candidate: Enc(1) for the chosen candidate and Enc(0) for the others.
+        Ciphertexts (r*G, r*X + m*G) add up component-wise to Enc(sum of m).
+        """
+        public_numbers = public_key.public_numbers()
+        public_point = (public_numbers.x, public_numbers.y)
+        ciphertexts = []
+        for option_id in candidate_ids:
+            r = self.generate_secure_random(1, _P256_N)
+            c1 = _ec_multiply_fixed(_G_AFFINE, r)
+            c2 = _ec_multiply_fixed(public_point, r)
+            if option_id == candidate_id:
+                c2 = _ec_add(c2, _P256_G)
+            ciphertexts.append([
+                base64.b64encode(_ec_encode(c1)).decode(),
+                base64.b64encode(_ec_encode(c2)).decode()
+            ])
+        return {
+            'scheme': SCHEME_EC_ELGAMAL,
+            'candidate_ids': list(candidate_ids),
+            'ciphertexts': ciphertexts
+        }
+
+    def add_homomorphic_vote(self, aggregate, encrypted_data):
+        """
+        Fold one encrypted vote into an aggregate {candidate_id: (C1, C2)} of
+        Jacobian points, in place. The vote is decoded completely before the
+        aggregate is touched, so a malformed vote raises and changes nothing.
+        """
+        if encrypted_data.get('scheme') != SCHEME_EC_ELGAMAL:
+            raise ValueError("Not an exponential ElGamal ballot.")
+        candidate_ids = encrypted_data['candidate_ids']
+        ciphertexts = encrypted_data['ciphertexts']
+        if len(candidate_ids) != len(ciphertexts):
+            raise ValueError("Ballot candidate list does not match its ciphertexts.")
+        return self.add_homomorphic_ciphertexts(aggregate, [
+            (candidate_id, base64.b64decode(c1), base64.b64decode(c2))
+            for candidate_id, (c1, c2) in zip(candidate_ids, ciphertexts)
+        ])
+
+    def add_homomorphic_ciphertexts(self, aggregate, ciphertexts):
+        """
+        Like add_homomorphic_vote, for a ballot given as (candidate_id, C1, C2)
+        triples of encoded points (bytes or memoryview slices).
+        """
+        if len({candidate_id for candidate_id, _, _ in ciphertexts}) != len(ciphertexts):
+            raise ValueError("Ballot lists a candidate more than once.")
+        decoded = [
+            (candidate_id, _ec_decode(c1), _ec_decode(c2))
+            for candidate_id, c1, c2 in ciphertexts
+        ]
+        for candidate_id, c1, c2 in decoded:
+            sum_c1, sum_c2 = aggregate.get(candidate_id, (_INFINITY, _INFINITY))
+            aggregate[candidate_id] = (_ec_add(sum_c1, c1), _ec_add(sum_c2, c2))
+        return aggregate
+
+    def merge_homomorphic_aggregates(self, aggregate, other):
+        """Add aggregate `other` into `aggregate`, in place"""
+        for candidate_id, (c1, c2) in other.items():
+            sum_c1, sum_c2 = aggregate.get(candidate_id, (_INFINITY, _INFINITY))
+            aggregate[candidate_id] = (_ec_add(sum_c1, c1), _ec_add(sum_c2, c2))
+        return aggregate
+
+    def serialize_homomorphic_aggregate(self, aggregate):
+        return {
+            str(candidate_id): [base64.b64encode(_ec_encode(c1)).decode(), base64.b64encode(_ec_encode(c2)).decode()]
+            for candidate_id, (c1, c2) in aggregate.items()
+        }
+
+    def deserialize_homomorphic_aggregate(self, data):
+        return {
+            int(candidate_id): (_ec_decode(base64.b64decode(c1)), _ec_decode(base64.b64decode(c2)))
+            for candidate_id, (c1, c2) in data.items()
+        }
+
+    def decrypt_homomorphic_tally(self, aggregate, private_key, max_votes):
+        """
+        Decrypt an aggregate {candidate_id: (C1, C2)} into {candidate_id: count}.
+        Each count m is recovered from m*G = C2 - x*C1 by baby-step giant-step
+        over 0..max_votes, so this costs one decryption per candidate.
+        """
+        x = private_key.private_numbers().private_value
+        step = isqrt(max_votes) + 1
+        baby_steps = {}
+        point = _INFINITY
+        for j in range(step):
+            baby_steps[_ec_to_affine(point)] = j
+            point = _ec_add(point, _P256_G)
+        giant_stride = _ec_negate(point) # -(step * G)
+
+        counts = {}
+        for candidate_id, (c1, c2) in aggregate.items():
+            point = _ec_add(c2, _ec_negate(_ec_multiply(c1, x)))
+            for i in range(step + 1):
+                j = baby_steps.get(_ec_to_affine(point))
+                if j is not None:
+                    counts[candidate_id] = i * step + j
+                    break
+                point = _ec_add(point, giant_stride)
+            else:
+                raise ValueError(f"Aggregate for candidate {candidate_id} does not decrypt to a count within {max_votes}.")
+        return counts
+
+    def encode_vote_commitment(self, vote_data, nonce):
+        """
+        The canonical (version 2) encoding of a vote and nonce. vote_data holds election_id and
+        either candidate_id or ballot_sha256 (hex); ids may be ints or numeric strings.
+        """
+        keys = set(vote_data)
+        if keys == {'election_id', 'candidate_id'}:
+            kind = _COMMITMENT_CANDIDATE
+            choice = int(vote_data['candidate_id']).to_bytes(8, 'big')
+        elif keys == {'election_id', 'ballot_sha256'}:
+            kind = _COMMITMENT_BALLOT_DIGEST
+            choice = bytes.fromhex(vote_data['ballot_sha256'])
+            if len(choice) != 32:
+                raise ValueError("ballot_sha256 must be a hex SHA-256 digest.")
+        else:
+            raise ValueError(f"Cannot encode vote data with keys {sorted(keys)} for a commitment.")
+        nonce_bytes = nonce if isinstance(nonce, bytes) else str(nonce).encode('utf-8')
+        return _COMMITMENT_HEADER.pack(COMMITMENT_VERSION, int(vote_data['election_id']), kind) + choice + nonce_bytes
+
     def generate_vote_commitment(self, vote_data, nonce):
-        """Generate a commitment for a vote"""
+        """Generate a commitment for a vote: the raw 32-byte digest of its canonical encoding"""
+        commitment_hash = _COMMITMENT_HASH.copy()
+        commitment_hash.update(self.encode_vote_commitment(vote_data, nonce))
+        return commitment_hash.digest()
+
+    def generate_legacy_vote_commitment(self, vote_data, nonce):
+        """Generate a version 1 (JSON, Base64) commitment, the format used before version 2"""
         commitment_data = {
             'vote': vote_data,
             'nonce': nonce
         }
         
-        digest = hashes.Hash(self.hash_algorithm, backend=self.backend)
-        digest.update(json.dumps(commitment_data).encode())
-        return base64.b64encode(digest.finalize()).decode()
+        # hashlib's SHA3-256 (same digest as self.hash_algorithm) avoids the per-call Hash object setup
+        digest = hashlib.sha3_256(json.dumps(commitment_data).encode()).digest()
+        return base64.b64encode(digest).decode()
 
     def verify_vote_commitment(self, commitment, vote_data, nonce):
-        """Verify a vote commitment"""
-        calculated_commitment = self.generate_vote_commitment(vote_data, nonce)
-        return commitment == calculated_commitment
+        """Verify a vote commitment: a raw 32-byte digest, or a Base64 string of the legacy format"""
+        if isinstance(commitment, memoryview):
+            commitment = bytes(commitment)
+        if isinstance(commitment, bytes) and len(commitment) == COMMITMENT_DIGEST_SIZE:
+            try:
+                calculated_commitment = self.generate_vote_commitment(vote_data, nonce)
+            except (ValueError, TypeError):
+                return False
+            return hmac.compare_digest(commitment, calculated_commitment)
+        if isinstance(commitment, bytes):
+            commitment = commitment.decode('ascii', errors='replace')
+        calculated_commitment = self.generate_legacy_vote_commitment(vote_data, nonce)
+        return hmac.compare_digest(commitment.encode(), calculated_commitment.encode())
 
     def generate_secure_random(self, min_value, max_value):
         """Generate a cryptographically secure random number in range"""
@@ -142,17 +685,30 @@ class CryptoUtils:
             random_int = int.from_bytes(random_bytes, byteorder='big')
             if random_int < (2 ** bits_needed - 2 ** bits_needed % range_size):
                 return min_value + (random_int % range_size)
+    def public_key_fingerprint(self, public_key):
+        """SHA-256 fingerprint (hex) of a public key's DER SubjectPublicKeyInfo"""
+        digest = hashes.Hash(hashes.SHA256(), backend=self.backend)
+        digest.update(public_key.public_bytes(
+            encoding=serialization.Encoding.DER,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
+        ))
+        return digest.finalize().hex()
+
+    def get_system_signing_key(self, key_id=None):
+        """A SystemSigningKey from the key ring: the active one, or the one with key_id"""
+        key = system_key_rings.get().get(key_id)
+        if key is None:
+            raise ValueError("System Ed25519 key not configured in settings." if key_id is None else f"Unknown system Ed25519 key {key_id}.")
+        return key
+
     def get_system_ed25519_private_key(self):
-        if not settings.SYSTEM_ED25519_PRIVATE_KEY_B64:
+        private_key = self.get_system_signing_key().private_key
+        if private_key is None:
             raise ValueError("System Ed25519 private key not configured in settings.")
-        private_key_bytes = base64.b64decode(settings.SYSTEM_ED25519_PRIVATE_KEY_B64)
-        return Ed25519PrivateKey.from_private_bytes(private_key_bytes)
-
-    def get_system_ed25519_public_key(self):
-        if not settings.SYSTEM_ED25519_PUBLIC_KEY_B64:
-            raise ValueError("System Ed25519 public key not configured in settings.")
-        public_key_bytes = base64.b64decode(settings.SYSTEM_ED25519_PUBLIC_KEY_B64)
-        return Ed25519PublicKey.from_public_bytes(public_key_bytes)
+        return private_key
+
+    def get_system_ed25519_public_key(self, key_id=None):
+        return self.get_system_signing_key(key_id).public_key
 
 # Create a singleton instance
 crypto_utils = CryptoUtils() 
\ No newline at end of file
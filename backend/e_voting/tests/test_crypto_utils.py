@@ -1,6 +1,11 @@
 import unittest
+import base64
 import json
-from ..crypto_utils import crypto_utils
+import os
+import tempfile
+from django.test import override_settings
+from cryptography.hazmat.primitives import serialization
+from ..crypto_utils import crypto_utils, load_system_signing_key, _ec_multiply, _ec_multiply_fixed, _ec_to_affine, _G_AFFINE, _P256_G, _P256_N
 
 class TestCryptoUtils(unittest.TestCase):
     def setUp(self):
@@ -34,6 +39,56 @@ class TestCryptoUtils(unittest.TestCase):
         is_invalid = crypto_utils.verify_signature(modified_data, signature, public_key)
         self.assertFalse(is_invalid)
 
+    def test_signature_independent_of_key_order(self):
+        """Signatures cover canonical JSON; ones made over plain json.dumps still verify"""
+        private_key, public_key = crypto_utils.generate_ed25519_key_pair()
+        signature = crypto_utils.sign_data({'Alice': 1, 'Bob': 2}, private_key)
+        self.assertTrue(crypto_utils.verify_signature({'Bob': 2, 'Alice': 1}, signature, public_key))
+        legacy_signature = base64.b64encode(private_key.sign(json.dumps(self.test_data).encode())).decode()
+        self.assertTrue(crypto_utils.verify_signature(self.test_data, legacy_signature, public_key))
+
+    def test_system_key_rotation_through_key_ring_file(self):
+        """A new active key in the key ring file is picked up without a restart; retired keys still verify"""
+        def private_b64(private_key):
+            return base64.b64encode(private_key.private_bytes(
+                serialization.Encoding.Raw, serialization.PrivateFormat.Raw, serialization.NoEncryption()
+            )).decode()
+
+        old_key = load_system_signing_key(private_b64(crypto_utils.generate_ed25519_key_pair()[0]))
+        new_key = load_system_signing_key(private_b64(crypto_utils.generate_ed25519_key_pair()[0]))
+        with tempfile.TemporaryDirectory() as directory:
+            keyring_file = os.path.join(directory, 'keyring.json')
+
+            def write_keyring(keyring, mtime_ns):
+                with open(keyring_file, 'w') as f:
+                    f.write(keyring if isinstance(keyring, str) else json.dumps(keyring))
+                os.utime(keyring_file, ns=(mtime_ns, mtime_ns))
+
+            write_keyring({'keys': [{'private_key_b64': private_b64(old_key.private_key)}]}, 1)
+            with override_settings(SYSTEM_ED25519_PRIVATE_KEY_B64=None, SYSTEM_ED25519_PUBLIC_KEY_B64=None,
+                                   SYSTEM_ED25519_KEYRING_FILE=keyring_file, SYSTEM_ED25519_KEYRING_CHECK_SECONDS=0):
+                with self.assertRaises(ValueError): # No active key
+                    crypto_utils.get_system_ed25519_private_key()
+
+                write_keyring({'active_key_id': old_key.key_id, 'keys': [{'private_key_b64': private_b64(old_key.private_key)}]}, 2)
+                self.assertEqual(crypto_utils.get_system_signing_key().public_key_b64, old_key.public_key_b64)
+                old_signature = crypto_utils.sign_data(self.test_data, crypto_utils.get_system_ed25519_private_key())
+
+                write_keyring({'active_key_id': new_key.key_id, 'keys': [
+                    {'public_key_b64': old_key.public_key_b64},
+                    {'private_key_b64': private_b64(new_key.private_key)},
+                ]}, 3)
+                self.assertEqual(crypto_utils.get_system_signing_key().key_id, new_key.key_id)
+                self.assertIsNone(crypto_utils.get_system_signing_key(old_key.key_id).private_key)
+                self.assertTrue(crypto_utils.verify_signature(
+                    self.test_data, old_signature, crypto_utils.get_system_ed25519_public_key(old_key.key_id)
+                ))
+
+                write_keyring('{not json', 4) # A broken key ring keeps the current keys, and says so
+                with self.assertLogs('e_voting.crypto_utils', 'ERROR') as logs:
+                    self.assertEqual(crypto_utils.get_system_signing_key().key_id, new_key.key_id)
+                self.assertIn('Error reloading the system key ring', logs.output[0])
+
     def test_vote_encryption_decryption(self):
         """Test vote encryption and decryption using RSA"""
         # Generate RSA key pair for testing
@@ -50,24 +105,76 @@ class TestCryptoUtils(unittest.TestCase):
         decrypted_vote = crypto_utils.decrypt_vote(encrypted_vote, private_key)
         self.assertEqual(decrypted_vote, self.test_data)
 
+    def test_homomorphic_vote_tally(self):
+        """Test that summed ElGamal ballots decrypt to per-candidate counts"""
+        private_key, public_key = crypto_utils.generate_elgamal_key_pair()
+        candidate_ids = [1, 2, 3]
+        votes = [1, 3, 3, 1, 3]
+
+        aggregate = {}
+        for candidate_id in votes:
+            encrypted_vote = crypto_utils.encrypt_vote_homomorphic(candidate_id, candidate_ids, public_key)
+            self.assertEqual(len(encrypted_vote['ciphertexts']), len(candidate_ids))
+            crypto_utils.add_homomorphic_vote(aggregate, json.loads(json.dumps(encrypted_vote)))
+
+        # Aggregates survive serialization (used for checkpoints)
+        aggregate = crypto_utils.deserialize_homomorphic_aggregate(
+            crypto_utils.serialize_homomorphic_aggregate(aggregate)
+        )
+        counts = crypto_utils.decrypt_homomorphic_tally(aggregate, private_key, len(votes))
+        self.assertEqual(counts, {1: 2, 2: 0, 3: 3})
+
+        # Tampered ciphertexts are rejected rather than folded in
+        encrypted_vote = crypto_utils.encrypt_vote_homomorphic(1, candidate_ids, public_key)
+        encrypted_vote['ciphertexts'][0][1] = encrypted_vote['ciphertexts'][1][0][:-4] + 'AAA='
+        with self.assertRaises(Exception):
+            crypto_utils.add_homomorphic_vote(aggregate, encrypted_vote)
+
+    def test_ladder_multiplication_matches_the_fixed_base_table(self):
+        """Test the Montgomery ladder used with private keys against the table-based multiplication"""
+        for scalar in [0, 1, 2, 3, _P256_N - 1, _P256_N, _P256_N + 5, 2 ** 224, 2 ** 256 - 1] + [
+            crypto_utils.generate_secure_random(1, _P256_N) for _ in range(5)
+        ]:
+            with self.subTest(scalar=scalar):
+                expected = _ec_multiply_fixed(_G_AFFINE, scalar)
+                actual = _ec_multiply(_P256_G, scalar)
+                if not expected[2]:
+                    self.assertEqual(actual[2], 0)
+                else:
+                    self.assertEqual(_ec_to_affine(actual), _ec_to_affine(expected))
+
+    def test_x25519_vote_encryption_decryption(self):
+        """Test vote encryption and decryption using X25519 ECIES"""
+        private_key, public_key = crypto_utils.generate_x25519_key_pair()
+
+        encrypted_vote = crypto_utils.encrypt_vote_x25519(self.test_data, public_key)
+        self.assertIn('ephemeral_public_key', encrypted_vote)
+        self.assertEqual(crypto_utils.decrypt_vote_x25519(encrypted_vote, private_key), self.test_data)
+
+        # Another election's key cannot open the ballot
+        other_private_key, _ = crypto_utils.generate_x25519_key_pair()
+        with self.assertRaises(Exception):
+            crypto_utils.decrypt_vote_x25519(encrypted_vote, other_private_key)
+
     def test_vote_commitment(self):
         """Test vote commitment generation and verification"""
         nonce = 12345
+        vote_data = {'candidate_id': self.test_data['candidate_id'], 'election_id': self.test_data['election_id']}
         
         # Generate commitment
-        commitment = crypto_utils.generate_vote_commitment(self.test_data, nonce)
-        self.assertIsNotNone(commitment)
+        commitment = crypto_utils.generate_vote_commitment(vote_data, nonce)
+        self.assertEqual(len(commitment), 32)
         
         # Verify commitment
         is_valid = crypto_utils.verify_vote_commitment(
             commitment, 
-            self.test_data, 
+            vote_data, 
             nonce
         )
         self.assertTrue(is_valid)
         
         # Test invalid commitment
-        modified_data = self.test_data.copy()
+        modified_data = vote_data.copy()
         modified_data['candidate_id'] = '789'
         is_invalid = crypto_utils.verify_vote_commitment(
             commitment, 
@@ -76,6 +183,25 @@ class TestCryptoUtils(unittest.TestCase):
         )
         self.assertFalse(is_invalid)
 
+    def test_vote_commitment_canonical_encoding(self):
+        """Version 2 commitments do not depend on key order or on ids being ints or strings"""
+        commitment = crypto_utils.generate_vote_commitment({'candidate_id': 3, 'election_id': 1}, 'nonce-123')
+        self.assertEqual(commitment, crypto_utils.generate_vote_commitment({'election_id': '1', 'candidate_id': '3'}, 'nonce-123'))
+        self.assertNotEqual(commitment, crypto_utils.generate_vote_commitment({'candidate_id': 1, 'election_id': 3}, 'nonce-123'))
+        ballot_data = {'ballot_sha256': '00' * 32, 'election_id': 1}
+        self.assertTrue(crypto_utils.verify_vote_commitment(crypto_utils.generate_vote_commitment(ballot_data, 'n'), ballot_data, 'n'))
+        with self.assertRaises(ValueError):
+            crypto_utils.generate_vote_commitment(self.test_data, 'nonce-123')
+
+    def test_legacy_vote_commitment_still_verifies(self):
+        """Commitments stored before version 2, as Base64 text or its bytes, still verify"""
+        commitment = 'WmKNOWPdQd2V9PakRGmTNYcL42eXTDjuDjq+kKEAKuc='
+        vote_data = {'candidate_id': 3, 'election_id': 1}
+        self.assertEqual(crypto_utils.generate_legacy_vote_commitment(vote_data, 'nonce-123'), commitment)
+        self.assertTrue(crypto_utils.verify_vote_commitment(commitment, vote_data, 'nonce-123'))
+        self.assertTrue(crypto_utils.verify_vote_commitment(memoryview(commitment.encode()), vote_data, 'nonce-123'))
+        self.assertFalse(crypto_utils.verify_vote_commitment(commitment.encode(), vote_data, 'nonce-124'))
+
     def test_secure_random(self):
         """Test secure random number generation"""
         min_value = 1
@@ -1,6 +1,9 @@
 from django.contrib import admin
 from django.utils.html import format_html # For photo_preview and prettified JSON
-from .models import Election, Candidate, Vote, EmailVerificationToken # Ensure all models are imported
+from .models import Election, Candidate, Vote, Ballot, EmailVerificationToken # Ensure all models are imported
+from e_voting import ballot_format
+from . import ballot_log
+import base64
 import json
 
 @admin.register(Election)
@@ -44,9 +47,9 @@ class CandidateAdmin(admin.ModelAdmin):
 
 @admin.register(Vote)
 class VoteAdmin(admin.ModelAdmin):
-    list_display = ('user_display', 'election_link', 'vote_status_display', 'voted_at')
+    list_display = ('user_display', 'election_link', 'voted_at')
     list_filter = ('election__name', 'user__email')
-    readonly_fields = ('user', 'election', 'voted_at', 'encrypted_vote_data_prettified') # Made user/election read-only
+    readonly_fields = ('user', 'election', 'voted_at') # Made user/election read-only
     search_fields = ('user__email', 'election__name')
     list_select_related = ('user', 'election') # Optimize queries
 
@@ -67,20 +70,39 @@ class VoteAdmin(admin.ModelAdmin):
     election_link.short_description = 'Election'
     election_link.admin_order_field = 'election__name'
 
-    def vote_status_display(self, obj):
-        if obj.encrypted_vote_data:
-            return "Encrypted"
-        return "No vote data"
-    vote_status_display.short_description = 'Vote Status'
+
+@admin.register(Ballot)
+class BallotAdmin(admin.ModelAdmin):
+    list_display = ('id', 'election', 'storage_display')
+    list_filter = ('election__name',)
+    readonly_fields = ('election', 'encrypted_vote_data_prettified')
+    exclude = ('encrypted_vote_data', 'ballot_segment', 'ballot_offset')
+    list_select_related = ('election',)
+
+    def storage_display(self, obj):
+        if obj.ballot_segment is not None:
+            return "Ballot log"
+        return "Database"
+    storage_display.short_description = 'Stored In'
 
     def encrypted_vote_data_prettified(self, obj):
-        if obj.encrypted_vote_data:
-            try:
-                data = json.loads(obj.encrypted_vote_data)
-                return format_html("<pre>{}</pre>", json.dumps(data, indent=2, sort_keys=True))
-            except json.JSONDecodeError:
-                return obj.encrypted_vote_data
-        return "N/A"
+        try:
+            encrypted_vote_data = ballot_log.load_ballot(obj)
+            ballot = ballot_format.parse_ballot(encrypted_vote_data)
+        except (OSError, ValueError) as e:
+            return f"Unreadable ballot: {e}"
+        data = {
+            'scheme': ballot.scheme,
+            'key_id': ballot.key_id.hex() if ballot.key_id is not None else 'legacy JSON ballot',
+            'size_bytes': len(encrypted_vote_data),
+        }
+        if obj.ballot_segment is not None:
+            data['ballot_log_position'] = f"{obj.ballot_segment}:{obj.ballot_offset}"
+        if ballot.ciphertexts is not None:
+            data['candidate_ids'] = [candidate_id for candidate_id, _, _ in ballot.ciphertexts]
+        else:
+            data['ciphertext'] = base64.b64encode(ballot.ciphertext).decode()
+        return format_html("<pre>{}</pre>", json.dumps(data, indent=2, sort_keys=True))
     encrypted_vote_data_prettified.short_description = 'Encrypted Vote Payload'
 
 
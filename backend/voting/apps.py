@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class VotingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'voting'
+
+    def ready(self):
+        from . import signals # noqa: F401 -- connects the cache invalidation receivers
+        from e_voting.crypto_utils import system_key_rings
+        try:
+            system_key_rings.get() # Parse the system signing keys once, at startup
+        except (OSError, ValueError) as e:
+            print(f"System Ed25519 keys could not be loaded: {e}")
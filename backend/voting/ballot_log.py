@@ -0,0 +1,237 @@
+# backend/voting/ballot_log.py
+"""
+Append-only ballot log, an alternative to keeping ballots in the Ballot table.
+
+With BALLOT_STORE = 'log', a cast ballot is appended to a segment file under
+BALLOT_LOG_DIR/<election id>/ and its Ballot row only records where:
+Ballot.ballot_segment / Ballot.ballot_offset, with an empty
+encrypted_vote_data. Ballots never change once cast, so the files are only
+ever appended to, and tallies and exports read them through mmap.
+
+Segment files are named <segment number>.seg. Each writing process claims its
+own segments by creating them exclusively, so records from different
+processes never interleave; a segment is closed for writing once it reaches
+BALLOT_LOG_SEGMENT_BYTES. A record is
+
+    payload length (4 bytes) | CRC32 of the payload (4 bytes) | payload
+
+and the ballots appended together are flushed with a single fsync, before the
+transaction that inserts their Ballot rows commits. A ballot whose transaction
+then rolls back stays in the segment but is never referenced, so it is never
+read.
+"""
+import mmap
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict, defaultdict
+
+from django.conf import settings
+
+RECORD_HEADER = struct.Struct('>II') # payload length, CRC32 of the payload
+SEGMENT_SUFFIX = '.seg'
+
+
+def is_enabled():
+    return getattr(settings, 'BALLOT_STORE', 'database') == 'log'
+
+
+def get_log_dir():
+    return str(getattr(settings, 'BALLOT_LOG_DIR', os.path.join(settings.BASE_DIR, 'ballot_log')))
+
+
+def get_segment_bytes():
+    return max(1, int(getattr(settings, 'BALLOT_LOG_SEGMENT_BYTES', 64 * 1024 * 1024)))
+
+
+def election_dir(election_id):
+    return os.path.join(get_log_dir(), str(election_id))
+
+
+def segment_path(election_id, segment):
+    return os.path.join(election_dir(election_id), f'{segment:08d}{SEGMENT_SUFFIX}')
+
+
+def encode_record(payload):
+    return RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def _fsync_dir(path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError: # Directories cannot be opened on Windows
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class _OpenSegment:
+    def __init__(self, segment, fd):
+        self.segment = segment
+        self.fd = fd
+        self.size = 0
+
+
+class BallotLogWriter:
+    """Appends ballots to segments owned by this process. Thread-safe."""
+
+    def __init__(self):
+        self._segments = {} # election_id -> _OpenSegment
+        self._lock = threading.Lock()
+
+    def _claim_segment(self, election_id):
+        directory = election_dir(election_id)
+        os.makedirs(directory, exist_ok=True)
+        existing = [int(name[:-len(SEGMENT_SUFFIX)]) for name in os.listdir(directory) if name.endswith(SEGMENT_SUFFIX)]
+        segment = max(existing, default=0) + 1
+        while True:
+            try:
+                fd = os.open(
+                    segment_path(election_id, segment),
+                    os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_APPEND | getattr(os, 'O_BINARY', 0)
+                )
+            except FileExistsError: # Claimed by another process in the meantime
+                segment += 1
+                continue
+            _fsync_dir(directory)
+            return _OpenSegment(segment, fd)
+
+    def append(self, election_id, payloads):
+        """
+        Append ballots of one election and fsync them. Returns the
+        (segment, offset) of each ballot's record, in order.
+        """
+        records = [encode_record(payload) for payload in payloads]
+        with self._lock:
+            current = self._segments.get(election_id)
+            if current is None or current.size >= get_segment_bytes():
+                if current is not None:
+                    os.close(current.fd)
+                current = self._segments[election_id] = self._claim_segment(election_id)
+            positions = []
+            offset = current.size
+            for record in records:
+                positions.append((current.segment, offset))
+                offset += len(record)
+            data = b''.join(records)
+            try:
+                written = os.write(current.fd, data)
+                while written < len(data):
+                    written += os.write(current.fd, data[written:])
+                os.fsync(current.fd)
+            except OSError:
+                # The segment may now end in a partial record: never append to it again
+                del self._segments[election_id]
+                os.close(current.fd)
+                raise
+            current.size = offset
+            return positions
+
+    def close(self):
+        with self._lock:
+            for current in self._segments.values():
+                os.close(current.fd)
+            self._segments.clear()
+
+
+class BallotLogReader:
+    """Reads ballot records through read-only memory maps of the segments. Use as a context manager."""
+
+    def __init__(self, election_id, max_open_segments=8):
+        self.election_id = election_id
+        self.max_open_segments = max_open_segments
+        self._maps = OrderedDict() # segment -> (file, mmap), least recently used first
+        self._last_segment = None
+
+    def _map(self, segment):
+        entry = self._maps.get(segment)
+        if entry is not None:
+            if segment != self._last_segment:
+                self._maps.move_to_end(segment)
+                self._last_segment = segment
+            return entry[1]
+        segment_file = open(segment_path(self.election_id, segment), 'rb')
+        try:
+            mapped = mmap.mmap(segment_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError: # Empty segment
+            segment_file.close()
+            raise ValueError(f"Segment {segment} of election {self.election_id} is empty.")
+        self._maps[segment] = (segment_file, mapped)
+        self._last_segment = segment
+        if len(self._maps) > self.max_open_segments:
+            _, (old_file, old_map) = self._maps.popitem(last=False)
+            old_map.close()
+            old_file.close()
+        return mapped
+
+    def _record_at(self, mapped, offset):
+        """(start, end, checksum) of the payload of the record at offset, or None if the map does not hold it all."""
+        start = offset + RECORD_HEADER.size
+        if start > len(mapped):
+            return None
+        length, checksum = RECORD_HEADER.unpack_from(mapped, offset)
+        end = start + length
+        return (start, end, checksum) if end <= len(mapped) else None
+
+    def read(self, segment, offset):
+        """Return the ballot stored at (segment, offset), checking its checksum."""
+        mapped = self._map(segment)
+        record = self._record_at(mapped, offset)
+        if record is None:
+            # Mapped before this record was appended: map the segment again
+            self._close_segment(segment)
+            mapped = self._map(segment)
+            record = self._record_at(mapped, offset)
+            if record is None:
+                raise ValueError(f"Ballot record at {segment}:{offset} is past the end of its segment.")
+        start, end, checksum = record
+        payload = mapped[start:end]
+        if zlib.crc32(payload) != checksum:
+            raise ValueError(f"Ballot record at {segment}:{offset} fails its checksum.")
+        return payload
+
+    def _close_segment(self, segment):
+        segment_file, mapped = self._maps.pop(segment)
+        mapped.close()
+        segment_file.close()
+
+    def close(self):
+        while self._maps:
+            self._close_segment(next(iter(self._maps)))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def move_to_log(ballots):
+    """
+    Append unsaved Ballots to the log and point them at their records.
+    One append (and fsync) per election. Call it inside the transaction
+    that then saves the Ballots.
+    """
+    ballots_by_election = defaultdict(list)
+    for ballot in ballots:
+        ballots_by_election[ballot.election_id].append(ballot)
+    for election_id, election_ballots in ballots_by_election.items():
+        positions = ballot_log_writer.append(election_id, [bytes(ballot.encrypted_vote_data) for ballot in election_ballots])
+        for ballot, (segment, offset) in zip(election_ballots, positions):
+            ballot.ballot_segment = segment
+            ballot.ballot_offset = offset
+            ballot.encrypted_vote_data = b''
+
+
+def load_ballot(ballot):
+    """The encrypted ballot of a Ballot row, wherever it is kept."""
+    if ballot.ballot_segment is None:
+        return bytes(ballot.encrypted_vote_data)
+    with BallotLogReader(ballot.election_id) as reader:
+        return reader.read(ballot.ballot_segment, ballot.ballot_offset)
+
+
+ballot_log_writer = BallotLogWriter()
@@ -0,0 +1,181 @@
+# backend/voting/bulletin_board.py
+"""
+Per-election Merkle tree over the ballots cast (the bulletin board), so a
+voter or observer can check that a ballot is in the set that was tallied
+without re-hashing the whole ballot box.
+
+The tree is the one of RFC 6962 (Certificate Transparency): a leaf is
+SHA-256(0x00 | SHA-256 of the encrypted ballot), an inner node is
+SHA-256(0x01 | left | right), and a tree whose size is not a power of two
+splits at the largest power of two below its size. Leaves are numbered in the
+order their ballots were stored.
+
+Each complete subtree is stored as a BulletinBoardNode (level, position) once
+its last leaf is appended, and never changes afterwards. An election's
+BulletinBoard row holds the tree size and the roots of its maximal complete
+subtrees (the peaks), which is all an append needs: appending ballots takes
+one locked read of that row, one bulk INSERT of about two nodes per ballot and
+one UPDATE, with O(log n) hashing per ballot. An inclusion proof is made of
+O(log n) stored nodes, fetched in one query.
+"""
+import hashlib
+from collections import defaultdict
+from functools import reduce
+
+from django.db.models import Q
+
+from .models import BulletinBoard, BulletinBoardNode
+
+HASH_SIZE = 32
+EMPTY_ROOT = hashlib.sha256(b'').digest()
+
+
+def ballot_digest(ballot):
+    """SHA-256 of an encrypted ballot: what voters keep as their receipt."""
+    return hashlib.sha256(ballot).digest()
+
+
+def leaf_hash(digest):
+    return hashlib.sha256(b'\x00' + digest).digest()
+
+
+def node_hash(left, right):
+    return hashlib.sha256(b'\x01' + left + right).digest()
+
+
+def split_peaks(data):
+    data = bytes(data)
+    return [data[i:i + HASH_SIZE] for i in range(0, len(data), HASH_SIZE)]
+
+
+def root_from_peaks(peaks):
+    """Root of a tree (or subtree range) from its complete subtrees, left to right."""
+    if not peaks:
+        return EMPTY_ROOT
+    return reduce(lambda right, left: node_hash(left, right), reversed(peaks))
+
+
+def append_leaves(size, peaks, leaves):
+    """
+    Append leaf hashes to a tree of `size` leaves with the given peaks.
+    Returns (new size, new peaks, [(level, position, hash)] of the subtrees completed).
+    """
+    peaks = list(peaks)
+    nodes = []
+    for node in leaves:
+        level, position = 0, size
+        nodes.append((level, position, node))
+        while position & 1: # A right child completes its parent, whose left child is the last peak
+            node = node_hash(peaks.pop(), node)
+            level += 1
+            position >>= 1
+            nodes.append((level, position, node))
+        peaks.append(node)
+        size += 1
+    return size, peaks, nodes
+
+
+def _subtrees(start, end):
+    """(level, position) of the complete subtrees covering leaves [start, end), left to right."""
+    subtrees = []
+    while start < end:
+        level = (end - start).bit_length() - 1
+        subtrees.append((level, start >> level))
+        start += 1 << level
+    return subtrees
+
+
+def _proof_ranges(leaf_index, size):
+    """The leaf ranges whose roots make up the inclusion proof of a leaf, from the leaf up."""
+    ranges = []
+    start, end = 0, size
+    while end - start > 1:
+        split = start + (1 << ((end - start - 1).bit_length() - 1))
+        if leaf_index < split:
+            ranges.append((split, end))
+            end = split
+        else:
+            ranges.append((start, split))
+            start = split
+    ranges.reverse()
+    return ranges
+
+
+def append_ballots(ballots):
+    """
+    Add unsaved Ballots to their elections' trees. Call it inside the transaction that
+    saves them, while they still hold their encrypted data (before the ballot log takes it).
+    """
+    leaves_by_election = defaultdict(list)
+    for ballot in ballots:
+        leaves_by_election[ballot.election_id].append(leaf_hash(ballot_digest(bytes(ballot.encrypted_vote_data))))
+    for election_id, leaves in leaves_by_election.items():
+        board, _ = BulletinBoard.objects.select_for_update().get_or_create(election_id=election_id)
+        size, peaks, nodes = append_leaves(board.size, split_peaks(board.peaks), leaves)
+        BulletinBoardNode.objects.bulk_create([
+            BulletinBoardNode(election_id=election_id, level=level, position=position, hash=node)
+            for level, position, node in nodes
+        ])
+        BulletinBoard.objects.filter(pk=board.pk).update(size=size, peaks=b''.join(peaks))
+
+
+def get_root(election_id, lock=False):
+    """(size, root) of an election's tree. lock=True holds appends off until the transaction ends."""
+    boards = BulletinBoard.objects.select_for_update() if lock else BulletinBoard.objects
+    board = boards.filter(election_id=election_id).first()
+    if board is None:
+        return 0, EMPTY_ROOT
+    return board.size, root_from_peaks(split_peaks(board.peaks))
+
+
+def inclusion_proof(election_id, digest):
+    """
+    Proof that the ballot with SHA-256 `digest` is on the election's board:
+    {'leaf_index', 'tree_size', 'root', 'proof'}, with hashes as bytes. None if it is not.
+    """
+    # Sliced rather than .first(), whose ORDER BY id would make SQLite walk the primary key instead of the leaf index
+    leaf_positions = BulletinBoardNode.objects.filter(
+        election_id=election_id, level=0, hash=leaf_hash(digest)
+    ).values_list('position', flat=True)[:1]
+    if not leaf_positions:
+        return None
+    leaf_index = leaf_positions[0]
+    size, root = get_root(election_id)
+    ranges = _proof_ranges(leaf_index, size)
+    wanted = [_subtrees(start, end) for start, end in ranges]
+    condition = Q()
+    for level, position in {subtree for subtrees in wanted for subtree in subtrees}:
+        # election_id in every term, so each is a unique index lookup rather than a scan of the election's nodes
+        condition |= Q(election_id=election_id, level=level, position=position)
+    stored = {}
+    if condition:
+        stored = {
+            (level, position): bytes(node)
+            for level, position, node in BulletinBoardNode.objects.filter(condition).values_list('level', 'position', 'hash')
+        }
+    return {
+        'leaf_index': leaf_index,
+        'tree_size': size,
+        'root': root,
+        'proof': [root_from_peaks([stored[subtree] for subtree in subtrees]) for subtrees in wanted],
+    }
+
+
+def verify_inclusion(digest, leaf_index, tree_size, proof, root):
+    """Check an inclusion proof against a root (RFC 9162, section 2.1.3.2)."""
+    if leaf_index >= tree_size:
+        return False
+    fn, sn, node = leaf_index, tree_size - 1, leaf_hash(digest)
+    for sibling in proof:
+        if sn == 0:
+            return False
+        if fn & 1 or fn == sn:
+            node = node_hash(sibling, node)
+            while not fn & 1 and fn != 0:
+                fn >>= 1
+                sn >>= 1
+        else:
+            node = node_hash(node, sibling)
+        fn >>= 1
+        sn >>= 1
+    return sn == 0 and node == root
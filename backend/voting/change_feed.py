@@ -0,0 +1,67 @@
+# backend/voting/change_feed.py
+"""
+Change feed of elections and their candidates, so clients can poll for what
+changed instead of reloading election lists.
+
+Every save or delete of an Election or Candidate (see signals.py) gives the
+election's ElectionChange row the next feed version. A client keeps the
+version of its last poll and asks for the elections changed since: the
+elections whose row has a higher version, and tombstones for those deleted.
+Candidates are always sent inside their election, so a candidate change sends
+its election again.
+
+Versions are handed out by incrementing the single ChangeFeedClock row, which
+stays locked until the transaction making the change commits. So versions
+become visible in commit order: once a reader sees version N, every version
+below N is committed too, and a client that has read up to N can never miss
+one of them later. The price is that changes to elections are serialized,
+which is fine for admin edits. The latest version is read from the clock row,
+a single primary key lookup.
+
+Whether an election is open for voting changes with time, not with its row,
+so it is not a change: clients have its start_time and end_time. Nor is a
+voter's ballot status (has_committed, has_voted), which the feed leaves out.
+"""
+import hashlib
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import ChangeFeedClock, ElectionChange
+
+CLOCK_ID = 1
+
+
+def record(election_id, deleted=False):
+    """Bump an election's version. Call it in the transaction that changes the election or its candidates."""
+    with transaction.atomic():
+        # The UPDATE locks the clock row until the enclosing transaction commits
+        if not ChangeFeedClock.objects.filter(pk=CLOCK_ID).update(version=F('version') + 1):
+            ChangeFeedClock.objects.create(pk=CLOCK_ID, version=1)
+        version = ChangeFeedClock.objects.values_list('version', flat=True).get(pk=CLOCK_ID)
+        if not ElectionChange.objects.filter(election_id=election_id).update(version=version, deleted=deleted):
+            ElectionChange.objects.create(election_id=election_id, version=version, deleted=deleted)
+
+
+def latest_version():
+    versions = ChangeFeedClock.objects.filter(pk=CLOCK_ID).values_list('version', flat=True)
+    return versions[0] if versions else 0
+
+
+def changes_since(version, until):
+    """(ids of elections changed, ids of elections deleted) in versions (version, until]."""
+    changed, deleted = [], []
+    for election_id, is_deleted in ElectionChange.objects.filter(version__gt=version, version__lte=until).values_list('election_id', 'deleted'):
+        (deleted if is_deleted else changed).append(election_id)
+    return changed, deleted
+
+
+def etag(version, *variant):
+    """
+    ETag of a feed response at `version`. variant: whatever else the body depends on
+    (since, fields), so that no two different bodies share a validator.
+    """
+    if not variant:
+        return f'"feed-{version}"'
+    digest = hashlib.sha256(repr(variant).encode('utf-8')).hexdigest()[:16]
+    return f'"feed-{version}-{digest}"'
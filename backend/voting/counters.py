@@ -0,0 +1,106 @@
+# backend/voting/counters.py
+"""
+Per-election participation counters: commitments made, ballots revealed and
+the decryption errors of the last tally.
+
+The counts live in ElectionCounterShard rows and are bumped in the
+transactions that insert the VoteCommitment and Vote rows they count, so they
+never disagree with those tables. An increment is a single UPDATE ... SET
+n = n + k of one shard row picked at random (ELECTION_COUNTER_SHARDS of them
+per election), so concurrent voters rarely wait on each other's row lock.
+Reading an election's counts sums its few shard rows, however many votes it
+has.
+
+The reconcile_election_counters command rebuilds the counters from the base
+tables, should they ever drift (rows deleted by hand, for instance).
+"""
+import random
+
+from django.conf import settings
+from django.db import transaction, IntegrityError
+from django.db.models import F, Sum
+
+from .models import ElectionCounterShard, VoteCommitment, Ballot, TallyJob
+
+COUNTERS = ('commitments', 'ballots', 'decryption_errors')
+
+
+def get_counter_shard_count():
+    return max(1, int(getattr(settings, 'ELECTION_COUNTER_SHARDS', 8)))
+
+
+def create_shards(election_id):
+    """Create an election's shard rows, so its increments never have to."""
+    ElectionCounterShard.objects.bulk_create(
+        [ElectionCounterShard(election_id=election_id, shard=shard) for shard in range(get_counter_shard_count())],
+        ignore_conflicts=True
+    )
+
+
+def add(election_id, **deltas):
+    """
+    Add to an election's counters, e.g. add(election_id, ballots=3). Call it
+    inside the transaction that inserts the rows being counted.
+    """
+    deltas = {name: n for name, n in deltas.items() if n}
+    if not deltas:
+        return
+    shard = random.randrange(get_counter_shard_count())
+    increments = {name: F(name) + n for name, n in deltas.items()}
+    if ElectionCounterShard.objects.filter(election_id=election_id, shard=shard).update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            ElectionCounterShard.objects.create(election_id=election_id, shard=shard, **deltas)
+    except IntegrityError: # Shard created concurrently
+        ElectionCounterShard.objects.filter(election_id=election_id, shard=shard).update(**increments)
+
+
+def get_counts(election_id):
+    """{'commitments', 'ballots', 'decryption_errors'} of an election, in one query over its shard rows."""
+    totals = ElectionCounterShard.objects.filter(election_id=election_id).aggregate(
+        **{name: Sum(name) for name in COUNTERS}
+    )
+    return {name: totals[name] or 0 for name in COUNTERS}
+
+
+def set_decryption_errors(election_id, decryption_errors):
+    """Record the decryption errors of a finished tally, replacing those of any earlier one."""
+    with transaction.atomic():
+        ElectionCounterShard.objects.filter(election_id=election_id).exclude(shard=0).update(decryption_errors=0)
+        shard, _ = ElectionCounterShard.objects.get_or_create(election_id=election_id, shard=0)
+        shard.decryption_errors = decryption_errors
+        shard.save(update_fields=['decryption_errors', 'updated_at'])
+
+
+def count_from_base_tables(election_id):
+    """The counters of an election recomputed from VoteCommitment, Ballot and its last successful TallyJob."""
+    last_tally = TallyJob.objects.filter(
+        election_id=election_id, state=TallyJob.State.SUCCEEDED
+    ).order_by('-finished_at').values_list('decryption_errors', flat=True)[:1]
+    return {
+        'commitments': VoteCommitment.objects.filter(election_id=election_id).count(),
+        'ballots': Ballot.objects.filter(election_id=election_id).count(),
+        'decryption_errors': last_tally[0] if last_tally else 0,
+    }
+
+
+def rebuild(election_id):
+    """
+    Recount an election's counters from the base tables and store them in shard 0.
+    Returns (counts before, counts after).
+
+    Safe while votes are being cast: every shard row is created and locked before
+    counting, so a concurrent vote either is committed (and counted) by then or
+    waits for the lock and adds itself on top of the rebuilt counts.
+    """
+    with transaction.atomic():
+        create_shards(election_id)
+        shards = list(ElectionCounterShard.objects.select_for_update().filter(election_id=election_id).order_by('shard'))
+        before = {name: sum(getattr(shard, name) for shard in shards) for name in COUNTERS}
+        after = count_from_base_tables(election_id)
+        ElectionCounterShard.objects.filter(election_id=election_id).exclude(shard=0).update(
+            **{name: 0 for name in COUNTERS}
+        )
+        ElectionCounterShard.objects.filter(election_id=election_id, shard=0).update(**after)
+    return before, after
@@ -0,0 +1,184 @@
+# backend/voting/election_cache.py
+"""
+Read-through cache of the election state the vote paths need: voting window,
+active flag, encryption settings, public key and key id, and the set of
+candidate ids.
+
+Two backends are available (ELECTION_CACHE_BACKEND):
+  'local'  - an LRU dict per process. Invalidation by signal only reaches the
+             process that saved the change, so entries also expire after
+             ELECTION_CACHE_TIMEOUT seconds to bound staleness in other workers.
+  'django' - Django's cache framework (ELECTION_CACHE_ALIAS), shared by every
+             worker, so a signal invalidates the entry everywhere.
+
+Entries are dropped by the Election and Candidate post_save/post_delete signals
+(see voting/signals.py). Hit and miss counts are per process and exposed
+through admin/cache-stats/.
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from cryptography.hazmat.primitives import serialization
+
+from e_voting import ballot_format
+from e_voting.crypto_utils import crypto_utils
+from .models import Election, Candidate
+
+
+class ElectionState(namedtuple('ElectionState', [
+    'id', 'name', 'is_active', 'start_time', 'end_time',
+    'encryption_scheme', 'client_side_encryption', 'defer_reveal_checks', 'rsa_public_key_pem', 'key_id', 'candidate_ids',
+])):
+    """Snapshot of an election; field names match Election so it can stand in for one on the vote paths."""
+    __slots__ = ()
+
+    @property
+    def is_open_for_voting(self):
+        now = timezone.now()
+        if self.start_time and self.end_time:
+            return self.is_active and self.start_time <= now <= self.end_time
+        return False
+
+
+class LocalMemoryBackend:
+    name = 'local'
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._entries = OrderedDict() # election_id -> (expires_at, state)
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, election_id):
+        with self._lock:
+            entry = self._entries.get(election_id)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[election_id]
+                return None
+            self._entries.move_to_end(election_id)
+            return entry[1]
+
+    def set(self, election_id, state):
+        with self._lock:
+            self._entries[election_id] = (time.monotonic() + self.timeout, state)
+            self._entries.move_to_end(election_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, election_id):
+        with self._lock:
+            self._entries.pop(election_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._entries), 'max_size': self.max_size, 'evictions': self.evictions}
+
+
+class DjangoCacheBackend:
+    name = 'django'
+
+    def __init__(self, alias, timeout, key_prefix='voting:election-state:v2:'): # Bump the version when ElectionState changes
+        self.alias = alias
+        self.timeout = timeout
+        self.key_prefix = key_prefix
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get(self, election_id):
+        return self.cache.get(f'{self.key_prefix}{election_id}')
+
+    def set(self, election_id, state):
+        self.cache.set(f'{self.key_prefix}{election_id}', state, self.timeout)
+
+    def delete(self, election_id):
+        self.cache.delete(f'{self.key_prefix}{election_id}')
+
+    def clear(self):
+        pass # Shared entries expire on their own; clearing the whole cache could hit other data
+
+    def stats(self):
+        return {'alias': self.alias}
+
+
+def _load_state(election_id):
+    row = Election.objects.filter(pk=election_id).values(
+        'id', 'name', 'is_active', 'start_time', 'end_time',
+        'encryption_scheme', 'client_side_encryption', 'defer_reveal_checks', 'rsa_public_key_pem'
+    ).first()
+    if row is None:
+        return None
+    key_id = None
+    if row['rsa_public_key_pem']:
+        public_key = serialization.load_pem_public_key(row['rsa_public_key_pem'].encode('utf-8'), backend=crypto_utils.backend)
+        key_id = ballot_format.key_id(public_key)
+    candidate_ids = frozenset(Candidate.objects.filter(election_id=election_id).values_list('id', flat=True))
+    return ElectionState(key_id=key_id, candidate_ids=candidate_ids, **row)
+
+
+class ElectionStateCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, election_id):
+        return _load_state(election_id)
+
+    def get(self, election_id):
+        """Return the ElectionState of an election, or None if it does not exist."""
+        state = self.backend.get(election_id)
+        with self._lock:
+            if state is not None:
+                self.hits += 1
+                return state
+            self.misses += 1
+        state = self.load(election_id)
+        if state is not None: # Unknown ids are not cached; they are not on any hot path
+            self.backend.set(election_id, state)
+        return state
+
+    def invalidate(self, election_id):
+        self.backend.delete(election_id)
+
+    def clear(self):
+        self.backend.clear()
+        with self._lock:
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                'backend': self.backend.name,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            }
+        stats.update(self.backend.stats())
+        return stats
+
+
+def _make_backend():
+    timeout = getattr(settings, 'ELECTION_CACHE_TIMEOUT', 30)
+    if getattr(settings, 'ELECTION_CACHE_BACKEND', 'local') == 'django':
+        return DjangoCacheBackend(getattr(settings, 'ELECTION_CACHE_ALIAS', 'default'), timeout)
+    return LocalMemoryBackend(getattr(settings, 'ELECTION_CACHE_SIZE', 1024), timeout)
+
+
+election_states = ElectionStateCache(_make_backend())
@@ -0,0 +1,74 @@
+# backend/voting/key_cache.py
+"""
+Process-wide cache of parsed election public keys.
+
+Parsing Election.rsa_public_key_pem into a key object on every vote is pure
+overhead: the key never changes while the election runs. Entries are keyed by
+election id plus a SHA-256 fingerprint of the PEM text, so a changed key can
+never be served stale, and the election's entries are also dropped by the
+Election post_save/post_delete signals (see voting/signals.py).
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from cryptography.hazmat.primitives import serialization
+
+from e_voting.crypto_utils import crypto_utils
+
+
+class ElectionPublicKeyCache:
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict() # (election_id, pem_fingerprint) -> public key object
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, election):
+        """Return the parsed public key of an election, loading it on a miss."""
+        pem = election.rsa_public_key_pem
+        cache_key = (election.id, hashlib.sha256(pem.encode('utf-8')).hexdigest())
+        with self._lock:
+            public_key = self._entries.get(cache_key)
+            if public_key is not None:
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                return public_key
+            self.misses += 1
+
+        public_key = serialization.load_pem_public_key(pem.encode('utf-8'), backend=crypto_utils.backend)
+        with self._lock:
+            self._entries[cache_key] = public_key
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return public_key
+
+    def invalidate(self, election_id):
+        with self._lock:
+            for cache_key in [key for key in self._entries if key[0] == election_id]:
+                del self._entries[cache_key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+election_public_keys = ElectionPublicKeyCache(getattr(settings, 'ELECTION_PUBLIC_KEY_CACHE_SIZE', 256))
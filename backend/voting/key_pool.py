@@ -0,0 +1,156 @@
+# backend/voting/key_pool.py
+"""
+Pool of pre-generated election key pairs.
+
+RSA-2048 key generation takes an unpredictable 50-500 ms, which used to block
+every "create election" request. New elections now claim a ready key pair from
+the PooledElectionKey table; when the pool drops below
+ELECTION_KEY_POOL_LOW_WATERMARK a background thread tops it back up to
+ELECTION_KEY_POOL_SIZE, and an empty pool falls back to generating inline.
+`manage.py fill_election_key_pool` fills it ahead of a large setup session.
+
+Only schemes with slow key generation are pooled; the others are always
+generated inline.
+
+Pooled private keys are encrypted with AES-GCM under a key derived from
+ELECTION_KEY_POOL_SECRET (or SECRET_KEY), which is not stored in the
+database, so the database or a backup of it does not hold usable election
+keys. The public key is the associated data, binding each private key to its
+own row. A key that no longer decrypts (the secret changed) is discarded.
+"""
+import os
+import threading
+
+from django.conf import settings
+from django.db import connections, transaction
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+from e_voting.crypto_utils import crypto_utils, SCHEME_RSA_AES_GCM
+from .models import PooledElectionKey
+
+POOLED_SCHEMES = {SCHEME_RSA_AES_GCM}
+NONCE_SIZE = 12
+# HKDF context of the pool encryption key; changing it discards the keys already pooled
+_POOL_HKDF_INFO = b'e-voting election key pool v1'
+
+_refill_lock = threading.Lock()
+_refilling = set() # Schemes with a refill thread running in this process
+
+
+def get_pool_size():
+    return max(0, int(getattr(settings, 'ELECTION_KEY_POOL_SIZE', 10)))
+
+
+def get_low_watermark():
+    return max(0, int(getattr(settings, 'ELECTION_KEY_POOL_LOW_WATERMARK', 3)))
+
+
+def generate_key_pair_pem(scheme):
+    """Generate an election key pair and return it as (private_key_pem, public_key_pem) strings."""
+    private_key, public_key = crypto_utils.generate_election_key_pair(scheme)
+    public_key_pem = public_key.public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode('utf-8')
+    private_key_pem = private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption() # No password for demo simplicity
+    ).decode('utf-8')
+    return private_key_pem, public_key_pem
+
+
+def _pool_cipher():
+    secret = getattr(settings, 'ELECTION_KEY_POOL_SECRET', None) or settings.SECRET_KEY
+    key = HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=_POOL_HKDF_INFO).derive(secret.encode('utf-8'))
+    return AESGCM(key)
+
+
+def seal_private_key(private_key_pem, public_key_pem):
+    """Encrypt a private key PEM for storage in the pool."""
+    nonce = os.urandom(NONCE_SIZE)
+    return nonce + _pool_cipher().encrypt(nonce, private_key_pem.encode('utf-8'), public_key_pem.encode('utf-8'))
+
+
+def open_private_key(encrypted_private_key, public_key_pem):
+    """Decrypt a pooled private key PEM. Raises InvalidTag if it was sealed under another secret or tampered with."""
+    encrypted_private_key = bytes(encrypted_private_key)
+    return _pool_cipher().decrypt(
+        encrypted_private_key[:NONCE_SIZE], encrypted_private_key[NONCE_SIZE:], public_key_pem.encode('utf-8')
+    ).decode('utf-8')
+
+
+def _take_pooled_key(scheme):
+    while True:
+        with transaction.atomic():
+            pooled_key = (
+                PooledElectionKey.objects.select_for_update(skip_locked=True)
+                .filter(encryption_scheme=scheme)
+                .order_by('id')
+                .first()
+            )
+            if pooled_key is None:
+                return None
+            # The delete count tells us whether a concurrent claimer got this row first
+            # (backends without row locks, e.g. SQLite, can hand the same row to two callers)
+            deleted, _ = PooledElectionKey.objects.filter(pk=pooled_key.pk).delete()
+        if deleted:
+            try:
+                return open_private_key(pooled_key.encrypted_private_key, pooled_key.public_key_pem), pooled_key.public_key_pem
+            except InvalidTag:
+                print(f"Discarding pooled {scheme} key {pooled_key.pk}: it does not decrypt with the current pool secret.")
+
+
+def claim_key_pair(scheme=SCHEME_RSA_AES_GCM):
+    """
+    Return (private_key_pem, public_key_pem) for a new election, from the pool
+    when possible. Triggers a background refill when the pool runs low.
+    """
+    if scheme not in POOLED_SCHEMES or not get_pool_size():
+        return generate_key_pair_pem(scheme)
+
+    key_pair = _take_pooled_key(scheme)
+    if PooledElectionKey.objects.filter(encryption_scheme=scheme).count() < get_low_watermark() or key_pair is None:
+        refill_in_background(scheme)
+    if key_pair is None:
+        print(f"Election key pool for {scheme} is empty; generating the key pair inline.")
+        return generate_key_pair_pem(scheme)
+    return key_pair
+
+
+def fill_pool(scheme=SCHEME_RSA_AES_GCM, target=None):
+    """Generate key pairs until the pool holds `target` of them. Returns how many were added."""
+    target = get_pool_size() if target is None else target
+    added = 0
+    while PooledElectionKey.objects.filter(encryption_scheme=scheme).count() < target:
+        private_key_pem, public_key_pem = generate_key_pair_pem(scheme)
+        PooledElectionKey.objects.create(
+            encryption_scheme=scheme,
+            public_key_pem=public_key_pem,
+            encrypted_private_key=seal_private_key(private_key_pem, public_key_pem)
+        )
+        added += 1
+    return added
+
+
+def refill_in_background(scheme=SCHEME_RSA_AES_GCM):
+    """Start a thread that tops the pool up, unless one is already running for this scheme."""
+    with _refill_lock:
+        if scheme in _refilling:
+            return
+        _refilling.add(scheme)
+    threading.Thread(target=_refill, args=(scheme,), name=f'key-pool-{scheme}', daemon=True).start()
+
+
+def _refill(scheme):
+    try:
+        fill_pool(scheme)
+    except Exception as e:
+        print(f"Error refilling election key pool for {scheme}: {e}")
+    finally:
+        with _refill_lock:
+            _refilling.discard(scheme)
+        connections.close_all() # Close this thread's DB connections
@@ -0,0 +1,106 @@
+# backend/voting/management/commands/benchmark_ballot_schemes.py
+import json
+import random
+import time
+from django.core.management.base import BaseCommand
+from e_voting import crypto_utils as crypto_module
+from e_voting import ballot_format
+from e_voting.crypto_utils import SCHEME_RSA_AES_GCM, SCHEME_EC_ELGAMAL
+from e_voting.crypto_utils import crypto_utils
+
+class Command(BaseCommand):
+    help = (
+        'Compares the RSA hybrid, X25519 hybrid and exponential ElGamal ballot schemes: per-ballot costs are '
+        'measured on a sample and the tally time is projected for each election size. The final '
+        'ElGamal decryption (one per candidate) is measured at the real size.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+        parser.add_argument('--sample', type=int, default=200, help='Ballots encrypted/decrypted per scheme to measure per-ballot cost.')
+        parser.add_argument('--candidates', type=int, default=3)
+        parser.add_argument('--keygen-repeats', type=int, default=10, help='Key pairs generated per scheme to average key generation time.')
+
+    def _timed(self, fn, repeat):
+        start = time.perf_counter()
+        results = [fn(i) for i in range(repeat)]
+        return (time.perf_counter() - start) / repeat, results
+
+    def handle(self, *args, **options):
+        sample = options['sample']
+        candidate_ids = list(range(1, options['candidates'] + 1))
+        votes = [random.choice(candidate_ids) for _ in range(sample)]
+        keygen_repeats = options['keygen_repeats']
+
+        # --- RSA-OAEP + AES-GCM: one private-key operation per ballot ---
+        rsa_keygen, rsa_keys = self._timed(lambda _: crypto_utils.generate_rsa_key_pair(), keygen_repeats)
+        rsa_private, rsa_public = rsa_keys[0]
+        rsa_encrypt, rsa_ballots = self._timed(
+            lambda i: json.dumps(crypto_utils.encrypt_vote({'candidate_id': votes[i], 'election_id': 1}, rsa_public)), sample
+        )
+        rsa_decrypt, _ = self._timed(lambda i: crypto_utils.decrypt_vote(json.loads(rsa_ballots[i]), rsa_private), sample)
+
+        # --- X25519 ECIES + AES-GCM: one X25519 exchange per ballot ---
+        x_keygen, x_keys = self._timed(lambda _: crypto_utils.generate_x25519_key_pair(), keygen_repeats)
+        x_private, x_public = x_keys[0]
+        x_encrypt, x_ballots = self._timed(
+            lambda i: json.dumps(crypto_utils.encrypt_vote_x25519({'candidate_id': votes[i], 'election_id': 1}, x_public)), sample
+        )
+        x_decrypt, _ = self._timed(lambda i: crypto_utils.decrypt_vote_x25519(json.loads(x_ballots[i]), x_private), sample)
+
+        # --- Exponential ElGamal: ballots are added, then one decryption per candidate ---
+        eg_keygen, eg_keys = self._timed(lambda _: crypto_utils.generate_elgamal_key_pair(), keygen_repeats)
+        eg_private, eg_public = eg_keys[0]
+        eg_encrypt, eg_ballots = self._timed(
+            lambda i: json.dumps(crypto_utils.encrypt_vote_homomorphic(votes[i], candidate_ids, eg_public)), sample
+        )
+        aggregate = {}
+        eg_add, _ = self._timed(lambda i: crypto_utils.add_homomorphic_vote(aggregate, json.loads(eg_ballots[i])), sample)
+
+        self.stdout.write(f"Sample of {sample} ballots, {len(candidate_ids)} candidates (single core):")
+        self.stdout.write(f"  {'':24}{'RSA hybrid':>14}{'X25519 hybrid':>14}{'ElGamal':>14}")
+        self.stdout.write(f"  {'key generation':24}{rsa_keygen * 1000:>11.2f} ms{x_keygen * 1000:>11.2f} ms{eg_keygen * 1000:>11.2f} ms")
+        self.stdout.write(f"  {'encrypt / ballot':24}{rsa_encrypt * 1000:>11.3f} ms{x_encrypt * 1000:>11.3f} ms{eg_encrypt * 1000:>11.3f} ms")
+        self.stdout.write(f"  {'tally work / ballot':24}{rsa_decrypt * 1000:>11.3f} ms{x_decrypt * 1000:>11.3f} ms{eg_add * 1000:>11.3f} ms")
+        self.stdout.write(f"  {'JSON ballot size':24}{len(rsa_ballots[0]):>12} B{len(x_ballots[0]):>12} B{len(eg_ballots[0]):>12} B")
+
+        # --- Stored ballot format: legacy JSON of base64 fields vs the binary format ---
+        self.stdout.write("\nBallot storage format (tally work includes parsing the stored ballot):")
+        self.stdout.write(f"  {'':24}{'JSON':>14}{'binary':>14}{'JSON':>14}{'binary':>14}")
+        self.stdout.write(f"  {'':24}{'size':>14}{'size':>14}{'tally/ballot':>14}{'tally/ballot':>14}")
+        for label, scheme, ballots, public_key, tally_one in (
+            ('RSA hybrid', SCHEME_RSA_AES_GCM, rsa_ballots, rsa_public,
+             lambda b: crypto_utils.decrypt_vote_parts(b.encrypted_key, b.iv, b.ciphertext, b.tag, rsa_private)),
+            ('ElGamal', SCHEME_EC_ELGAMAL, eg_ballots, eg_public,
+             lambda b: crypto_utils.add_homomorphic_ciphertexts({}, b.ciphertexts)),
+        ):
+            key_id = ballot_format.key_id(public_key)
+            json_ballots = [ballot.encode() for ballot in ballots]
+            binary_ballots = [ballot_format.encode_ballot(scheme, key_id, json.loads(ballot)) for ballot in ballots]
+            json_tally, _ = self._timed(lambda i: tally_one(ballot_format.parse_ballot(json_ballots[i])), sample)
+            binary_tally, _ = self._timed(lambda i: tally_one(ballot_format.parse_ballot(binary_ballots[i])), sample)
+            self.stdout.write(
+                f"  {label:24}{len(json_ballots[0]):>12} B{len(binary_ballots[0]):>12} B"
+                f"{json_tally * 1000:>11.3f} ms{binary_tally * 1000:>11.3f} ms"
+            )
+
+        self.stdout.write("\nProjected tally time (single core):")
+        self.stdout.write(f"  {'ballots':>10}{'RSA hybrid':>14}{'X25519 hybrid':>14}{'ElGamal sum':>14}{'ElGamal dec':>14}{'ElGamal total':>15}")
+        for size in options['sizes']:
+            # Build an aggregate holding `size` votes spread over the candidates: k * Enc(1) = Enc(k)
+            one = crypto_utils.add_homomorphic_vote({}, crypto_utils.encrypt_vote_homomorphic(candidate_ids[0], candidate_ids[:1], eg_public))
+            c1, c2 = one[candidate_ids[0]]
+            share = size // len(candidate_ids)
+            sized_aggregate = {
+                candidate_id: (crypto_module._ec_multiply(c1, share), crypto_module._ec_multiply(c2, share))
+                for candidate_id in candidate_ids
+            }
+            start = time.perf_counter()
+            counts = crypto_utils.decrypt_homomorphic_tally(sized_aggregate, eg_private, size)
+            eg_final = time.perf_counter() - start
+            assert all(count == share for count in counts.values())
+
+            eg_sum = eg_add * size
+            self.stdout.write(
+                f"  {size:>10}{rsa_decrypt * size:>12.1f} s{x_decrypt * size:>12.1f} s{eg_sum:>12.1f} s{eg_final:>12.3f} s{eg_sum + eg_final:>13.1f} s"
+            )
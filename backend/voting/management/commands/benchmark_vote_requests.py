@@ -0,0 +1,90 @@
+# backend/voting/management/commands/benchmark_vote_requests.py
+import time
+from datetime import date, timedelta
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+from e_voting.crypto_utils import SCHEME_RSA_AES_GCM
+from voting import key_pool
+from voting.models import Election, Candidate
+from voting.views import SubmitVoteCommitmentView, VoteView
+
+User = get_user_model()
+
+class _Rollback(Exception):
+    pass
+
+class Command(BaseCommand):
+    help = (
+        'Measures the commit (/api/vote/commit/) and reveal (/api/vote/) request paths: mean latency '
+        'and queries per request. Runs against a throwaway election inside a transaction that is '
+        'rolled back, so nothing is left in the database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Voters to commit and reveal.')
+        parser.add_argument('--scheme', default=SCHEME_RSA_AES_GCM, choices=[choice for choice, _ in Election.ENCRYPTION_SCHEME_CHOICES])
+        parser.add_argument('--defer-reveal-checks', action='store_true', help='Benchmark an election that defers reveal checks to the tally.')
+
+    def _run(self, view, requests):
+        factory = APIRequestFactory()
+        elapsed = 0.0
+        queries = 0
+        for user, path, payload in requests:
+            request = factory.post(path, payload, format='json')
+            force_authenticate(request, user=user)
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = view(request)
+                elapsed += time.perf_counter() - start
+            queries += len(captured)
+            if response.status_code != 201:
+                raise RuntimeError(f"{path} returned {response.status_code}: {response.data}")
+        return elapsed / len(requests), queries / len(requests)
+
+    def handle(self, *args, **options):
+        count = options['requests']
+        try:
+            with transaction.atomic():
+                _, public_key_pem = key_pool.generate_key_pair_pem(options['scheme'])
+                now = timezone.now()
+                election = Election.objects.create(
+                    name=f'Request benchmark {now.isoformat()}',
+                    start_time=now - timedelta(hours=1),
+                    end_time=now + timedelta(hours=1),
+                    is_active=True,
+                    encryption_scheme=options['scheme'],
+                    defer_reveal_checks=options['defer_reveal_checks'],
+                    rsa_public_key_pem=public_key_pem
+                )
+                candidates = [Candidate.objects.create(election=election, name=f'Candidate {i}') for i in range(3)]
+                users = [
+                    User.objects.create(
+                        email=f'benchmark-voter-{i}@example.com', first_name='Benchmark', last_name=f'Voter{i}',
+                        identity_number=f'{90000000000 + i}', birth_date=date(1990, 1, 1), is_active=True
+                    )
+                    for i in range(count)
+                ]
+                ballots = [
+                    (user, {'election_id': election.id, 'candidate_id': candidates[i % 3].id, 'nonce': f'nonce-{i}'})
+                    for i, user in enumerate(users)
+                ]
+
+                commit_latency, commit_queries = self._run(
+                    SubmitVoteCommitmentView.as_view(), [(user, '/api/vote/commit/', payload) for user, payload in ballots]
+                )
+                reveal_latency, reveal_queries = self._run(
+                    VoteView.as_view(), [(user, '/api/vote/', payload) for user, payload in ballots]
+                )
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+        checks = 'deferred' if options['defer_reveal_checks'] else 'inline'
+        self.stdout.write(f"{count} voters, {options['scheme']} election, {checks} reveal checks (single thread, in-process requests):")
+        self.stdout.write(f"  {'':10}{'mean latency':>16}{'queries/request':>18}")
+        self.stdout.write(f"  {'commit':10}{commit_latency * 1000:>13.2f} ms{commit_queries:>18.1f}")
+        self.stdout.write(f"  {'reveal':10}{reveal_latency * 1000:>13.2f} ms{reveal_queries:>18.1f}")
@@ -0,0 +1,36 @@
+# backend/voting/management/commands/export_ballots.py
+import base64
+import json
+from django.core.management.base import BaseCommand, CommandError
+from voting.models import Election
+from voting import tally
+
+class Command(BaseCommand):
+    help = (
+        'Exports the encrypted ballots of an election for auditing, one JSON object per line. '
+        'Ballots are read from wherever they are stored (Ballot table or ballot log); they carry no '
+        'voter identity, and ballot ids are not exported.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('election_id', type=int)
+        parser.add_argument('--output', required=True, help='File to write the ballots to.')
+
+    def handle(self, *args, **options):
+        try:
+            election = Election.objects.get(pk=options['election_id'])
+        except Election.DoesNotExist:
+            raise CommandError(f"Election {options['election_id']} does not exist.")
+
+        exported = 0
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            try:
+                for _, encrypted_vote_data in tally.iter_encrypted_ballots(election):
+                    output.write(json.dumps({'ballot': base64.b64encode(encrypted_vote_data).decode('ascii')}) + '\n')
+                    exported += 1
+            except ValueError as e:
+                raise CommandError(f"{e} The export in {options['output']} is incomplete.")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {exported} ballot(s) of election {election.id} ({election.encryption_scheme}) to {options['output']}."
+        ))
@@ -0,0 +1,21 @@
+# backend/voting/management/commands/fill_election_key_pool.py
+from django.core.management.base import BaseCommand
+from e_voting.crypto_utils import SCHEME_RSA_AES_GCM
+from voting import key_pool
+
+class Command(BaseCommand):
+    help = 'Pre-generates election key pairs so creating many elections does not wait on key generation.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--count', type=int, default=None,
+            help='Number of ready key pairs to have in the pool (default: ELECTION_KEY_POOL_SIZE).'
+        )
+        parser.add_argument(
+            '--scheme', default=SCHEME_RSA_AES_GCM, choices=sorted(key_pool.POOLED_SCHEMES),
+            help='Encryption scheme to generate keys for.'
+        )
+
+    def handle(self, *args, **options):
+        added = key_pool.fill_pool(options['scheme'], options['count'])
+        self.stdout.write(self.style.SUCCESS(f"Added {added} {options['scheme']} key pair(s) to the election key pool."))
@@ -0,0 +1,35 @@
+# backend/voting/management/commands/reconcile_election_counters.py
+from django.core.management.base import BaseCommand, CommandError
+from voting.models import Election
+from voting import counters
+
+class Command(BaseCommand):
+    help = (
+        'Rebuilds the participation counters (commitments, ballots, decryption errors) of elections '
+        'from the VoteCommitment, Ballot and TallyJob tables, and reports any that had drifted. '
+        'Safe to run while votes are being cast.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('election_ids', type=int, nargs='*', help='Elections to rebuild (default: all).')
+
+    def handle(self, *args, **options):
+        election_ids = options['election_ids']
+        if election_ids:
+            missing = set(election_ids) - set(Election.objects.filter(pk__in=election_ids).values_list('id', flat=True))
+            if missing:
+                raise CommandError(f"Election(s) {', '.join(map(str, sorted(missing)))} do not exist.")
+        else:
+            election_ids = list(Election.objects.order_by('id').values_list('id', flat=True))
+
+        drifted = 0
+        for election_id in election_ids:
+            before, after = counters.rebuild(election_id)
+            if before != after:
+                drifted += 1
+                changes = ', '.join(f"{name} {before[name]} -> {after[name]}" for name in counters.COUNTERS if before[name] != after[name])
+                self.stdout.write(self.style.WARNING(f"Election {election_id}: {changes}"))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt the counters of {len(election_ids)} election(s); {drifted} had drifted."
+        ))
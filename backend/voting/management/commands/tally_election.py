@@ -0,0 +1,44 @@
+# backend/voting/management/commands/tally_election.py
+from django.core.management.base import BaseCommand, CommandError
+from cryptography.hazmat.primitives import serialization
+from e_voting.crypto_utils import crypto_utils
+from voting.models import Election, TallyJob
+from voting import tally_jobs
+
+class Command(BaseCommand):
+    help = (
+        'Runs a tally job for an election in this process (instead of the web server) '
+        'and writes the signed results to the election.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('election_id', type=int)
+        parser.add_argument('--private-key-file', required=True, help='Path to the election private key PEM.')
+
+    def handle(self, *args, **options):
+        try:
+            election = Election.objects.get(pk=options['election_id'])
+        except Election.DoesNotExist:
+            raise CommandError(f"Election {options['election_id']} does not exist.")
+
+        with open(options['private_key_file'], 'rb') as key_file:
+            private_key_pem = key_file.read()
+        try:
+            serialization.load_pem_private_key(private_key_pem, password=None, backend=crypto_utils.backend)
+        except Exception as e:
+            raise CommandError(f"Invalid or malformed private key: {e}")
+
+        job, created = tally_jobs.create_tally_job(election)
+        if not created:
+            raise CommandError(f"Tally job {job.id} is already {job.state} for this election.")
+
+        self.stdout.write(f"Running tally job {job.id} over {job.total_votes} vote(s)...")
+        job = tally_jobs.run_tally_job(job.id, private_key_pem)
+        if job.state != TallyJob.State.SUCCEEDED:
+            raise CommandError(f"Tally job {job.id} failed: {job.error_message}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Tally job {job.id} finished: {job.processed_votes} vote(s) processed, "
+            f"{job.decryption_errors} with decryption issues."
+        ))
+        self.stdout.write(f"Results: {Election.objects.get(pk=election.pk).tallied_results_json}")
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.3 on 2026-10-18 01:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voting', '0008_remove_election_eligible_voters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TallyCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key_fingerprint', models.CharField(help_text='SHA-256 fingerprint of the election key the partial counts were decrypted with.', max_length=64)),
+                ('last_vote_id', models.BigIntegerField(default=0)),
+                ('partial_counts_json', models.TextField(default='{}', help_text='JSON of {candidate_id: count} for all votes up to last_vote_id.')),
+                ('decryption_errors', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('election', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='tally_checkpoint', to='voting.election')),
+            ],
+        ),
+    ]
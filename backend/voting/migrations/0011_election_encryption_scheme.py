@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-18 01:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voting', '0010_tallyjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='election',
+            name='encryption_scheme',
+            field=models.CharField(choices=[('rsa-aes-gcm', 'RSA-OAEP + AES-GCM hybrid'), ('ec-elgamal-p256', 'Exponential ElGamal on P-256 (homomorphic tally)')], default='rsa-aes-gcm', help_text='How ballots are encrypted. Fixed once the election key is generated.', max_length=32),
+        ),
+        migrations.AlterField(
+            model_name='tallycheckpoint',
+            name='partial_counts_json',
+            field=models.TextField(default='{}', help_text='JSON of the partial tally for all votes up to last_vote_id: {candidate_id: count}, or the running ciphertext aggregate for homomorphic elections.'),
+        ),
+    ]
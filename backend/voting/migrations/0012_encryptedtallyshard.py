@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-18 01:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voting', '0011_election_encryption_scheme'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EncryptedTallyShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('ballot_count', models.PositiveIntegerField(default=0)),
+                ('aggregate_json', models.TextField(default='{}', help_text='JSON of {candidate_id: [C1, C2]} base64 ciphertext sums.')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('election', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tally_shards', to='voting.election')),
+            ],
+            options={
+                'unique_together': {('election', 'shard')},
+            },
+        ),
+    ]
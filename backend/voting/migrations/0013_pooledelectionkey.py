@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-18 01:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voting', '0012_encryptedtallyshard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PooledElectionKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('encryption_scheme', models.CharField(choices=[('rsa-aes-gcm', 'RSA-OAEP + AES-GCM hybrid'), ('ec-elgamal-p256', 'Exponential ElGamal on P-256 (homomorphic tally)')], db_index=True, max_length=32)),
+                ('public_key_pem', models.TextField()),
+                ('private_key_pem', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,158 @@
+# Generated by Django 5.2.3 on 2026-10-18 01:45
+
+import base64
+import hashlib
+import json
+import struct
+
+from cryptography.hazmat.primitives import serialization
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+# Version 1 of the binary ballot format as it stood when this migration was written (see
+# e_voting/ballot_format.py): copied here so that later changes to that module don't change
+# what this migration writes or reads.
+SCHEME_RSA_AES_GCM = 'rsa-aes-gcm'
+SCHEME_EC_ELGAMAL = 'ec-elgamal-p256'
+BALLOT_FORMAT_VERSION = 1
+HEADER = struct.Struct('>BB8sBBH')
+KEY_ID_LENGTH = 8
+POINT_LENGTH = 65
+ELGAMAL_ENTRY = struct.Struct('>I')
+ELGAMAL_ENTRY_LENGTH = ELGAMAL_ENTRY.size + 2 * POINT_LENGTH
+SCHEME_CODES = {SCHEME_RSA_AES_GCM: 1, SCHEME_EC_ELGAMAL: 2}
+SCHEMES_BY_CODE = {code: scheme for scheme, code in SCHEME_CODES.items()}
+UNKNOWN_KEY_ID = bytes(KEY_ID_LENGTH)
+
+
+def _key_id(public_key):
+    # First 8 bytes of the SHA-256 of the key's DER SubjectPublicKeyInfo
+    der = public_key.public_bytes(encoding=serialization.Encoding.DER, format=serialization.PublicFormat.SubjectPublicKeyInfo)
+    return hashlib.sha256(der).digest()[:KEY_ID_LENGTH]
+
+
+def _encode_ballot(scheme, ballot_key_id, payload):
+    if scheme == SCHEME_RSA_AES_GCM:
+        encrypted_key = base64.b64decode(payload['encrypted_key'])
+        iv = base64.b64decode(payload['iv'])
+        tag = base64.b64decode(payload['tag'])
+        header = HEADER.pack(BALLOT_FORMAT_VERSION, SCHEME_CODES[scheme], ballot_key_id, len(iv), len(tag), len(encrypted_key))
+        return b''.join((header, encrypted_key, iv, tag, base64.b64decode(payload['ciphertext'])))
+    if scheme == SCHEME_EC_ELGAMAL:
+        if len(payload['candidate_ids']) != len(payload['ciphertexts']):
+            raise ValueError("Ballot candidate list does not match its ciphertexts.")
+        parts = [HEADER.pack(BALLOT_FORMAT_VERSION, SCHEME_CODES[scheme], ballot_key_id, 0, 0, 0)]
+        for candidate_id, (c1, c2) in zip(payload['candidate_ids'], payload['ciphertexts']):
+            parts.append(ELGAMAL_ENTRY.pack(candidate_id))
+            parts.append(base64.b64decode(c1).ljust(POINT_LENGTH, b'\x00')) # Infinity is one zero byte
+            parts.append(base64.b64decode(c2).ljust(POINT_LENGTH, b'\x00'))
+        return b''.join(parts)
+    raise ValueError(f"Unknown ballot encryption scheme '{scheme}'.")
+
+
+def _decode_ballot(data):
+    """The legacy JSON payload of a version 1 binary ballot."""
+    if len(data) < HEADER.size:
+        raise ValueError("Ballot is shorter than its header.")
+    version, scheme_code, _, iv_length, tag_length, key_length = HEADER.unpack_from(data)
+    if version != BALLOT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported ballot format version {version}.")
+    scheme = SCHEMES_BY_CODE.get(scheme_code)
+    body = data[HEADER.size:]
+    b64 = lambda field: base64.b64encode(field).decode()
+    if scheme == SCHEME_RSA_AES_GCM:
+        iv_start = key_length
+        tag_start = iv_start + iv_length
+        ciphertext_start = tag_start + tag_length
+        if len(body) < ciphertext_start:
+            raise ValueError("Ballot is shorter than its header declares.")
+        return {
+            'encrypted_key': b64(body[:iv_start]),
+            'iv': b64(body[iv_start:tag_start]),
+            'ciphertext': b64(body[ciphertext_start:]),
+            'tag': b64(body[tag_start:ciphertext_start]),
+        }
+    if scheme == SCHEME_EC_ELGAMAL:
+        if len(body) % ELGAMAL_ENTRY_LENGTH:
+            raise ValueError("ElGamal ballot body is not a whole number of entries.")
+        entries = range(0, len(body), ELGAMAL_ENTRY_LENGTH)
+        c1_start = ELGAMAL_ENTRY.size
+        c2_start = c1_start + POINT_LENGTH
+        return {
+            'scheme': SCHEME_EC_ELGAMAL,
+            'candidate_ids': [ELGAMAL_ENTRY.unpack_from(body, offset)[0] for offset in entries],
+            'ciphertexts': [
+                [b64(body[offset + c1_start:offset + c2_start]), b64(body[offset + c2_start:offset + ELGAMAL_ENTRY_LENGTH])]
+                for offset in entries
+            ],
+        }
+    raise ValueError(f"Unknown ballot scheme code {scheme_code}.")
+
+
+def _election_key_ids(Election):
+    key_ids = {}
+    for election_id, public_key_pem in Election.objects.values_list('id', 'rsa_public_key_pem'):
+        try:
+            key_ids[election_id] = _key_id(serialization.load_pem_public_key(public_key_pem.encode()))
+        except Exception:
+            key_ids[election_id] = UNKNOWN_KEY_ID
+    return key_ids
+
+
+def _rewrite_ballots(apps, convert):
+    Vote = apps.get_model('voting', 'Vote')
+    batch = []
+    for vote in Vote.objects.only('id', 'election_id', 'encrypted_vote_data').iterator(chunk_size=BATCH_SIZE):
+        data = vote.encrypted_vote_data
+        data = data.encode() if isinstance(data, str) else bytes(data)
+        try:
+            vote.encrypted_vote_data = convert(vote, data)
+        except Exception as e:
+            # Leave unreadable ballots untouched; the tally counts them as decryption errors
+            print(f"Warning: Could not convert ballot of vote {vote.id}: {e}")
+            continue
+        batch.append(vote)
+        if len(batch) >= BATCH_SIZE:
+            Vote.objects.bulk_update(batch, ['encrypted_vote_data'])
+            batch = []
+    if batch:
+        Vote.objects.bulk_update(batch, ['encrypted_vote_data'])
+
+
+def ballots_to_binary(apps, schema_editor):
+    key_ids = _election_key_ids(apps.get_model('voting', 'Election'))
+
+    def convert(vote, data):
+        if not data.startswith(b'{'):
+            return data # Already binary
+        payload = json.loads(data)
+        scheme = payload.get('scheme', SCHEME_RSA_AES_GCM)
+        return _encode_ballot(scheme, key_ids.get(vote.election_id, UNKNOWN_KEY_ID), payload)
+
+    _rewrite_ballots(apps, convert)
+
+
+def ballots_to_json(apps, schema_editor):
+    def convert(vote, data):
+        if data.startswith(b'{'):
+            return data # Already JSON
+        return json.dumps(_decode_ballot(data)).encode()
+
+    _rewrite_ballots(apps, convert)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voting', '0013_pooledelectionkey'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='vote',
+            name='encrypted_vote_data',
+            field=models.BinaryField(),
+        ),
+        migrations.RunPython(ballots_to_binary, ballots_to_json),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-18 01:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voting', '0014_binary_ballot_format'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='election',
+            name='encryption_scheme',
+            field=models.CharField(choices=[('rsa-aes-gcm', 'RSA-OAEP + AES-GCM hybrid'), ('ec-elgamal-p256', 'Exponential ElGamal on P-256 (homomorphic tally)'), ('x25519-aes-gcm', 'X25519 ECIES + AES-GCM hybrid')], default='rsa-aes-gcm', help_text='How ballots are encrypted. Fixed once the election key is generated.', max_length=32),
+        ),
+        migrations.AlterField(
+            model_name='pooledelectionkey',
+            name='encryption_scheme',
+            field=models.CharField(choices=[('rsa-aes-gcm', 'RSA-OAEP + AES-GCM hybrid'), ('ec-elgamal-p256', 'Exponential ElGamal on P-256 (homomorphic tally)'), ('x25519-aes-gcm', 'X25519 ECIES + AES-GCM hybrid')], db_index=True, max_length=32),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 01:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voting', '0015_x25519_encryption_scheme'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='election',
+            name='client_side_encryption',
+            field=models.BooleanField(default=False, help_text="Voters' devices encrypt their ballots; the server only checks and stores them. Hybrid schemes only."),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-18 02:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voting', '0016_election_client_side_encryption'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vote',
+            name='ballot_offset',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='vote',
+            name='ballot_segment',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
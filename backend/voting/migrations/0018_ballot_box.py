@@ -0,0 +1,80 @@
+# Generated by Django 5.2.3 on 2026-10-18 02:05
+
+import random
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+
+def votes_to_ballots(apps, schema_editor):
+    # Ballots get fresh ids in a random order: neither the id nor the position of a ballot
+    # says which vote it came from. Tally checkpoints count in ballot id order, so they go.
+    Vote = apps.get_model('voting', 'Vote')
+    Ballot = apps.get_model('voting', 'Ballot')
+    TallyCheckpoint = apps.get_model('voting', 'TallyCheckpoint')
+    TallyCheckpoint.objects.all().delete()
+    vote_ids = list(Vote.objects.values_list('id', flat=True))
+    random.SystemRandom().shuffle(vote_ids)
+    for start in range(0, len(vote_ids), BATCH_SIZE):
+        votes = Vote.objects.only('election_id', 'encrypted_vote_data', 'ballot_segment', 'ballot_offset').in_bulk(vote_ids[start:start + BATCH_SIZE])
+        batch = [Ballot(
+            election_id=vote.election_id,
+            encrypted_vote_data=vote.encrypted_vote_data,
+            ballot_segment=vote.ballot_segment,
+            ballot_offset=vote.ballot_offset
+        ) for vote in (votes[vote_id] for vote_id in vote_ids[start:start + BATCH_SIZE])]
+        Ballot.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voting', '0017_vote_ballot_log_position'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Ballot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('encrypted_vote_data', models.BinaryField()),
+                ('ballot_segment', models.PositiveIntegerField(blank=True, null=True)),
+                ('ballot_offset', models.BigIntegerField(blank=True, null=True)),
+                ('election', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='ballots', to='voting.election')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['election', 'id'], name='voting_ballot_election_id_idx')],
+            },
+        ),
+        # Irreversible: nothing records which vote a ballot came from
+        migrations.RunPython(votes_to_ballots),
+        migrations.AlterField(
+            model_name='vote',
+            name='encrypted_vote_data',
+            field=models.BinaryField(default=b''),
+        ),
+        migrations.RemoveField(
+            model_name='vote',
+            name='ballot_offset',
+        ),
+        migrations.RemoveField(
+            model_name='vote',
+            name='ballot_segment',
+        ),
+        migrations.RemoveField(
+            model_name='vote',
+            name='encrypted_vote_data',
+        ),
+        migrations.RenameField(
+            model_name='tallycheckpoint',
+            old_name='last_vote_id',
+            new_name='last_ballot_id',
+        ),
+        migrations.AlterField(
+            model_name='tallycheckpoint',
+            name='partial_counts_json',
+            field=models.TextField(default='{}', help_text='JSON of the partial tally for all ballots up to last_ballot_id: {candidate_id: count}, or the running ciphertext aggregate for homomorphic elections.'),
+        ),
+    ]
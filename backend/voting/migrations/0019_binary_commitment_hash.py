@@ -0,0 +1,51 @@
+# Generated by Django 5.2.3 on 2026-10-18 02:11
+
+import base64
+
+from django.db import migrations, models
+
+
+def legacy_hashes_to_bytes(apps, schema_editor):
+    # Existing commitments are Base64 text (version 1); keep them as their ASCII bytes so they still verify
+    VoteCommitment = apps.get_model('voting', 'VoteCommitment')
+    connection = schema_editor.connection
+    table = connection.ops.quote_name(VoteCommitment._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT id, commitment_hash FROM {table}')
+        rows = cursor.fetchall()
+        updates = [(connection.Database.Binary(value.encode('ascii')), pk) for pk, value in rows if isinstance(value, str)]
+        if updates:
+            cursor.executemany(f'UPDATE {table} SET commitment_hash = %s WHERE id = %s', updates)
+
+
+def hashes_to_text(apps, schema_editor):
+    # Version 2 digests are written as Base64 text; the previous code cannot verify them
+    VoteCommitment = apps.get_model('voting', 'VoteCommitment')
+    connection = schema_editor.connection
+    table = connection.ops.quote_name(VoteCommitment._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT id, commitment_hash FROM {table}')
+        updates = []
+        for pk, value in cursor.fetchall():
+            if isinstance(value, str):
+                continue
+            value = bytes(value)
+            updates.append((base64.b64encode(value).decode() if len(value) == 32 else value.decode('ascii'), pk))
+        if updates:
+            cursor.executemany(f'UPDATE {table} SET commitment_hash = %s WHERE id = %s', updates)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voting', '0018_ballot_box'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='votecommitment',
+            name='commitment_hash',
+            field=models.BinaryField(max_length=64),
+        ),
+        migrations.RunPython(legacy_hashes_to_bytes, hashes_to_text),
+    ]
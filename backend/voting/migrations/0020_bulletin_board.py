@@ -0,0 +1,152 @@
+# Generated by Django 5.2.3 on 2026-10-18 02:15
+
+import hashlib
+import os
+import struct
+import zlib
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+# The ballot log record format and the bulletin board tree as they stood when this migration
+# was written (see voting/ballot_log.py and voting/bulletin_board.py): copied here so that later
+# changes to those modules don't change what this migration reads or the trees it builds.
+RECORD_HEADER = struct.Struct('>II') # payload length, CRC32 of the payload
+HASH_SIZE = 32
+
+
+def _segment_path(election_id, segment):
+    log_dir = str(getattr(settings, 'BALLOT_LOG_DIR', os.path.join(settings.BASE_DIR, 'ballot_log')))
+    return os.path.join(log_dir, str(election_id), f'{segment:08d}.seg')
+
+
+def _read_log_ballot(segment_files, election_id, segment, offset):
+    segment_file = segment_files.get(segment)
+    if segment_file is None:
+        segment_file = segment_files[segment] = open(_segment_path(election_id, segment), 'rb')
+    segment_file.seek(offset)
+    header = segment_file.read(RECORD_HEADER.size)
+    if len(header) < RECORD_HEADER.size:
+        raise ValueError(f"Ballot record at {segment}:{offset} is past the end of its segment.")
+    length, checksum = RECORD_HEADER.unpack(header)
+    payload = segment_file.read(length)
+    if len(payload) < length:
+        raise ValueError(f"Ballot record at {segment}:{offset} is past the end of its segment.")
+    if zlib.crc32(payload) != checksum:
+        raise ValueError(f"Ballot record at {segment}:{offset} fails its checksum.")
+    return payload
+
+
+def _leaf_hash(ballot):
+    return hashlib.sha256(b'\x00' + hashlib.sha256(ballot).digest()).digest()
+
+
+def _node_hash(left, right):
+    return hashlib.sha256(b'\x01' + left + right).digest()
+
+
+def _append_leaves(size, peaks, leaves):
+    """Returns (new size, new peaks, [(level, position, hash)] of the subtrees completed)."""
+    nodes = []
+    for node in leaves:
+        level, position = 0, size
+        nodes.append((level, position, node))
+        while position & 1: # A right child completes its parent, whose left child is the last peak
+            node = _node_hash(peaks.pop(), node)
+            level += 1
+            position >>= 1
+            nodes.append((level, position, node))
+        peaks.append(node)
+        size += 1
+    return size, peaks, nodes
+
+
+def build_bulletin_boards(apps, schema_editor):
+    # Ballots cast before the bulletin board existed become its first leaves, in id order
+    Election = apps.get_model('voting', 'Election')
+    Ballot = apps.get_model('voting', 'Ballot')
+    BulletinBoard = apps.get_model('voting', 'BulletinBoard')
+    BulletinBoardNode = apps.get_model('voting', 'BulletinBoardNode')
+    for election_id in Election.objects.values_list('id', flat=True):
+        board = BulletinBoard.objects.create(election_id=election_id)
+        segment_files = {}
+        try:
+            ballots = Ballot.objects.filter(election_id=election_id).order_by('id').iterator(chunk_size=BATCH_SIZE)
+            batch = []
+            for ballot in ballots:
+                if ballot.ballot_segment is None:
+                    data = bytes(ballot.encrypted_vote_data)
+                else:
+                    data = _read_log_ballot(segment_files, election_id, ballot.ballot_segment, ballot.ballot_offset)
+                batch.append(_leaf_hash(data))
+                if len(batch) >= BATCH_SIZE:
+                    append_batch(BulletinBoardNode, board, batch)
+                    batch = []
+            if batch:
+                append_batch(BulletinBoardNode, board, batch)
+        finally:
+            for segment_file in segment_files.values():
+                segment_file.close()
+        board.save()
+
+
+def append_batch(BulletinBoardNode, board, leaves):
+    data = bytes(board.peaks)
+    peaks = [data[i:i + HASH_SIZE] for i in range(0, len(data), HASH_SIZE)]
+    board.size, peaks, nodes = _append_leaves(board.size, peaks, leaves)
+    board.peaks = b''.join(peaks)
+    BulletinBoardNode.objects.bulk_create([
+        BulletinBoardNode(election_id=board.election_id, level=level, position=position, hash=node)
+        for level, position, node in nodes
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voting', '0019_binary_commitment_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BulletinBoard',
+            fields=[
+                ('election', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='bulletin_board', serialize=False, to='voting.election')),
+                ('size', models.PositiveBigIntegerField(default=0)),
+                ('peaks', models.BinaryField(default=b'', help_text='Roots of the maximal complete subtrees, left to right, 32 bytes each.')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='election',
+            name='results_ballot_count',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='election',
+            name='results_merkle_root',
+            field=models.CharField(blank=True, help_text='Hex Merkle root of the ballots tallied.', max_length=64, null=True),
+        ),
+        migrations.AlterField(
+            model_name='election',
+            name='results_signature',
+            field=models.TextField(blank=True, help_text='Base64 Ed25519 signature of {results, ballot_count, merkle_root} (see tally_jobs.signed_results).', null=True),
+        ),
+        migrations.CreateModel(
+            name='BulletinBoardNode',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.PositiveSmallIntegerField()),
+                ('position', models.PositiveBigIntegerField()),
+                ('hash', models.BinaryField(max_length=32)),
+                ('election', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='bulletin_board_nodes', to='voting.election')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('level', 0)), fields=['election', 'hash'], name='voting_bbnode_leaf_hash_idx')],
+                'unique_together': {('election', 'level', 'position')},
+            },
+        ),
+        migrations.RunPython(build_bulletin_boards, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.3 on 2026-10-18 02:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+from e_voting.crypto_utils import load_system_signing_key
+
+
+def set_key_id_of_signed_results(apps, schema_editor):
+    # Results signed so far were signed with the key from the settings
+    private_key_b64 = getattr(settings, 'SYSTEM_ED25519_PRIVATE_KEY_B64', None)
+    public_key_b64 = getattr(settings, 'SYSTEM_ED25519_PUBLIC_KEY_B64', None)
+    if not (private_key_b64 or public_key_b64):
+        return
+    Election = apps.get_model('voting', 'Election')
+    Election.objects.filter(results_signature__isnull=False).exclude(results_signature='').update(
+        results_signing_key_id=load_system_signing_key(private_key_b64, public_key_b64).key_id
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voting', '0020_bulletin_board'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='election',
+            name='results_signing_key_id',
+            field=models.CharField(blank=True, help_text='Id of the system Ed25519 key that signed the results (see crypto_utils.SystemKeyRing).', max_length=16, null=True),
+        ),
+        migrations.RunPython(set_key_id_of_signed_results, migrations.RunPython.noop),
+    ]
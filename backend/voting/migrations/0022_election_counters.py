@@ -0,0 +1,54 @@
+# Generated by Django 5.2.3 on 2026-10-18 02:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_existing_votes(apps, schema_editor):
+    Election = apps.get_model('voting', 'Election')
+    VoteCommitment = apps.get_model('voting', 'VoteCommitment')
+    Ballot = apps.get_model('voting', 'Ballot')
+    TallyJob = apps.get_model('voting', 'TallyJob')
+    ElectionCounterShard = apps.get_model('voting', 'ElectionCounterShard')
+    commitments = dict(VoteCommitment.objects.values('election_id').annotate(n=Count('id')).values_list('election_id', 'n'))
+    ballots = dict(Ballot.objects.values('election_id').annotate(n=Count('id')).values_list('election_id', 'n'))
+    decryption_errors = {}
+    for election_id, errors in TallyJob.objects.filter(state='succeeded').order_by('finished_at').values_list('election_id', 'decryption_errors'):
+        decryption_errors[election_id] = errors # Last successful tally wins
+    ElectionCounterShard.objects.bulk_create([
+        ElectionCounterShard(
+            election_id=election_id,
+            shard=0,
+            commitments=commitments.get(election_id, 0),
+            ballots=ballots.get(election_id, 0),
+            decryption_errors=decryption_errors.get(election_id, 0),
+        )
+        for election_id in Election.objects.values_list('id', flat=True)
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voting', '0021_election_results_signing_key_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ElectionCounterShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('commitments', models.PositiveIntegerField(default=0)),
+                ('ballots', models.PositiveIntegerField(default=0)),
+                ('decryption_errors', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('election', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='counter_shards', to='voting.election')),
+            ],
+            options={
+                'unique_together': {('election', 'shard')},
+            },
+        ),
+        migrations.RunPython(count_existing_votes, migrations.RunPython.noop),
+    ]
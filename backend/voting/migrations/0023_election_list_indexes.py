@@ -0,0 +1,21 @@
+# Generated by Django 5.2.3 on 2026-10-18 02:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voting', '0022_election_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='election',
+            index=models.Index(fields=['start_time', 'id'], name='voting_election_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='election',
+            index=models.Index(fields=['is_active', 'start_time', 'id'], name='voting_election_active_idx'),
+        ),
+    ]
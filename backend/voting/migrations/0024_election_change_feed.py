@@ -0,0 +1,32 @@
+# Generated by Django 5.2.3 on 2026-10-18 02:31
+
+from django.db import migrations, models
+
+
+def start_feed(apps, schema_editor):
+    # Every existing election is a change since version 0
+    Election = apps.get_model('voting', 'Election')
+    ElectionChange = apps.get_model('voting', 'ElectionChange')
+    ElectionChange.objects.bulk_create([
+        ElectionChange(election_id=election_id) for election_id in Election.objects.order_by('id').values_list('id', flat=True)
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voting', '0023_election_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ElectionChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('election_id', models.BigIntegerField(unique=True)),
+                ('deleted', models.BooleanField(default=False)),
+                ('changed_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(start_feed, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+
+def discard_plaintext_keys(apps, schema_editor):
+    # Keys pooled so far were stored in the clear: never hand them out. The pool refills itself.
+    apps.get_model('voting', 'PooledElectionKey').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voting', '0024_election_change_feed'),
+    ]
+
+    operations = [
+        migrations.RunPython(discard_plaintext_keys, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='pooledelectionkey',
+            name='private_key_pem',
+        ),
+        migrations.AddField(
+            model_name='pooledelectionkey',
+            name='encrypted_private_key',
+            field=models.BinaryField(default=b'', help_text='Nonce | AES-GCM ciphertext of the private key PEM (see key_pool.seal_private_key).'),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations, models
+from django.db.models import F, Max
+
+
+def version_existing_changes(apps, schema_editor):
+    # The ids were the versions so far; the clock carries on from the highest
+    ElectionChange = apps.get_model('voting', 'ElectionChange')
+    ChangeFeedClock = apps.get_model('voting', 'ChangeFeedClock')
+    ElectionChange.objects.update(version=F('id'))
+    ChangeFeedClock.objects.create(pk=1, version=ElectionChange.objects.aggregate(latest=Max('version'))['latest'] or 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voting', '0025_encrypt_pooled_election_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeFeedClock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='electionchange',
+            name='version',
+            field=models.PositiveBigIntegerField(null=True),
+        ),
+        migrations.RunPython(version_existing_changes, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='electionchange',
+            name='version',
+            field=models.PositiveBigIntegerField(unique=True),
+        ),
+    ]
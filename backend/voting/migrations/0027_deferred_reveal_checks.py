@@ -0,0 +1,41 @@
+# Generated by Django 5.2.3 on 2026-10-18 03:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voting', '0026_commit_ordered_change_feed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ballot',
+            name='pending_commitment_hash',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ballot',
+            name='pending_nonce',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='ballot',
+            name='rejected',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='election',
+            name='defer_reveal_checks',
+            field=models.BooleanField(default=False, help_text='Reveals are stored without checking them against their commitments; they are all checked in bulk before the tally, and ballots whose reveal did not match are not counted.'),
+        ),
+        migrations.AddIndex(
+            model_name='ballot',
+            index=models.Index(condition=models.Q(('pending_commitment_hash__isnull', False)), fields=['election', 'id'], name='voting_ballot_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ballot',
+            index=models.Index(condition=models.Q(('rejected', True)), fields=['election', 'id'], name='voting_ballot_rejected_idx'),
+        ),
+    ]
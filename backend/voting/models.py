@@ -4,15 +4,49 @@ from django.conf import settings
 from django.utils import timezone
 from datetime import timedelta
 import uuid
+from e_voting.crypto_utils import SCHEME_RSA_AES_GCM, SCHEME_EC_ELGAMAL, SCHEME_X25519_AES_GCM
 
 # --- DEFINE Election FIRST if other models in this file reference it by class name ---
+class ElectionQuerySet(models.QuerySet):
+    """Database-side versions of Election.is_open_for_voting, for filtering lists of elections."""
+    def open_for_voting(self, now=None):
+        now = now or timezone.now()
+        return self.filter(is_active=True, start_time__lte=now, end_time__gte=now)
+
+    def upcoming(self, now=None):
+        return self.filter(is_active=True, start_time__gt=now or timezone.now())
+
+    def closed(self, now=None):
+        # Neither open nor going to open: over, or not active
+        return self.filter(models.Q(is_active=False) | models.Q(end_time__lt=now or timezone.now()))
+
 class Election(models.Model):
     name = models.CharField(max_length=255, unique=True)
     description = models.TextField(blank=True)
     start_time = models.DateTimeField()
     end_time = models.DateTimeField()
     is_active = models.BooleanField(default=False)
-    rsa_public_key_pem = models.TextField(blank=True, null=True)
+    ENCRYPTION_SCHEME_CHOICES = [
+        (SCHEME_RSA_AES_GCM, 'RSA-OAEP + AES-GCM hybrid'),
+        (SCHEME_EC_ELGAMAL, 'Exponential ElGamal on P-256 (homomorphic tally)'),
+        (SCHEME_X25519_AES_GCM, 'X25519 ECIES + AES-GCM hybrid'),
+    ]
+    encryption_scheme = models.CharField(
+        max_length=32,
+        choices=ENCRYPTION_SCHEME_CHOICES,
+        default=SCHEME_RSA_AES_GCM,
+        help_text="How ballots are encrypted. Fixed once the election key is generated."
+    )
+    client_side_encryption = models.BooleanField(
+        default=False,
+        help_text="Voters' devices encrypt their ballots; the server only checks and stores them. Hybrid schemes only."
+    )
+    defer_reveal_checks = models.BooleanField(
+        default=False,
+        help_text="Reveals are stored without checking them against their commitments; they are all checked "
+                  "in bulk before the tally, and ballots whose reveal did not match are not counted."
+    )
+    rsa_public_key_pem = models.TextField(blank=True, null=True) # Election public key PEM (RSA, P-256 or X25519, see encryption_scheme)
     
     # --- ADD/VERIFY THESE FIELDS ---
     tallied_results_json = models.TextField(
@@ -23,10 +57,27 @@ class Election(models.Model):
     results_signature = models.TextField(
         blank=True, 
         null=True,
-        help_text="Base64 Ed25519 signature of the tallied_results_json."
+        help_text="Base64 Ed25519 signature of {results, ballot_count, merkle_root} (see tally_jobs.signed_results)."
+    )
+    # The bulletin board (voting/bulletin_board.py) the results were signed with
+    results_ballot_count = models.PositiveBigIntegerField(blank=True, null=True)
+    results_merkle_root = models.CharField(max_length=64, blank=True, null=True, help_text="Hex Merkle root of the ballots tallied.")
+    results_signing_key_id = models.CharField(
+        max_length=16, blank=True, null=True,
+        help_text="Id of the system Ed25519 key that signed the results (see crypto_utils.SystemKeyRing)."
     )
     # --- END OF FIELDS TO ADD/VERIFY ---
 
+    objects = ElectionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Election lists are paged newest first (see pagination.ElectionCursorPagination),
+            # within the active elections for the open/upcoming filters
+            models.Index(fields=['start_time', 'id'], name='voting_election_start_idx'),
+            models.Index(fields=['is_active', 'start_time', 'id'], name='voting_election_active_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -41,6 +92,27 @@ class Election(models.Model):
 def candidate_photo_path(instance, filename):
     return f'candidate_photos/election_{instance.election.id}/{filename}'
 
+class ChangeFeedClock(models.Model):
+    """Single row holding the latest change feed version (see voting/change_feed.py)."""
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Change feed at version {self.version}"
+
+class ElectionChange(models.Model):
+    """
+    Latest change to an election or its candidates, for the change feed (see voting/change_feed.py).
+    Each change gives the election's row the next feed version. Not a foreign key, so the row
+    outlives a deleted election as its tombstone.
+    """
+    election_id = models.BigIntegerField(unique=True)
+    version = models.PositiveBigIntegerField(unique=True)
+    deleted = models.BooleanField(default=False)
+    changed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Change {self.version} of election {self.election_id}{' (deleted)' if self.deleted else ''}"
+
 class Candidate(models.Model):
     election = models.ForeignKey(Election, related_name='candidates', on_delete=models.CASCADE) # This is fine since Election is defined above
     name = models.CharField(max_length=255)
@@ -55,9 +127,12 @@ class Candidate(models.Model):
         return f"{self.name} ({self.election.name})"
 
 class Vote(models.Model):
+    """
+    Voter ledger: records that a user has voted in an election. The ballot itself is a
+    Ballot row with no foreign key to this one (see Ballot for what still links them).
+    """
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     election = models.ForeignKey(Election, on_delete=models.CASCADE) # Fine as Election is above
-    encrypted_vote_data = models.TextField() # Stores the JSON string from 
 
     voted_at = models.DateTimeField(auto_now_add=True)
 
@@ -65,7 +140,169 @@ class Vote(models.Model):
         unique_together = ('user', 'election')
 
     def __str__(self):
-        return f"Encrypted vote by {self.user.email} in election '{self.election.name}' at {self.voted_at.strftime('%Y-%m-%d %H:%M')}"
+        return f"Vote by {self.user.email} in election '{self.election.name}' at {self.voted_at.strftime('%Y-%m-%d %H:%M')}"
+
+class Ballot(models.Model):
+    """
+    Ballot box: one encrypted ballot per vote cast, with no user and no timestamp.
+    Tallies read an election's ballots in id order through the (election, id) index.
+
+    Ids (and bulletin board positions) follow the order ballots were stored in, which is
+    the order of Vote.voted_at on the direct path: someone reading both tables can line
+    them up. Group commit (voting/vote_ingest.py) shuffles the ballots of each batch,
+    which only blurs the order within a batch; ballots migrated from Vote rows were given
+    fresh ids in a random order.
+    """
+    election = models.ForeignKey(Election, related_name='ballots', on_delete=models.CASCADE, db_index=False)
+    encrypted_vote_data = models.BinaryField() # Encrypted ballot in the format of e_voting/ballot_format.py
+    # Set instead of encrypted_vote_data when the ballot is kept in the ballot log (voting/ballot_log.py)
+    ballot_segment = models.PositiveIntegerField(null=True, blank=True)
+    ballot_offset = models.BigIntegerField(null=True, blank=True)
+    # Elections with defer_reveal_checks: the commitment the ballot's reveal has to match, and for
+    # device-encrypted ballots the reveal's nonce (server-encrypted ballots carry it inside the
+    # ciphertext). Cleared by the deferred reveal check (voting/reveal_checks.py), which sets
+    # rejected when the reveal did not match. A rejected ballot stays on the bulletin board but is not counted.
+    pending_commitment_hash = models.BinaryField(null=True, blank=True)
+    pending_nonce = models.CharField(max_length=64, null=True, blank=True)
+    rejected = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['election', 'id'], name='voting_ballot_election_id_idx'),
+            models.Index(fields=['election', 'id'], condition=models.Q(pending_commitment_hash__isnull=False), name='voting_ballot_pending_idx'),
+            models.Index(fields=['election', 'id'], condition=models.Q(rejected=True), name='voting_ballot_rejected_idx'),
+        ]
+
+    def __str__(self):
+        return f"Ballot {self.id} in election '{self.election.name}'"
+
+class BulletinBoard(models.Model):
+    """Size and peaks of an election's Merkle tree over its ballots (see voting/bulletin_board.py)."""
+    election = models.OneToOneField(Election, related_name='bulletin_board', on_delete=models.CASCADE, primary_key=True)
+    size = models.PositiveBigIntegerField(default=0)
+    peaks = models.BinaryField(default=b'', help_text="Roots of the maximal complete subtrees, left to right, 32 bytes each.")
+
+    def __str__(self):
+        return f"Bulletin board of election {self.election_id} ({self.size} ballots)"
+
+class BulletinBoardNode(models.Model):
+    """A complete subtree of an election's ballot Merkle tree. Level 0 nodes are the ballots' leaves."""
+    election = models.ForeignKey(Election, related_name='bulletin_board_nodes', on_delete=models.CASCADE, db_index=False)
+    level = models.PositiveSmallIntegerField()
+    position = models.PositiveBigIntegerField()
+    hash = models.BinaryField(max_length=32)
+
+    class Meta:
+        unique_together = ('election', 'level', 'position')
+        indexes = [
+            # Finds a ballot's leaf from its hash, for inclusion proofs
+            models.Index(fields=['election', 'hash'], condition=models.Q(level=0), name='voting_bbnode_leaf_hash_idx'),
+        ]
+
+    def __str__(self):
+        return f"Node {self.level}:{self.position} of election {self.election_id}"
+
+class EncryptedTallyShard(models.Model):
+    """
+    Running homomorphic sum of the ballots of an ElGamal election, maintained as votes are cast.
+    Votes are spread over several shard rows so concurrent voters do not all lock the same row;
+    closing the election only has to add the shards together and decrypt one total per candidate.
+    """
+    election = models.ForeignKey(Election, related_name='tally_shards', on_delete=models.CASCADE)
+    shard = models.PositiveSmallIntegerField()
+    ballot_count = models.PositiveIntegerField(default=0)
+    aggregate_json = models.TextField(
+        default='{}',
+        help_text="JSON of {candidate_id: [C1, C2]} base64 ciphertext sums."
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('election', 'shard')
+
+    def __str__(self):
+        return f"Tally shard {self.shard} of election '{self.election.name}' ({self.ballot_count} ballots)"
+
+class ElectionCounterShard(models.Model):
+    """
+    Participation counters of an election (see voting/counters.py), kept up to date in the
+    transactions that store commitments and votes. Spread over several shard rows like
+    EncryptedTallyShard, so concurrent voters do not all update the same row.
+    """
+    election = models.ForeignKey(Election, related_name='counter_shards', on_delete=models.CASCADE)
+    shard = models.PositiveSmallIntegerField()
+    commitments = models.PositiveIntegerField(default=0)
+    ballots = models.PositiveIntegerField(default=0)
+    decryption_errors = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('election', 'shard')
+
+    def __str__(self):
+        return f"Counter shard {self.shard} of election '{self.election.name}'"
+
+class PooledElectionKey(models.Model):
+    """
+    A pre-generated election key pair waiting to be handed to a new election (see voting/key_pool.py).
+    The private key is stored AES-GCM encrypted under a key that is not in the database; claiming
+    deletes the row, so it only leaves the server through the one-time display to the admin, as
+    for inline generation.
+    """
+    encryption_scheme = models.CharField(max_length=32, choices=Election.ENCRYPTION_SCHEME_CHOICES, db_index=True)
+    public_key_pem = models.TextField()
+    encrypted_private_key = models.BinaryField(help_text="Nonce | AES-GCM ciphertext of the private key PEM (see key_pool.seal_private_key).")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Pooled {self.encryption_scheme} key {self.id}"
+
+class TallyCheckpoint(models.Model):
+    """Progress of an interrupted tally, so the next run resumes after last_ballot_id."""
+    election = models.OneToOneField(Election, related_name='tally_checkpoint', on_delete=models.CASCADE)
+    key_fingerprint = models.CharField(
+        max_length=64,
+        help_text="SHA-256 fingerprint of the election key the partial counts were decrypted with."
+    )
+    last_ballot_id = models.BigIntegerField(default=0)
+    partial_counts_json = models.TextField(
+        default='{}',
+        help_text="JSON of the partial tally for all ballots up to last_ballot_id: {candidate_id: count}, "
+                  "or the running ciphertext aggregate for homomorphic elections."
+    )
+    decryption_errors = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Tally checkpoint for election '{self.election.name}' at ballot {self.last_ballot_id}"
+
+class TallyJob(models.Model):
+    """A queued/background run of the decrypt-tally-sign process for one election."""
+    class State(models.TextChoices):
+        QUEUED = 'queued', 'Queued'
+        RUNNING = 'running', 'Running'
+        SUCCEEDED = 'succeeded', 'Succeeded'
+        FAILED = 'failed', 'Failed'
+
+    ACTIVE_STATES = (State.QUEUED, State.RUNNING)
+
+    election = models.ForeignKey(Election, related_name='tally_jobs', on_delete=models.CASCADE)
+    requested_by = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
+    state = models.CharField(max_length=16, choices=State.choices, default=State.QUEUED, db_index=True)
+    total_votes = models.PositiveIntegerField(default=0)
+    processed_votes = models.PositiveIntegerField(default=0)
+    decryption_errors = models.PositiveIntegerField(default=0)
+    error_message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Tally job {self.id} for election '{self.election.name}' ({self.state})"
 
 class EmailVerificationToken(models.Model):
     user = models.OneToOneField(
@@ -91,7 +328,9 @@ class EmailVerificationToken(models.Model):
 class VoteCommitment(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     election = models.ForeignKey(Election, on_delete=models.CASCADE)
-    commitment_hash = models.CharField(max_length=128, db_index=True) # To store the Base64 encoded hash
+    # Raw 32-byte SHA3-256 digest (crypto_utils commitment version 2). Commitments made before
+    # version 2 hold the ASCII bytes of their Base64 hash and still verify.
+    commitment_hash = models.BinaryField(max_length=64)
     # The actual nonce is NOT stored on the server until the reveal phase for this scheme.
     # The server only knows the hash(vote + nonce).
     # If you wanted the server to store the nonce separately for some reason, that's a different design.
@@ -102,4 +341,4 @@ class VoteCommitment(models.Model):
         unique_together = ('user', 'election') # User can only have one commitment per election
 
     def __str__(self):
-        return f"Commitment by {self.user.email} for election '{self.election.name}'"
\ No newline at end of file
+        return f"Commitment by {self.user.email} for election '{self.election.name}'"
@@ -0,0 +1,17 @@
+# backend/voting/pagination.py
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class ElectionCursorPagination(CursorPagination):
+    """
+    Cursor pagination of election lists, newest first. DRF positions the cursor on the
+    first ordering field only: a page is an indexed range scan from the previous page's
+    last start_time, however many elections came before it, and elections sharing that
+    start_time are stepped over with an offset (a run of equal start_times is read again
+    by every page it spans). The id only makes the order total.
+    """
+    ordering = ('-start_time', '-id')
+    page_size = max(1, int(getattr(settings, 'ELECTION_LIST_PAGE_SIZE', 20)))
+    page_size_query_param = 'page_size'
+    max_page_size = 100
@@ -0,0 +1,72 @@
+# backend/voting/results_cache.py
+"""
+Rendered results of closed elections, served with a strong ETag.
+
+After an election closes, its results only change when a tally job writes
+new ones, yet every voter requests the results page. ElectionViewSet.results
+therefore renders the JSON body once and keeps it, with the SHA-256 of the
+body as its ETag, until the Election post_save/post_delete signal drops it
+(see voting/signals.py). A request whose If-None-Match matches gets a 304
+without the election being rendered.
+
+Entries use the election state cache's backends and settings
+(ELECTION_CACHE_BACKEND, ELECTION_CACHE_ALIAS, ELECTION_CACHE_TIMEOUT). The
+signal only reaches the worker that saved the election, so every lookup also
+reads the election's results_signature, which each tally replaces, and
+renders the results again when it differs from the cached one: no worker
+serves the results or ETag of a replaced tally. Other edits (say, a renamed
+candidate) may still take up to ELECTION_CACHE_TIMEOUT seconds to reach
+other workers with the 'local' backend. Elections open for voting are never
+cached.
+"""
+import hashlib
+from collections import namedtuple
+
+from django.conf import settings
+from rest_framework.renderers import JSONRenderer
+
+from .election_cache import ElectionStateCache, LocalMemoryBackend, DjangoCacheBackend
+from .models import Election
+from .serializers import ElectionResultSerializer
+
+# results_signature: the tally the body was rendered from
+RenderedResults = namedtuple('RenderedResults', ['etag', 'body', 'results_signature'])
+
+
+def render_results(election):
+    # No request: the body is what any voter sees once the election is closed
+    body = JSONRenderer().render(ElectionResultSerializer(election).data)
+    return RenderedResults(f'"{hashlib.sha256(body).hexdigest()}"', body, election.results_signature)
+
+
+def cache_control():
+    max_age = getattr(settings, 'RESULTS_MAX_AGE', 0)
+    return f'private, max-age={max_age}' if max_age > 0 else 'private, no-cache'
+
+
+class ElectionResultsCache(ElectionStateCache):
+    """Read-through cache of RenderedResults by election id; same backends as the election state cache."""
+
+    def load(self, election_id):
+        election = Election.objects.filter(pk=election_id).first()
+        return render_results(election) if election is not None else None
+
+    def get(self, election_id):
+        """Return the RenderedResults of an election's latest tally, or None if it does not exist."""
+        results_signature = Election.objects.filter(pk=election_id).values_list('results_signature', flat=True).first()
+        rendered = super().get(election_id)
+        if rendered is not None and rendered.results_signature != results_signature:
+            # Tallied again since it was cached, maybe through another worker
+            self.invalidate(election_id)
+            rendered = super().get(election_id)
+        return rendered
+
+
+def _make_backend():
+    timeout = getattr(settings, 'ELECTION_CACHE_TIMEOUT', 30)
+    if getattr(settings, 'ELECTION_CACHE_BACKEND', 'local') == 'django':
+        return DjangoCacheBackend(getattr(settings, 'ELECTION_CACHE_ALIAS', 'default'), timeout, key_prefix='voting:election-results:')
+    return LocalMemoryBackend(getattr(settings, 'RESULTS_CACHE_SIZE', 256), timeout)
+
+
+election_results = ElectionResultsCache(_make_backend())
@@ -0,0 +1,142 @@
+# backend/voting/reveal_checks.py
+"""
+Deferred commitment checks.
+
+A reveal normally recomputes the voter's commitment from the revealed vote
+data and nonce before the ballot is stored. Elections with
+defer_reveal_checks (hybrid schemes only) skip that on the reveal request and
+do no other work in its place: the ballot is stored marked pending, with a
+copy of the commitment hash it has to match. The opening travels with the
+ballot itself. A server-encrypted ballot has the nonce encrypted next to the
+candidate; a device-encrypted ballot is what its commitment covers (by
+digest), so only its nonce is stored alongside (Ballot.pending_nonce).
+
+check_pending_reveals() then checks every pending ballot in bulk, chunk by
+chunk across settings.TALLY_WORKERS processes, decrypting the server-encrypted
+ones with the election key. Ballots whose opening does not match are marked
+rejected and are not counted (the tally counts them with the decryption
+errors). Every checked ballot has its pending fields cleared, since they link
+it to a voter's commitment. Tally jobs run it after taking their ballot
+snapshot, so every ballot a tally counts has been checked.
+
+The price of the deferral: a voter whose reveal does not match still gets a
+201, their ballot is only dropped at tally time, and server-encrypted ballots
+are decrypted twice (here and by the tally).
+"""
+import hashlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db import transaction
+from cryptography.hazmat.primitives import serialization
+
+from e_voting import ballot_format
+from e_voting.crypto_utils import crypto_utils
+from .models import Ballot
+from . import tally, ballot_log
+
+# Private key object of the current pool worker (set by _init_worker).
+_worker_private_key = None
+
+
+def _load_private_key(private_key_pem):
+    return serialization.load_pem_private_key(private_key_pem, password=None, backend=crypto_utils.backend)
+
+
+def _init_worker(private_key_pem):
+    global _worker_private_key
+    _worker_private_key = _load_private_key(private_key_pem)
+
+
+def _opening(election_id, scheme, encrypted_vote_data, nonce, private_key):
+    """The (vote data, nonce) the reveal that cast a ballot claimed its commitment opens to."""
+    if nonce is not None:
+        # Device-encrypted ballot: the commitment covers its digest
+        return {'ballot_sha256': hashlib.sha256(encrypted_vote_data).hexdigest(), 'election_id': election_id}, nonce
+    ballot = ballot_format.parse_ballot(encrypted_vote_data)
+    vote = tally.TALLY_STRATEGIES[scheme].decrypt_parts(ballot.encrypted_key, ballot.iv, ballot.ciphertext, ballot.tag, private_key)
+    return {'candidate_id': vote.get('candidate_id'), 'election_id': election_id}, vote.get('nonce')
+
+
+def _check_chunk(election_id, scheme, chunk, private_key=None):
+    """Ids of the ballots in a list of (ballot id, encrypted vote data, commitment hash, nonce) whose opening does not match."""
+    private_key = private_key or _worker_private_key
+    mismatched = []
+    for ballot_id, encrypted_vote_data, commitment_hash, nonce in chunk:
+        try:
+            vote_data, nonce = _opening(election_id, scheme, encrypted_vote_data, nonce, private_key)
+            matches = nonce is not None and crypto_utils.verify_vote_commitment(commitment_hash, vote_data, nonce)
+        except Exception: # An unreadable ballot opens nothing
+            matches = False
+        if not matches:
+            mismatched.append(ballot_id)
+    return mismatched
+
+
+def _pending_chunks(election, chunk_size):
+    """Chunks of the election's pending ballots as _check_chunk takes them, in id order."""
+    pending = Ballot.objects.filter(election=election, pending_commitment_hash__isnull=False)
+    last_seen_id = 0
+    with ballot_log.BallotLogReader(election.id) as log_reader:
+        while True:
+            rows = list(
+                pending.filter(id__gt=last_seen_id)
+                .order_by('id')
+                .values_list('id', 'encrypted_vote_data', 'ballot_segment', 'ballot_offset', 'pending_commitment_hash', 'pending_nonce')[:chunk_size]
+            )
+            if not rows:
+                return
+            # Bytes rather than memoryviews, which cannot be sent to pool workers
+            yield [
+                (ballot_id,
+                 log_reader.read(ballot_segment, ballot_offset) if ballot_segment is not None else bytes(encrypted_vote_data),
+                 bytes(commitment_hash),
+                 nonce)
+                for ballot_id, encrypted_vote_data, ballot_segment, ballot_offset, commitment_hash, nonce in rows
+            ]
+            last_seen_id = rows[-1][0]
+
+
+def _resolve(chunk, mismatched):
+    """Reject the chunk's mismatched ballots and clear the pending fields of all of them, in one transaction."""
+    with transaction.atomic():
+        Ballot.objects.filter(pk__in=mismatched).update(rejected=True)
+        Ballot.objects.filter(pk__in=[row[0] for row in chunk]).update(pending_commitment_hash=None, pending_nonce=None)
+
+
+def check_pending_reveals(election, private_key_pem, workers=None, chunk_size=None):
+    """
+    Check an election's pending ballots against their commitments. Returns (checked, rejected).
+    private_key_pem: election private key as PEM bytes, to read server-encrypted ballots.
+    Up to one chunk is checked inline; more are spread over a process pool of `workers`.
+    """
+    workers = workers or tally.get_tally_workers()
+    chunk_size = chunk_size or tally.get_tally_chunk_size()
+    checked = rejected = 0
+
+    def resolve(chunk, mismatched):
+        nonlocal checked, rejected
+        _resolve(chunk, mismatched)
+        checked += len(chunk)
+        rejected += len(mismatched)
+
+    if workers == 1 or Ballot.objects.filter(election=election, pending_commitment_hash__isnull=False).count() <= chunk_size:
+        private_key = _load_private_key(private_key_pem)
+        for chunk in _pending_chunks(election, chunk_size):
+            resolve(chunk, _check_chunk(election.id, election.encryption_scheme, chunk, private_key))
+    else:
+        # Keep a bounded number of chunks in flight, so the ballots are read at the pace they are checked
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(private_key_pem,)) as executor:
+            in_flight = deque()
+            for chunk in _pending_chunks(election, chunk_size):
+                if len(in_flight) >= workers * 2:
+                    done_chunk, future = in_flight.popleft()
+                    resolve(done_chunk, future.result())
+                in_flight.append((chunk, executor.submit(_check_chunk, election.id, election.encryption_scheme, chunk)))
+            while in_flight:
+                done_chunk, future = in_flight.popleft()
+                resolve(done_chunk, future.result())
+
+    if rejected:
+        print(f"Warning: {rejected} reveal(s) of election {election.id} did not match their commitment; their ballots are not counted.")
+    return checked, rejected
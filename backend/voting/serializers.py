@@ -3,12 +3,18 @@ from django.utils import timezone
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction, IntegrityError
+from django.conf import settings
+import hashlib
 import json
-from cryptography.hazmat.primitives import serialization
-from e_voting.crypto_utils import crypto_utils
+from e_voting.crypto_utils import crypto_utils, SCHEME_RSA_AES_GCM, SCHEME_EC_ELGAMAL, SCHEME_X25519_AES_GCM
+from e_voting import ballot_format
 import base64
  
-from .models import Election, Candidate, Vote, VoteCommitment
+from .models import Election, Candidate, Vote, Ballot, VoteCommitment, TallyJob
+from . import tally, vote_ingest, ballot_log, bulletin_board, counters
+from .key_cache import election_public_keys
+from .election_cache import election_states
  
  
 User = get_user_model() # Use your CustomUser model
@@ -190,10 +196,25 @@ class AdminCandidateNestedSerializer(serializers.ModelSerializer): # For nesting
 class ElectionSerializer(serializers.ModelSerializer): # For Voters (Read-only perspective)
     candidates = AdminCandidateNestedSerializer(many=True, read_only=True)
     is_open_for_voting = serializers.ReadOnlyField()
+    # The requesting user's ballot status, annotated by ElectionViewSet.get_queryset
+    has_committed = serializers.BooleanField(read_only=True)
+    has_voted = serializers.BooleanField(read_only=True)
  
     class Meta:
         model = Election
-        fields = ['id', 'name', 'description', 'start_time', 'end_time', 'is_active', 'candidates', 'is_open_for_voting']
+        fields = [
+            'id', 'name', 'description', 'start_time', 'end_time', 'is_active', 'candidates', 'is_open_for_voting',
+            # Needed by voters' devices to encrypt ballots when client_side_encryption is on
+            'encryption_scheme', 'client_side_encryption', 'rsa_public_key_pem',
+            'has_committed', 'has_voted',
+        ]
+ 
+    def __init__(self, *args, fields=None, **kwargs):
+        # fields: names to keep (the election list's ?fields= option); None keeps them all
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
  
 class AdminElectionSerializer(serializers.ModelSerializer): # For Admins
     # For READ operations, this will show nested candidates
@@ -208,9 +229,27 @@ class AdminElectionSerializer(serializers.ModelSerializer): # For Admins
             'id', 'name', 'description', 'start_time', 'end_time',
             'is_active', 'is_open_for_voting',
             'candidates',
+            'encryption_scheme',
+            'client_side_encryption',
+            'defer_reveal_checks',
             'rsa_public_key_pem',
             'temp_rsa_private_key_pem_for_display',
         ]
+ 
+    def validate(self, data):
+        scheme = data.get('encryption_scheme', getattr(self.instance, 'encryption_scheme', SCHEME_RSA_AES_GCM))
+        if data.get('client_side_encryption') and scheme == SCHEME_EC_ELGAMAL:
+            # The server could not check that a device-encrypted ElGamal ballot encrypts a single 0/1 vote
+            raise serializers.ValidationError(
+                {"client_side_encryption": "Client-side encryption is only available for the hybrid schemes."}
+            )
+        if data.get('defer_reveal_checks') and scheme == SCHEME_EC_ELGAMAL:
+            # The deferred check recovers a reveal's nonce from its ballot, which ElGamal ballots cannot carry
+            raise serializers.ValidationError(
+                {"defer_reveal_checks": "Deferred reveal checks are only available for the hybrid schemes."}
+            )
+        return data
+
     def create(self, validated_data):
         import json
         request = self.context.get('request')
@@ -249,6 +288,9 @@ class AdminElectionSerializer(serializers.ModelSerializer): # For Admins
         instance.start_time = validated_data.get('start_time', instance.start_time)
         instance.end_time = validated_data.get('end_time', instance.end_time)
         instance.is_active = validated_data.get('is_active', instance.is_active)
+        # encryption_scheme is deliberately not updatable: the election key was generated for it.
+        # Neither is client_side_encryption: it changes what commitments made so far cover.
+        # Nor defer_reveal_checks: reveals already stored unchecked would never be checked.
         
  
         instance.save()
@@ -259,12 +301,11 @@ class VoteSerializer(serializers.ModelSerializer):
     user = serializers.StringRelatedField(read_only=True)
     election = serializers.StringRelatedField(read_only=True)
  
-    election_id = serializers.PrimaryKeyRelatedField(
-        queryset=Election.objects.all(),
-        source='election', # This ensures data['election'] is an Election instance in validate/create
-        write_only=True   
-    )
-    candidate_id = serializers.IntegerField(write_only=True)
+    # Plain id: create() takes the election from the election state cache
+    election_id = serializers.IntegerField(write_only=True)
+    candidate_id = serializers.IntegerField(write_only=True, required=False)
+    # Base64 binary ballot encrypted on the voter's device (elections with client_side_encryption)
+    encrypted_ballot = serializers.CharField(write_only=True, required=False)
  
     nonce = serializers.CharField(write_only=True, required=True, max_length=64) # This is for input ONLY
  
@@ -275,102 +316,175 @@ class VoteSerializer(serializers.ModelSerializer):
             'user',                 # Read-only (from model instance)
             'election',             # Read-only (from model instance, shows __str__ of Election)
             'voted_at',             # Read-only
-            'encrypted_vote_data',  # Read-only (populated by create method)
             'election_id',          
             'candidate_id',
+            'encrypted_ballot',
             'nonce'            
         ]
-        read_only_fields = ['id', 'user', 'election', 'voted_at', 'encrypted_vote_data']
+        read_only_fields = ['id', 'user', 'election', 'voted_at']
  
     def validate(self, data):
-        user_casting_vote = self.context['request'].user
-        election_being_voted_in = data['election']
-        candidate_id_selected = data['candidate_id']
- 
-        nonce_from_request = data['nonce'] # 'nonce' is now correctly in 'data'
-        if not nonce_from_request:
+        # Only request-local checks here; everything that needs the database happens
+        # in create(), inside the transaction that stores the vote.
+        if not data['nonce']:
             raise serializers.ValidationError({"nonce": "Nonce is required to reveal your commitment."})
+        return data
  
-        if not election_being_voted_in.is_open_for_voting:
-            raise serializers.ValidationError("This election is not currently open for voting.")
- 
+    def _get_commitment(self, user, election_id, lock=True):
+        """Fetch the user's commitment, locking it unless lock=False. One query; locking needs a transaction."""
+        queryset = VoteCommitment.objects.select_for_update() if lock else VoteCommitment.objects
         try:
-            Candidate.objects.get(pk=candidate_id_selected, election=election_being_voted_in)
-        except Candidate.DoesNotExist:
-            raise serializers.ValidationError("Invalid candidate for this election.")
+            return queryset.get(user=user, election_id=election_id)
+        except VoteCommitment.DoesNotExist:
+            raise serializers.ValidationError("No prior vote commitment found for this election. Please commit first.")
  
-        if not election_being_voted_in.is_open_for_voting:
-            raise serializers.ValidationError("This election is not currently open for voting.")
-        
+    def _check_client_ballot(self, election, encrypted_ballot):
+        """Cheap checks on a ballot encrypted by the voter's device; no public-key operations."""
+        if not encrypted_ballot:
+            raise serializers.ValidationError({"encrypted_ballot": "This election expects a ballot encrypted on your device."})
+        max_size = getattr(settings, 'CLIENT_BALLOT_MAX_BYTES', 4096)
+        if len(encrypted_ballot) > (max_size + 2) // 3 * 4:
+            raise serializers.ValidationError({"encrypted_ballot": f"Ballot is larger than {max_size} bytes."})
         try:
-            Candidate.objects.get(pk=candidate_id_selected, election=election_being_voted_in)
-        except Candidate.DoesNotExist:
-            raise serializers.ValidationError("Invalid candidate for this election.")
+            ballot = base64.b64decode(encrypted_ballot, validate=True)
+        except ValueError:
+            raise serializers.ValidationError({"encrypted_ballot": "Ballot is not valid base64."})
  
-        if Vote.objects.filter(user=user_casting_vote, election=election_being_voted_in).exists():
-            raise serializers.ValidationError(
-                {"detail": "You have already voted in this election."}, code='already_voted'
-            )
-        
+        public_key_obj = election_public_keys.get(election)
+        wrapped_key_length = 32 if election.encryption_scheme == SCHEME_X25519_AES_GCM else public_key_obj.key_size // 8
         try:
-            commitment_obj = VoteCommitment.objects.get(user=user_casting_vote, election=election_being_voted_in)
-            if commitment_obj.is_revealed:
-                raise serializers.ValidationError("Your commitment for this election has already been revealed (voted).")
- 
-            vote_data_to_verify = {'candidate_id': candidate_id_selected, 'election_id': election_being_voted_in.id}
-            is_valid_commitment = crypto_utils.verify_vote_commitment(
-                commitment_obj.commitment_hash,
-                vote_data_to_verify,
-                nonce_from_request
+            ballot_format.check_hybrid_ballot(
+                ballot, election.encryption_scheme, election.key_id, wrapped_key_length, max_size
             )
-            if not is_valid_commitment:
-                raise serializers.ValidationError("Vote data or nonce does not match your commitment.")
-            data['commitment_obj'] = commitment_obj # Pass for create method
-        except VoteCommitment.DoesNotExist:
-            raise serializers.ValidationError("No prior vote commitment found for this election. Please commit first.")
-        
-        if not election_being_voted_in.rsa_public_key_pem:
+        except ValueError as e:
+            raise serializers.ValidationError({"encrypted_ballot": str(e)})
+        return ballot
+ 
+    def _prepare_vote(self, user, commitment_obj, validated_data):
+        """
+        Check a reveal against the user's commitment and build the unsaved Vote (ledger entry) and Ballot.
+        Returns (vote, ballot, homomorphic_payload); the payload is None unless the election uses ElGamal.
+        Elections that defer the check get a Ballot marked pending instead (see voting/reveal_checks.py).
+        """
+        candidate_id = validated_data.get('candidate_id')
+        nonce = validated_data['nonce']
+        election = election_states.get(commitment_obj.election_id) # ElectionState; no query when cached
+        if election is None:
+            raise serializers.ValidationError("Election not found.")
+        if commitment_obj.is_revealed:
+            raise serializers.ValidationError("Your commitment for this election has already been revealed (voted).")
+        if not election.is_open_for_voting:
+            raise serializers.ValidationError("This election is not currently open for voting.")
+        if not election.rsa_public_key_pem:
             raise serializers.ValidationError("Election is not configured for encrypted voting (missing public key).")
-            
-        return data
  
-    def create(self, validated_data):
-        # 'nonce' is an explicit serializer field but not a model field.
-        # It will be present in validated_data if it passed validation.
-        # We don't need to pop it if we are explicitly creating the Vote object
-        # with only its model fields.
-        
-        commitment_obj = validated_data.pop('commitment_obj')
+        if election.client_side_encryption:
+            # The ballot arrives encrypted; the commitment binds its SHA-256 digest instead of the candidate
+            ballot = self._check_client_ballot(election, validated_data.get('encrypted_ballot'))
+            vote_data_to_verify = {'ballot_sha256': hashlib.sha256(ballot).hexdigest(), 'election_id': election.id}
+        else:
+            if candidate_id is None:
+                raise serializers.ValidationError({"candidate_id": "This field is required."})
+            if candidate_id not in election.candidate_ids:
+                raise serializers.ValidationError("Invalid candidate for this election.")
+            ballot = None
+            vote_data_to_verify = {'candidate_id': candidate_id, 'election_id': election.id}
+ 
+        # Deferred: checked in bulk before the tally, where a mismatch keeps the ballot from being counted
+        if not election.defer_reveal_checks and not crypto_utils.verify_vote_commitment(commitment_obj.commitment_hash, vote_data_to_verify, nonce):
+            raise serializers.ValidationError("Vote data or nonce does not match your commitment.")
+ 
+        homomorphic_payload = None
+        if ballot is None:
+            vote_to_encrypt = {'candidate_id': candidate_id, 'election_id': election.id}
+            if election.defer_reveal_checks:
+                vote_to_encrypt['nonce'] = nonce # Only readable with the election key, which the check gets
+            public_key_obj = election_public_keys.get(election) # Parsed once per election and process
+            if election.encryption_scheme == SCHEME_EC_ELGAMAL:
+                # One ciphertext per candidate so ballots can be summed before decryption
+                election_candidate_ids = sorted(election.candidate_ids)
+                encrypted_payload = crypto_utils.encrypt_vote_homomorphic(candidate_id, election_candidate_ids, public_key_obj)
+                homomorphic_payload = encrypted_payload
+            elif election.encryption_scheme == SCHEME_X25519_AES_GCM:
+                encrypted_payload = crypto_utils.encrypt_vote_x25519(vote_to_encrypt, public_key_obj)
+            else:
+                encrypted_payload = crypto_utils.encrypt_vote(vote_to_encrypt, public_key_obj)
+            ballot = ballot_format.encode_ballot(election.encryption_scheme, election.key_id, encrypted_payload)
+ 
+        ballot = Ballot(election_id=election.id, encrypted_vote_data=ballot)
+        if election.defer_reveal_checks:
+            ballot.pending_commitment_hash = commitment_obj.commitment_hash
+            if election.client_side_encryption:
+                ballot.pending_nonce = nonce
+        return Vote(user=user, election_id=election.id), ballot, homomorphic_payload
  
+    def create(self, validated_data):
         user = self.context['request'].user
-        election = validated_data['election']
-        candidate_id = validated_data['candidate_id']
+        election_id = validated_data['election_id']
+ 
+        # The (user, election) unique constraint on Vote is what prevents double voting:
+        # a concurrent second reveal fails on INSERT and its whole transaction rolls back.
+        try:
+            if vote_ingest.is_enabled():
+                # Group commit: the writer thread stores the vote together with other requests' votes,
+                # so the commitment is read without a lock and the unique constraint does the rest.
+                commitment_obj = self._get_commitment(user, election_id, lock=False)
+                vote, ballot, homomorphic_payload = self._prepare_vote(user, commitment_obj, validated_data)
+                self.ballot_sha256 = hashlib.sha256(ballot.encrypted_vote_data).hexdigest() # The voter's receipt
+                return vote_ingest.ingest_queue.submit(
+                    vote_ingest.PendingVote(vote, ballot, commitment_obj.pk, homomorphic_payload)
+                )
+ 
+            with transaction.atomic():
+                commitment_obj = self._get_commitment(user, election_id)
+                vote, ballot, homomorphic_payload = self._prepare_vote(user, commitment_obj, validated_data)
+                self.ballot_sha256 = hashlib.sha256(ballot.encrypted_vote_data).hexdigest() # The voter's receipt
+                vote.save() # Ledger entry first: a second vote fails here, before its ballot is stored
+                bulletin_board.append_ballots([ballot])
+                if ballot_log.is_enabled():
+                    ballot_log.move_to_log([ballot])
+                ballot.save()
+                if homomorphic_payload is not None:
+                    # Keep the election's running encrypted sum up to date in the same transaction
+                    tally.add_to_running_aggregate(vote.election_id, [homomorphic_payload])
+                VoteCommitment.objects.filter(pk=commitment_obj.pk).update(is_revealed=True)
+                counters.add(vote.election_id, ballots=1)
+        except IntegrityError:
+            raise serializers.ValidationError(
+                {"detail": "You have already voted in this election."}, code='already_voted'
+            )
  
-        vote_to_encrypt = {'candidate_id': candidate_id, 'election_id': election.id}
-        
-        public_key_obj = serialization.load_pem_public_key(
-            election.rsa_public_key_pem.encode('utf-8'),
-            backend=crypto_utils.backend
-        )
-        encrypted_payload = crypto_utils.encrypt_vote(vote_to_encrypt, public_key_obj)
-        
-        vote = Vote.objects.create(
-            user=user,
-            election=election,
-            encrypted_vote_data=json.dumps(encrypted_payload)
-        )
-        
-        commitment_obj.is_revealed = True
-        commitment_obj.save()
-        
         return vote
  
+
+# --- TallyJobSerializer ---
+class TallyJobSerializer(serializers.ModelSerializer):
+    election_name = serializers.CharField(source='election.name', read_only=True)
+    progress_percentage = serializers.SerializerMethodField()
+ 
+    class Meta:
+        model = TallyJob
+        fields = [
+            'id', 'election', 'election_name', 'state',
+            'total_votes', 'processed_votes', 'decryption_errors', 'progress_percentage',
+            'error_message', 'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = fields
+ 
+    def get_progress_percentage(self, obj):
+        if not obj.total_votes:
+            return 100.0 if obj.state == TallyJob.State.SUCCEEDED else 0.0
+        return round(min(obj.processed_votes, obj.total_votes) / obj.total_votes * 100, 1)
+ 
  
 # --- ElectionResultSerializer ---
 class ElectionResultSerializer(serializers.ModelSerializer):
      # 'results' will now come from the pre-tallied JSON stored on the Election model
     results = serializers.SerializerMethodField()
     signature = serializers.CharField(source='results_signature', read_only=True, allow_null=True)
+    ballot_count = serializers.IntegerField(source='results_ballot_count', read_only=True, allow_null=True)
+    merkle_root = serializers.CharField(source='results_merkle_root', read_only=True, allow_null=True)
+    signing_key_id = serializers.CharField(source='results_signing_key_id', read_only=True, allow_null=True)
     system_ed25519_public_key_b64 = serializers.SerializerMethodField() # To provide public key for verification
  
     class Meta:
@@ -379,7 +493,10 @@ class ElectionResultSerializer(serializers.ModelSerializer):
             'id',
             'name',
             'results',      # The processed results with percentages
-            'signature',    # The Ed25519 signature of the raw tallied results
+            'ballot_count', # Size of the bulletin board the results were tallied from
+            'merkle_root',  # Its Merkle root (hex); see ElectionViewSet.inclusion_proof
+            'signature',    # Ed25519 signature of the raw tallied results, ballot_count and merkle_root
+            'signing_key_id', # Id of the system key that made it
             'system_ed25519_public_key_b64' # The system's public key to verify the signature
         ]
  
@@ -399,8 +516,9 @@ class ElectionResultSerializer(serializers.ModelSerializer):
         # --- Display Pre-Tallied Results (from tallied_results_json) ---
         if not obj_election.tallied_results_json: # Check if tallying has been performed and results stored
             # If votes exist but haven't been tallied, give a different message
-            if Vote.objects.filter(election=obj_election).exists():
-                 return f"{Vote.objects.filter(election=obj_election).count()} encrypted vote(s) recorded. Tallying process not yet run or completed."
+            vote_count = counters.get_counts(obj_election.id)['ballots']
+            if vote_count:
+                 return f"{vote_count} encrypted vote(s) recorded. Tallying process not yet run or completed."
             return "No votes have been cast, or results are not yet tallied for this election."
             
         try:
@@ -428,55 +546,65 @@ class ElectionResultSerializer(serializers.ModelSerializer):
             return "An error occurred while preparing results for display."
  
     def get_system_ed25519_public_key_b64(self, obj):
-        # Provide the system's public key (Base64 encoded) for frontend verification display
+        # The (Base64) public key of the system key that signed these results, for verification display;
+        # precomputed in the key ring. The active key when the results are not signed yet.
         try:
-            public_key = crypto_utils.get_system_ed25519_public_key() # Assumes this method exists in crypto_utils
-            public_key_bytes = public_key.public_bytes(
-                encoding=serialization.Encoding.Raw,
-                format=serialization.PublicFormat.Raw
-            )
-            return base64.b64encode(public_key_bytes).decode()
+            return crypto_utils.get_system_signing_key(obj.results_signing_key_id).public_key_b64
         except Exception as e:
             print(f"Error getting system Ed25519 public key: {e}")
             return None
 class VoteCommitmentRequestSerializer(serializers.Serializer):
     election_id = serializers.IntegerField(write_only=True)
-    candidate_id = serializers.IntegerField(write_only=True)
+    candidate_id = serializers.IntegerField(write_only=True, required=False)
+    # Hex SHA-256 of the device-encrypted ballot, instead of candidate_id (elections with client_side_encryption)
+    ballot_sha256 = serializers.RegexField(r'^[0-9a-f]{64}$', write_only=True, required=False)
     nonce = serializers.CharField(write_only=True, max_length=64) # Assuming nonce is a string (e.g., hex or base64)
  
- 
-    def validate_election_id(self, value):
-        try:
-            election = Election.objects.get(pk=value)
-            if not election.is_open_for_voting:
-                raise serializers.ValidationError("This election is not currently open for voting to make a commitment.")
-            return election
-        except Election.DoesNotExist:
-            raise serializers.ValidationError("Election not found.")
- 
-    def validate_candidate_id(self, value):
-        election = self.initial_data.get('election_id') # Get the raw election_id first
-        if election:
-            try:
-                election_obj = Election.objects.get(pk=int(election))
-                candidate = Candidate.objects.get(pk=value, election=election_obj)
-                return candidate.id # Return the candidate id
-            except (Election.DoesNotExist, Candidate.DoesNotExist):
-                raise serializers.ValidationError("Invalid candidate for the specified election.")
-            except ValueError:
-                 raise serializers.ValidationError("Invalid election_id format for candidate check.")
-        return value
- 
     def validate(self, data):
         user = self.context['request'].user
-        election = data['election_id'] # This is now an Election instance from validate_election_id
-        
-        # Check if commitment already exists
-        if VoteCommitment.objects.filter(user=user, election=election).exists():
-            raise serializers.ValidationError("You have already made a vote commitment for this election.")
+        candidate_id = data.get('candidate_id')
+ 
+        # Election and candidate membership come from the election state cache, so the only
+        # query is whether the user already voted. An existing commitment is caught by the
+        # unique constraint when saving.
+        election = election_states.get(data['election_id'])
+        if election is None:
+            raise serializers.ValidationError({"election_id": "Election not found."})
+        if not election.is_open_for_voting:
+            raise serializers.ValidationError({"election_id": "This election is not currently open for voting to make a commitment."})
+ 
+        committed_field = 'ballot_sha256' if election.client_side_encryption else 'candidate_id'
+        if data.get(committed_field) is None:
+            raise serializers.ValidationError({committed_field: "This field is required for this election."})
+        if committed_field == 'candidate_id' and candidate_id not in election.candidate_ids:
+            raise serializers.ValidationError({"candidate_id": "Invalid candidate for the specified election."})
         
-        # Check if already voted (should ideally not happen if commitment is first step)
-        if Vote.objects.filter(user=user, election=election).exists():
+        # Should ideally not happen if commitment is first step
+        if Vote.objects.filter(user=user, election_id=election.id).exists():
             raise serializers.ValidationError("You have already voted in this election; cannot make a new commitment.")
             
+        data['election_id'] = election
         return data
+ 
+    def get_vote_data_to_commit(self):
+        """The vote data the commitment hash covers (see VoteSerializer.create for the reveal side)."""
+        election = self.validated_data['election_id']
+        if election.client_side_encryption:
+            return {'ballot_sha256': self.validated_data['ballot_sha256'], 'election_id': election.id}
+        return {'candidate_id': self.validated_data['candidate_id'], 'election_id': election.id}
+ 
+    def create(self, validated_data):
+        commitment_hash = crypto_utils.generate_vote_commitment(self.get_vote_data_to_commit(), validated_data['nonce'])
+        try:
+            with transaction.atomic():
+                commitment = VoteCommitment.objects.create(
+                    user=self.context['request'].user,
+                    election_id=validated_data['election_id'].id,
+                    commitment_hash=commitment_hash
+                )
+                counters.add(commitment.election_id, commitments=1)
+                return commitment
+        except IntegrityError: # unique_together (user, election)
+            raise serializers.ValidationError(
+                {"detail": "You have already made a vote commitment for this election."}, code='already_committed'
+            )
@@ -0,0 +1,60 @@
+# backend/voting/signals.py
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Election, Candidate, BulletinBoard
+from .key_cache import election_public_keys
+from .election_cache import election_states
+from .results_cache import election_results
+from . import counters, change_feed
+
+
+@receiver([post_save, post_delete], sender=Election)
+def invalidate_election_caches(sender, instance, **kwargs):
+    election_public_keys.invalidate(instance.id)
+    _invalidate_election_state(instance.id)
+    _invalidate_results(instance.id) # A tally job saves the election when it writes new results
+
+
+@receiver([post_save, post_delete], sender=Election)
+def record_election_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        change_feed.record(instance.id, deleted=kwargs['signal'] is post_delete)
+
+
+@receiver(post_save, sender=Election)
+def create_bulletin_board(sender, instance, created, raw=False, **kwargs):
+    # Created up front so the first vote's append only has to lock it
+    if created and not raw:
+        BulletinBoard.objects.get_or_create(election=instance)
+
+
+@receiver(post_save, sender=Election)
+def create_counter_shards(sender, instance, created, raw=False, **kwargs):
+    # Likewise, so counting a commitment or vote is always a single UPDATE
+    if created and not raw:
+        counters.create_shards(instance.id)
+
+
+@receiver([post_save, post_delete], sender=Candidate)
+def invalidate_candidate_caches(sender, instance, **kwargs):
+    _invalidate_election_state(instance.election_id)
+    _invalidate_results(instance.election_id)
+
+
+@receiver([post_save, post_delete], sender=Candidate)
+def record_candidate_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        change_feed.record(instance.election_id) # Candidates are sent inside their election
+
+
+def _invalidate_election_state(election_id):
+    election_states.invalidate(election_id)
+    # Again once the change is committed, in case a concurrent request re-cached the old state in between
+    transaction.on_commit(lambda: election_states.invalidate(election_id))
+
+
+def _invalidate_results(election_id):
+    election_results.invalidate(election_id)
+    transaction.on_commit(lambda: election_results.invalidate(election_id))
@@ -0,0 +1,470 @@
+# backend/voting/tally.py
+"""
+Tally engine used by the tally jobs behind tally_and_sign_results.
+
+Ballots are streamed out of the database in primary-key order, a chunk at a
+time, and processed either inline (serial path) or across a process pool where
+every worker parses the election private key once in its initializer. Each
+chunk produces a partial tally which is merged here in ballot order, so the
+final counts are identical whichever path was taken.
+
+How a chunk is processed depends on the election's encryption scheme:
+hybrid (RSA or X25519) ballots are decrypted one by one and counted, while exponential
+ElGamal ballots are only added together, leaving a single decryption per
+candidate for the end of the tally.
+
+After every merged chunk the running tally and the last processed ballot id are
+saved to a TallyCheckpoint row; an interrupted tally resumes from there.
+
+ElGamal elections additionally keep a running encrypted sum of their ballots
+in EncryptedTallyShard rows, updated as each vote is cast. When those shards
+account for every vote, the tally just adds them up and decrypts, without
+reading the Ballot table at all.
+
+A tally counts the ballots on the bulletin board when it starts (see
+snapshot_ballots): ballots cast while it runs are left out, so the board size
+and root signed with the results describe exactly the ballots counted.
+Ballots rejected by the deferred reveal check (voting/reveal_checks.py) stay
+on the board; run_tally leaves them out and counts them as decryption errors.
+"""
+import json
+import logging
+import random
+from bisect import bisect_right
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from cryptography.hazmat.primitives import serialization
+
+from e_voting import ballot_format
+from e_voting.crypto_utils import crypto_utils, SCHEME_RSA_AES_GCM, SCHEME_EC_ELGAMAL, SCHEME_X25519_AES_GCM
+from .models import Ballot, TallyCheckpoint, EncryptedTallyShard
+from . import ballot_log, bulletin_board
+
+logger = logging.getLogger(__name__)
+
+# Private key object of the current pool worker (set by _init_worker).
+_worker_private_key = None
+
+
+def _load_private_key(private_key_pem):
+    return serialization.load_pem_private_key(
+        private_key_pem,
+        password=None,
+        backend=crypto_utils.backend
+    )
+
+
+def _parse_ballot(encrypted_vote_data, scheme, expected_key_id):
+    """Parse a stored ballot and check it was encrypted for this election's scheme and key."""
+    ballot = ballot_format.parse_ballot(encrypted_vote_data)
+    if ballot.scheme != scheme:
+        raise ValueError(f"Ballot uses scheme '{ballot.scheme}', expected '{scheme}'.")
+    # Legacy JSON ballots carry no key id
+    if ballot.key_id is not None and ballot.key_id != expected_key_id:
+        raise ValueError("Ballot was encrypted for a different election key.")
+    return ballot
+
+
+def _init_worker(private_key_pem):
+    global _worker_private_key
+    _worker_private_key = _load_private_key(private_key_pem)
+
+
+class CountingTally:
+    """Hybrid (RSA or X25519) ballots: every ballot is decrypted and counted. State is {candidate_id: count}."""
+
+    def __init__(self, scheme, decrypt_parts):
+        self.scheme = scheme
+        self.decrypt_parts = decrypt_parts # crypto_utils method taking (key field, iv, ciphertext, tag, private_key)
+
+    def empty(self):
+        return {}
+
+    def process_chunk(self, chunk, candidate_ids, private_key):
+        counts = {}
+        errors = 0
+        expected_key_id = ballot_format.key_id(private_key.public_key())
+        for ballot_id, encrypted_vote_data in chunk:
+            try:
+                ballot = _parse_ballot(encrypted_vote_data, self.scheme, expected_key_id)
+                decrypted_vote_data = self.decrypt_parts(
+                    ballot.encrypted_key, ballot.iv, ballot.ciphertext, ballot.tag, private_key
+                )
+                candidate_id = decrypted_vote_data.get('candidate_id')
+
+                if candidate_id and candidate_id in candidate_ids:
+                    counts[candidate_id] = counts.get(candidate_id, 0) + 1
+                else:
+                    print(f"Warning: Ballot {ballot_id} had invalid candidate_id '{candidate_id}' after decryption or candidate not found in election.")
+                    errors += 1
+            except Exception as e:
+                print(f"Error decrypting ballot {ballot_id}: {e}")
+                errors += 1
+        return counts, errors
+
+    def merge(self, state, partial):
+        for candidate_id, count in partial.items():
+            state[candidate_id] = state.get(candidate_id, 0) + count
+        return state
+
+    def dumps(self, state):
+        return json.dumps(state)
+
+    def loads(self, data):
+        return {int(candidate_id): count for candidate_id, count in json.loads(data).items()}
+
+    def finish(self, state, private_key):
+        return state
+
+
+class HomomorphicTally:
+    """
+    Exponential ElGamal ballots: ballots are summed per candidate without
+    decrypting them. State is {'ballots': n, 'aggregate': {candidate_id: (C1, C2)}}.
+    """
+
+    def empty(self):
+        return {'ballots': 0, 'aggregate': {}}
+
+    def process_chunk(self, chunk, candidate_ids, private_key):
+        state = self.empty()
+        errors = 0
+        expected_key_id = ballot_format.key_id(private_key.public_key())
+        for ballot_id, encrypted_vote_data in chunk:
+            try:
+                # Ballots are summed over every candidate they were encrypted for; totals of
+                # candidates no longer in the election are dropped when the results are built.
+                ballot = _parse_ballot(encrypted_vote_data, SCHEME_EC_ELGAMAL, expected_key_id)
+                crypto_utils.add_homomorphic_ciphertexts(state['aggregate'], ballot.ciphertexts)
+                state['ballots'] += 1
+            except Exception as e:
+                print(f"Error adding ballot {ballot_id} to the encrypted tally: {e}")
+                errors += 1
+        return state, errors
+
+    def merge(self, state, partial):
+        state['ballots'] += partial['ballots']
+        crypto_utils.merge_homomorphic_aggregates(state['aggregate'], partial['aggregate'])
+        return state
+
+    def dumps(self, state):
+        return json.dumps({
+            'ballots': state['ballots'],
+            'aggregate': crypto_utils.serialize_homomorphic_aggregate(state['aggregate'])
+        })
+
+    def loads(self, data):
+        data = json.loads(data)
+        if not data:
+            return self.empty()
+        return {
+            'ballots': data['ballots'],
+            'aggregate': crypto_utils.deserialize_homomorphic_aggregate(data['aggregate'])
+        }
+
+    def finish(self, state, private_key):
+        counts = crypto_utils.decrypt_homomorphic_tally(state['aggregate'], private_key, state['ballots'])
+        # Match the RSA path, which only lists candidates that received votes
+        return {candidate_id: count for candidate_id, count in counts.items() if count}
+
+
+TALLY_STRATEGIES = {
+    SCHEME_RSA_AES_GCM: CountingTally(SCHEME_RSA_AES_GCM, crypto_utils.decrypt_vote_parts),
+    SCHEME_X25519_AES_GCM: CountingTally(SCHEME_X25519_AES_GCM, crypto_utils.decrypt_vote_x25519_parts),
+    SCHEME_EC_ELGAMAL: HomomorphicTally(),
+}
+
+
+def _process_chunk(scheme, chunk, candidate_ids, private_key=None):
+    """Returns (partial tally state, errors) for a list of (ballot_id, encrypted_vote_data) pairs."""
+    return TALLY_STRATEGIES[scheme].process_chunk(chunk, candidate_ids, private_key or _worker_private_key)
+
+
+def _chunked(iterable, chunk_size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _prepend(head, chunks):
+    for chunk in head:
+        if chunk is not None:
+            yield chunk
+    yield from chunks
+
+
+def get_aggregate_shard_count():
+    return max(1, int(getattr(settings, 'ELECTION_AGGREGATE_SHARDS', 8)))
+
+
+def add_to_running_aggregate(election_id, encrypted_payloads):
+    """
+    Fold newly cast ElGamal ballots of one election into one of its running
+    aggregate shards. Call it inside the transaction that stores the votes, so
+    the aggregate and the Ballot table never disagree.
+    """
+    shard, _ = EncryptedTallyShard.objects.select_for_update().get_or_create(
+        election_id=election_id,
+        shard=random.randrange(get_aggregate_shard_count())
+    )
+    aggregate = crypto_utils.deserialize_homomorphic_aggregate(json.loads(shard.aggregate_json))
+    for encrypted_payload in encrypted_payloads:
+        crypto_utils.add_homomorphic_vote(aggregate, encrypted_payload)
+    shard.aggregate_json = json.dumps(crypto_utils.serialize_homomorphic_aggregate(aggregate))
+    shard.ballot_count += len(encrypted_payloads)
+    shard.save(update_fields=['aggregate_json', 'ballot_count', 'updated_at'])
+
+
+def load_running_aggregate(election):
+    """Sum an election's aggregate shards into a HomomorphicTally state."""
+    state = HomomorphicTally().empty()
+    for ballot_count, aggregate_json in EncryptedTallyShard.objects.filter(election=election).values_list('ballot_count', 'aggregate_json'):
+        state['ballots'] += ballot_count
+        crypto_utils.merge_homomorphic_aggregates(
+            state['aggregate'],
+            crypto_utils.deserialize_homomorphic_aggregate(json.loads(aggregate_json))
+        )
+    return state
+
+
+# The ballots a tally counts: the first ballot_count of the election's board (merkle_root),
+# with, for ElGamal elections, the running aggregate as of the same moment
+BallotSnapshot = namedtuple('BallotSnapshot', 'ballot_count merkle_root running_state')
+
+
+def snapshot_ballots(election):
+    """
+    Fix the ballots a tally counts. The board row is locked while its size and the running
+    aggregate are read, so no vote is half stored (on the board but not yet in the aggregate).
+    """
+    with transaction.atomic():
+        ballot_count, merkle_root = bulletin_board.get_root(election.id, lock=True)
+        running_state = load_running_aggregate(election) if election.encryption_scheme == SCHEME_EC_ELGAMAL else None
+    return BallotSnapshot(ballot_count, merkle_root, running_state)
+
+
+def nth_ballot_id(election, ballot_count):
+    """
+    Id of an election's ballot_count-th ballot in id order, or None if it has fewer.
+    Ballots are stored in the order of their board leaves (the board row lock is held
+    until they are), so these are the ballots of the first ballot_count leaves.
+    """
+    if ballot_count == 0:
+        return 0
+    ballot_ids = Ballot.objects.filter(election=election).order_by('id').values_list('id', flat=True)[ballot_count - 1:ballot_count]
+    return ballot_ids[0] if ballot_ids else None
+
+
+def get_tally_workers():
+    return max(1, int(getattr(settings, 'TALLY_WORKERS', 1)))
+
+
+def get_tally_chunk_size():
+    return max(1, int(getattr(settings, 'TALLY_CHUNK_SIZE', 500)))
+
+
+def tally_encrypted_votes(encrypted_votes, private_key_pem, candidate_ids, scheme=SCHEME_RSA_AES_GCM,
+                          workers=None, chunk_size=None, state=None, errors=0, on_chunk_done=None):
+    """
+    Decrypt and count ballots.
+
+    encrypted_votes: iterable of (ballot_id, encrypted_vote_data) pairs, in ballot id order.
+    private_key_pem: election private key as PEM bytes.
+    candidate_ids: ids of the candidates that belong to the election.
+    scheme: the election's encryption scheme (a key of TALLY_STRATEGIES).
+    state/errors: partial tally to continue from (e.g. loaded from a checkpoint).
+    on_chunk_done: called as on_chunk_done(chunk, state, errors) after each
+        chunk is merged. Chunks are merged strictly in order, so the state
+        passed always covers every ballot up to the last ballot id of the chunk.
+
+    Returns ({candidate_id: count}, decryption_errors). A single chunk of
+    ballots is always processed inline; the process pool is only started
+    when there is more than one chunk of work and more than one worker.
+    """
+    strategy = TALLY_STRATEGIES[scheme]
+    workers = workers or get_tally_workers()
+    chunk_size = chunk_size or get_tally_chunk_size()
+    candidate_ids = frozenset(candidate_ids)
+
+    total_state = state if state is not None else strategy.empty()
+    total_errors = errors
+
+    def merge_chunk(chunk, result):
+        nonlocal total_errors
+        partial_state, chunk_errors = result
+        strategy.merge(total_state, partial_state)
+        total_errors += chunk_errors
+        if on_chunk_done:
+            on_chunk_done(chunk, total_state, total_errors)
+
+    private_key = _load_private_key(private_key_pem)
+    chunks = _chunked(encrypted_votes, chunk_size)
+    first_chunk = next(chunks, None)
+    second_chunk = next(chunks, None) if first_chunk is not None else None
+
+    if workers == 1 or second_chunk is None:
+        for chunk in _prepend((first_chunk, second_chunk), chunks):
+            merge_chunk(chunk, _process_chunk(scheme, chunk, candidate_ids, private_key))
+    else:
+        # Keep a bounded number of chunks in flight so the ballot iterator is
+        # consumed at the pace the workers decrypt, and merge them in
+        # submission order so progress can be checkpointed.
+        max_in_flight = workers * 2
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(private_key_pem,)) as executor:
+            in_flight = deque()
+            for chunk in _prepend((first_chunk, second_chunk), chunks):
+                if len(in_flight) >= max_in_flight:
+                    done_chunk, future = in_flight.popleft()
+                    merge_chunk(done_chunk, future.result())
+                in_flight.append((chunk, executor.submit(_process_chunk, scheme, chunk, candidate_ids)))
+            while in_flight:
+                done_chunk, future = in_flight.popleft()
+                merge_chunk(done_chunk, future.result())
+
+    return strategy.finish(total_state, private_key), total_errors
+
+
+def iter_encrypted_ballots(election, after_ballot_id=0, chunk_size=None, until_ballot_id=None):
+    """
+    Yield (ballot_id, encrypted_vote_data) for an election in id order, up to
+    until_ballot_id if given.
+
+    Rows are fetched with keyset pagination (id > last seen id) so only one
+    chunk of ballot payloads is held in memory at a time. Ballots kept in the
+    ballot log are read from its memory-mapped segments; a ballot that cannot
+    be read from there raises ValueError. Ballots are yielded
+    as bytes (some database drivers return memoryviews, which cannot be sent
+    to pool workers).
+    """
+    chunk_size = chunk_size or get_tally_chunk_size()
+    last_seen_id = after_ballot_id
+    ballots = Ballot.objects.filter(election=election)
+    if until_ballot_id is not None:
+        ballots = ballots.filter(id__lte=until_ballot_id)
+    with ballot_log.BallotLogReader(election.id) as log_reader:
+        while True:
+            rows = list(
+                ballots.filter(id__gt=last_seen_id)
+                .order_by('id')
+                .values_list('id', 'encrypted_vote_data', 'ballot_segment', 'ballot_offset')[:chunk_size]
+            )
+            if not rows:
+                return
+            for ballot_id, encrypted_vote_data, ballot_segment, ballot_offset in rows:
+                if ballot_segment is not None:
+                    try:
+                        encrypted_vote_data = log_reader.read(ballot_segment, ballot_offset)
+                    except (OSError, ValueError) as e:
+                        raise ValueError(f"Ballot {ballot_id} cannot be read from the ballot log: {e}") from e
+                    yield ballot_id, encrypted_vote_data
+                else:
+                    yield ballot_id, bytes(encrypted_vote_data) if isinstance(encrypted_vote_data, memoryview) else encrypted_vote_data
+            last_seen_id = rows[-1][0]
+
+
+def run_tally(election, private_key_pem, candidate_ids, workers=None, chunk_size=None, on_progress=None, snapshot=None):
+    """
+    Stream, decrypt and count the votes of an election, resuming from and
+    updating the election's TallyCheckpoint. The checkpoint is discarded if it
+    was written with a different election key.
+
+    snapshot: the BallotSnapshot to count; taken now if not given.
+
+    on_progress: optional, called as on_progress(processed_votes, errors)
+        once at the start (covering checkpointed votes) and after every chunk.
+
+    Returns ({candidate_id: count}, decryption_errors). Raises ValueError if
+    a ballot cannot be read from the ballot log; the checkpoint keeps the
+    progress made up to it.
+    """
+    strategy = TALLY_STRATEGIES[election.encryption_scheme]
+    private_key = _load_private_key(private_key_pem)
+
+    snapshot = snapshot or snapshot_ballots(election)
+    until_ballot_id = nth_ballot_id(election, snapshot.ballot_count)
+
+    # Ballots rejected by the deferred reveal check, which only elections deferring it can have
+    rejected_ids = []
+    if election.defer_reveal_checks:
+        rejected_ballots = Ballot.objects.filter(election=election, rejected=True)
+        if until_ballot_id is not None:
+            rejected_ballots = rejected_ballots.filter(id__lte=until_ballot_id)
+        rejected_ids = list(rejected_ballots.order_by('id').values_list('id', flat=True))
+        if rejected_ids:
+            logger.warning(
+                "Not counting %d ballot(s) of election %s cast by reveals that did not match their commitment.",
+                len(rejected_ids), election.id
+            )
+
+    def rejected_up_to(ballot_id):
+        return bisect_right(rejected_ids, ballot_id)
+
+    if election.encryption_scheme == SCHEME_EC_ELGAMAL:
+        running_state = snapshot.running_state
+        # The running sum includes rejected ballots too, so it is only used when there are none
+        if running_state['ballots'] == snapshot.ballot_count and not rejected_ids:
+            counts = strategy.finish(running_state, private_key)
+            if on_progress:
+                on_progress(running_state['ballots'], 0)
+            return counts, 0
+        # Votes cast before the running aggregate existed, or rejected ones; fall back to scanning them
+        print(f"Warning: Running aggregate of election {election.id} does not match its counted ballots. Tallying from the Ballot table.")
+
+    key_fingerprint = crypto_utils.public_key_fingerprint(private_key.public_key())
+    checkpoint, _ = TallyCheckpoint.objects.get_or_create(
+        election=election,
+        defaults={'key_fingerprint': key_fingerprint}
+    )
+    if checkpoint.key_fingerprint != key_fingerprint:
+        checkpoint.key_fingerprint = key_fingerprint
+        checkpoint.last_ballot_id = 0
+        checkpoint.partial_counts_json = '{}'
+        checkpoint.decryption_errors = 0
+        checkpoint.save()
+    elif checkpoint.last_ballot_id:
+        print(f"Resuming tally for election {election.id} after ballot {checkpoint.last_ballot_id}.")
+
+    processed_votes = 0
+    if on_progress:
+        if checkpoint.last_ballot_id:
+            processed_votes = Ballot.objects.filter(election=election, id__lte=checkpoint.last_ballot_id).count()
+        on_progress(processed_votes, checkpoint.decryption_errors + rejected_up_to(checkpoint.last_ballot_id))
+
+    # The checkpoint's errors leave out rejected ballots, which are skipped and added to the errors here
+    def save_checkpoint(chunk, state, errors):
+        nonlocal processed_votes
+        skipped = rejected_up_to(chunk[-1][0]) - rejected_up_to(checkpoint.last_ballot_id)
+        checkpoint.last_ballot_id = chunk[-1][0]
+        checkpoint.partial_counts_json = strategy.dumps(state)
+        checkpoint.decryption_errors = errors
+        checkpoint.save(update_fields=['last_ballot_id', 'partial_counts_json', 'decryption_errors', 'updated_at'])
+        if on_progress:
+            processed_votes += len(chunk) + skipped
+            on_progress(processed_votes, errors + rejected_up_to(checkpoint.last_ballot_id))
+
+    rejected = frozenset(rejected_ids)
+    counts, errors = tally_encrypted_votes(
+        ((ballot_id, encrypted_vote_data)
+         for ballot_id, encrypted_vote_data in iter_encrypted_ballots(election, checkpoint.last_ballot_id, chunk_size, until_ballot_id)
+         if ballot_id not in rejected),
+        private_key_pem,
+        candidate_ids,
+        scheme=election.encryption_scheme,
+        workers=workers,
+        chunk_size=chunk_size,
+        state=strategy.loads(checkpoint.partial_counts_json),
+        errors=checkpoint.decryption_errors,
+        on_chunk_done=save_checkpoint
+    )
+    errors += len(rejected_ids)
+    skipped = len(rejected_ids) - rejected_up_to(checkpoint.last_ballot_id)
+    if on_progress and skipped:
+        on_progress(processed_votes + skipped, errors) # Rejected ballots after the last counted one
+    return counts, errors
@@ -0,0 +1,197 @@
+# backend/voting/tally_jobs.py
+"""
+Background runner for TallyJob.
+
+tally-and-sign-results creates a TallyJob and hands it to a small in-process
+thread pool, so the HTTP request returns immediately with the job id. The
+election private key is only ever held in memory by the thread running the
+job; it is never written to the database. The `tally_election` management
+command runs the same job code synchronously, outside the web server.
+"""
+import json
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from e_voting.crypto_utils import crypto_utils
+from .models import Election, Candidate, Ballot, TallyCheckpoint, TallyJob
+from . import tally, counters, reveal_checks
+
+_executor = ThreadPoolExecutor(
+    max_workers=max(1, int(getattr(settings, 'TALLY_JOB_THREADS', 1))),
+    thread_name_prefix='tally-job'
+)
+
+
+def signed_results(results, ballot_count, merkle_root):
+    """
+    The document the results signature covers: the counts by candidate name and the
+    bulletin board (size and hex Merkle root) of the ballots they were counted from.
+    """
+    return {'results': results, 'ballot_count': ballot_count, 'merkle_root': merkle_root}
+
+
+class TallyJobAbandoned(Exception):
+    """The job was marked failed by get_active_job while it was still running."""
+
+
+def get_active_job(election):
+    """
+    Return the queued/running job of an election, if any. A running job that
+    has not reported progress (its heartbeat, TallyJob.updated_at, set when it
+    starts and after every chunk) for TALLY_JOB_STALE_SECONDS is assumed to
+    have died with its process and is marked failed (its checkpoint lets the
+    next job resume). Queued jobs are never stale: they may be waiting for a
+    busy worker.
+    """
+    job = TallyJob.objects.filter(election=election, state__in=TallyJob.ACTIVE_STATES).first()
+    if job is None or job.state != TallyJob.State.RUNNING:
+        return job
+    stale_after = timedelta(seconds=getattr(settings, 'TALLY_JOB_STALE_SECONDS', 300))
+    abandoned = TallyJob.objects.filter(
+        pk=job.pk, state=TallyJob.State.RUNNING, updated_at__lt=timezone.now() - stale_after
+    ).update(
+        state=TallyJob.State.FAILED,
+        error_message="Job stopped reporting progress and was abandoned.",
+        finished_at=timezone.now(),
+        updated_at=timezone.now()
+    )
+    return None if abandoned else job
+
+
+def create_tally_job(election, requested_by=None):
+    """Create a queued job, or return the election's already active one. Returns (job, created)."""
+    with transaction.atomic():
+        Election.objects.select_for_update().filter(pk=election.pk).first() # Serialize job creation per election
+        job = get_active_job(election)
+        if job is not None:
+            return job, False
+        job = TallyJob.objects.create(
+            election=election,
+            requested_by=requested_by,
+            total_votes=Ballot.objects.filter(election=election).count()
+        )
+        return job, True
+
+
+def start_tally_job(election, private_key_pem, requested_by=None):
+    """Queue a tally job for the in-process worker. Returns (job, created)."""
+    job, created = create_tally_job(election, requested_by)
+    if created:
+        _executor.submit(_run_in_thread, job.id, private_key_pem)
+    return job, created
+
+
+def _run_in_thread(job_id, private_key_pem):
+    try:
+        run_tally_job(job_id, private_key_pem)
+    finally:
+        connections.close_all() # Worker threads get their own DB connections
+
+
+def run_tally_job(job_id, private_key_pem):
+    """
+    Decrypt, count and sign the results of a job's election, recording
+    progress on the job. On success the signed results are written to
+    Election.tallied_results_json / results_signature.
+    """
+    now = timezone.now()
+    # Only the caller that moves the job out of the queue runs it
+    started = TallyJob.objects.filter(pk=job_id, state=TallyJob.State.QUEUED).update(
+        state=TallyJob.State.RUNNING, started_at=now, updated_at=now
+    )
+    job = TallyJob.objects.select_related('election').get(pk=job_id)
+    if not started:
+        print(f"Tally job {job.id} is {job.state}, not queued; not running it.")
+        return job
+    election = job.election
+
+    def report_progress(processed_votes, errors):
+        # Also the job's heartbeat. No row updated: the job was abandoned and may have been replaced
+        if not TallyJob.objects.filter(pk=job.pk, state=TallyJob.State.RUNNING).update(
+            processed_votes=processed_votes,
+            decryption_errors=errors,
+            updated_at=timezone.now()
+        ):
+            raise TallyJobAbandoned(f"Tally job {job.id} was abandoned while running.")
+
+    try:
+        # Fetch all candidates for this election once to avoid N+1 queries for names
+        candidates_for_election = {c.id: c.name for c in Candidate.objects.filter(election=election)}
+
+        # Count the ballots on the board now; the signature covers this board size and root,
+        # so votes cast while the tally runs (the election may still be open) are left out
+        snapshot = tally.snapshot_ballots(election)
+        TallyJob.objects.filter(pk=job.pk).update(total_votes=snapshot.ballot_count)
+        if election.defer_reveal_checks:
+            # Every ballot in the snapshot was stored marked pending, so all of them are checked here
+            reveal_checks.check_pending_reveals(election, private_key_pem)
+
+        # Ballots are streamed in id order and decrypted over settings.TALLY_WORKERS processes.
+        # Progress is checkpointed per chunk, so an interrupted tally resumes where it stopped.
+        counts_by_candidate_id, decryption_errors = tally.run_tally(
+            election,
+            private_key_pem,
+            candidates_for_election.keys(),
+            on_progress=report_progress,
+            snapshot=snapshot
+        )
+        candidate_counts = {}
+        for candidate_id, count in counts_by_candidate_id.items():
+            if candidate_id not in candidates_for_election: # Candidate removed since the checkpoint was written
+                continue
+            candidate_name = candidates_for_election[candidate_id]
+            candidate_counts[candidate_name] = candidate_counts.get(candidate_name, 0) + count
+
+        if decryption_errors > 0:
+            print(f"Warning: {decryption_errors} vote(s) could not be decrypted or processed for election {election.id}.")
+
+        final_results_obj = dict(sorted(candidate_counts.items()))
+        # The signature also covers the bulletin board root, which pins the set of ballots counted
+        ballot_count, merkle_root = snapshot.ballot_count, snapshot.merkle_root
+        signing_key = crypto_utils.get_system_signing_key()
+        if signing_key.private_key is None:
+            raise ValueError("System Ed25519 private key not configured in settings.")
+        signature = crypto_utils.sign_data(
+            signed_results(final_results_obj, ballot_count, merkle_root.hex()),
+            signing_key.private_key
+        )
+
+        election.results_signature = signature
+        election.tallied_results_json = json.dumps(final_results_obj)
+        election.results_ballot_count = ballot_count
+        election.results_merkle_root = merkle_root.hex()
+        election.results_signing_key_id = signing_key.key_id
+        with transaction.atomic():
+            # A job abandoned in the meantime must not write results over those of the job that replaced it
+            if not TallyJob.objects.select_for_update().filter(pk=job.pk, state=TallyJob.State.RUNNING).exists():
+                raise TallyJobAbandoned(f"Tally job {job.id} was abandoned while running.")
+            # Only the results: the election was loaded when the job started, and admins may have edited it since
+            election.save(update_fields=[
+                'results_signature', 'tallied_results_json', 'results_ballot_count', 'results_merkle_root', 'results_signing_key_id'
+            ])
+            TallyCheckpoint.objects.filter(election=election).delete() # Results are stored; progress no longer needed
+            counters.set_decryption_errors(election.id, decryption_errors)
+            TallyJob.objects.filter(pk=job.pk).update(
+                state=TallyJob.State.SUCCEEDED,
+                decryption_errors=decryption_errors,
+                finished_at=timezone.now(),
+                updated_at=timezone.now()
+            )
+    except TallyJobAbandoned as e:
+        print(f"{e} Stopping.")
+    except Exception as e:
+        print(f"Error running tally job {job.id} for election {election.id}: {e}")
+        traceback.print_exc()
+        TallyJob.objects.filter(pk=job.pk, state=TallyJob.State.RUNNING).update(
+            state=TallyJob.State.FAILED,
+            error_message=str(e),
+            finished_at=timezone.now(),
+            updated_at=timezone.now()
+        )
+    job.refresh_from_db()
+    return job
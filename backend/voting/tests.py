@@ -1,3 +1,1020 @@
+from datetime import date, timedelta
+from unittest import mock
+import base64
+import hashlib
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command, CommandError
+from django.db import IntegrityError
 from django.test import TestCase
+from django.utils import timezone
+from cryptography.hazmat.primitives import serialization
+from rest_framework.test import APIClient
+
+from e_voting import ballot_format
+from e_voting.crypto_utils import crypto_utils, SCHEME_RSA_AES_GCM, SCHEME_EC_ELGAMAL, SCHEME_X25519_AES_GCM
+from .models import Election, Candidate, Vote, Ballot, VoteCommitment, TallyCheckpoint, TallyJob, EncryptedTallyShard, ElectionCounterShard, PooledElectionKey
+from . import tally, tally_jobs, key_pool, vote_ingest, ballot_log, bulletin_board, counters, change_feed, reveal_checks
+from .key_cache import ElectionPublicKeyCache, election_public_keys
+from .election_cache import ElectionStateCache, LocalMemoryBackend, election_states
+from .results_cache import election_results
+from .serializers import AdminElectionSerializer
+
+User = get_user_model()
+
+
+def make_user(index, **extra_fields):
+    return User.objects.create(
+        email=f'voter{index}@example.com',
+        first_name='Test',
+        last_name=f'Voter{index}',
+        identity_number=f'{10000000000 + index}',
+        birth_date=date(1990, 1, 1),
+        is_active=True,
+        **extra_fields
+    )
+
+
+class ElectionTestMixin:
+    encryption_scheme = SCHEME_RSA_AES_GCM
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # RSA key generation is slow; share one key pair across the test class
+        cls.private_key, cls.public_key = crypto_utils.generate_election_key_pair(cls.encryption_scheme)
+        cls.private_key_pem = cls.private_key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption()
+        )
+        cls.public_key_pem = cls.public_key.public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
+        ).decode('utf-8')
+
+    def make_election(self, name='Test Election', **extra_fields):
+        now = timezone.now()
+        election = Election.objects.create(
+            name=name,
+            start_time=now - timedelta(hours=1),
+            end_time=now + timedelta(hours=1),
+            is_active=True,
+            encryption_scheme=self.encryption_scheme,
+            rsa_public_key_pem=self.public_key_pem,
+            **extra_fields
+        )
+        candidates = [
+            Candidate.objects.create(election=election, name=candidate_name)
+            for candidate_name in ('Alice', 'Bob', 'Carol')
+        ]
+        return election, candidates
+
+    def commit_and_reveal(self, user, election, candidate_id, nonce='test-nonce'):
+        client = APIClient()
+        client.force_authenticate(user)
+        vote_choice = {'election_id': election.id, 'candidate_id': candidate_id, 'nonce': nonce}
+        commit_response = client.post('/api/vote/commit/', vote_choice, format='json')
+        self.assertEqual(commit_response.status_code, 201, commit_response.data)
+        return client.post('/api/vote/', vote_choice, format='json')
+
+    def cast_encrypted_votes(self, election, candidate_ids):
+        election_candidate_ids = sorted(election.candidates.values_list('id', flat=True))
+        for index, candidate_id in enumerate(candidate_ids):
+            if election.encryption_scheme == SCHEME_EC_ELGAMAL:
+                encrypted_payload = crypto_utils.encrypt_vote_homomorphic(
+                    candidate_id, election_candidate_ids, self.public_key
+                )
+            elif election.encryption_scheme == SCHEME_X25519_AES_GCM:
+                encrypted_payload = crypto_utils.encrypt_vote_x25519(
+                    {'candidate_id': candidate_id, 'election_id': election.id}, self.public_key
+                )
+            else:
+                encrypted_payload = crypto_utils.encrypt_vote(
+                    {'candidate_id': candidate_id, 'election_id': election.id}, self.public_key
+                )
+            self.store_ballot(election, ballot_format.encode_ballot(
+                election.encryption_scheme, ballot_format.key_id(self.public_key), encrypted_payload
+            ))
+
+    def store_ballot(self, election, encrypted_vote_data):
+        """Store a ballot as the vote paths do, on the bulletin board: tallies count the ballots on the board."""
+        ballot = Ballot(election=election, encrypted_vote_data=encrypted_vote_data)
+        bulletin_board.append_ballots([ballot])
+        ballot.save()
+        return ballot
+
+    def pending_vote(self, user, election, candidate_id, nonce='test-nonce', encrypted_vote_data=b'{}'):
+        """An unsaved vote for the group commit writer, with its commitment stored."""
+        commitment = VoteCommitment.objects.create(
+            user=user,
+            election=election,
+            commitment_hash=crypto_utils.generate_vote_commitment({'candidate_id': candidate_id, 'election_id': election.id}, nonce)
+        )
+        return vote_ingest.PendingVote(
+            Vote(user=user, election=election), Ballot(election=election, encrypted_vote_data=encrypted_vote_data), commitment.pk
+        )
+
+
+class TallyEngineTests(ElectionTestMixin, TestCase):
+    def test_parallel_tally_matches_serial_tally(self):
+        election, candidates = self.make_election()
+        alice, bob, carol = (candidate.id for candidate in candidates)
+        self.cast_encrypted_votes(election, [alice, bob, alice, carol, alice, bob, 999])
+
+        encrypted_votes = list(Ballot.objects.filter(election=election).values_list('id', 'encrypted_vote_data'))
+        candidate_ids = [alice, bob, carol]
+        serial = tally.tally_encrypted_votes(encrypted_votes, self.private_key_pem, candidate_ids, workers=1)
+        parallel = tally.tally_encrypted_votes(encrypted_votes, self.private_key_pem, candidate_ids, workers=2, chunk_size=2)
+
+        self.assertEqual(serial, ({alice: 3, bob: 2, carol: 1}, 1))
+        self.assertEqual(parallel, serial)
+
+    def test_tally_reads_legacy_json_ballots_and_rejects_foreign_keys(self):
+        election, candidates = self.make_election()
+        alice, bob, _ = (candidate.id for candidate in candidates)
+        self.cast_encrypted_votes(election, [alice])
+        legacy_payload = crypto_utils.encrypt_vote({'candidate_id': bob, 'election_id': election.id}, self.public_key)
+        self.store_ballot(election, json.dumps(legacy_payload).encode())
+        self.store_ballot(
+            election, ballot_format.encode_ballot(SCHEME_RSA_AES_GCM, b'\xff' * ballot_format.KEY_ID_LENGTH, legacy_payload)
+        )
+
+        self.assertEqual(tally.run_tally(election, self.private_key_pem, [alice, bob]), ({alice: 1, bob: 1}, 1))
+
+    def test_run_tally_resumes_from_checkpoint(self):
+        election, candidates = self.make_election()
+        alice, bob, _ = (candidate.id for candidate in candidates)
+        self.cast_encrypted_votes(election, [alice, bob, bob, alice])
+        ballot_ids = list(Ballot.objects.filter(election=election).order_by('id').values_list('id', flat=True))
+
+        # Pretend a previous run got through the first two ballots and counted them differently,
+        # so we can tell the checkpointed ballots were not decrypted again.
+        TallyCheckpoint.objects.create(
+            election=election,
+            key_fingerprint=crypto_utils.public_key_fingerprint(self.public_key),
+            last_ballot_id=ballot_ids[1],
+            partial_counts_json=json.dumps({alice: 5}),
+            decryption_errors=1
+        )
+        counts, errors = tally.run_tally(election, self.private_key_pem, [alice, bob], chunk_size=1)
+
+        self.assertEqual((counts, errors), ({alice: 6, bob: 1}, 1))
+        self.assertEqual(TallyCheckpoint.objects.get(election=election).last_ballot_id, ballot_ids[-1])
+
+    def test_run_tally_discards_checkpoint_from_another_key(self):
+        election, candidates = self.make_election()
+        alice, bob, _ = (candidate.id for candidate in candidates)
+        self.cast_encrypted_votes(election, [alice, bob])
+        TallyCheckpoint.objects.create(
+            election=election,
+            key_fingerprint='0' * 64,
+            last_ballot_id=Ballot.objects.filter(election=election).order_by('id').last().id,
+            partial_counts_json=json.dumps({alice: 5})
+        )
+
+        self.assertEqual(tally.run_tally(election, self.private_key_pem, [alice, bob]), ({alice: 1, bob: 1}, 0))
+
+
+
+class X25519TallyEngineTests(ElectionTestMixin, TestCase):
+    encryption_scheme = SCHEME_X25519_AES_GCM
+
+    def test_x25519_ballots_cast_through_api_are_tallied(self):
+        election, candidates = self.make_election()
+        alice, bob, _ = (candidate.id for candidate in candidates)
+        for index, candidate_id in enumerate([alice, bob, alice]):
+            response = self.commit_and_reveal(make_user(index), election, candidate_id)
+            self.assertEqual(response.status_code, 201, response.data)
+        # An RSA ballot does not belong in an X25519 election
+        self.store_ballot(election, ballot_format.encode_ballot(
+            SCHEME_RSA_AES_GCM,
+            ballot_format.key_id(self.public_key),
+            crypto_utils.encrypt_vote({'candidate_id': bob}, crypto_utils.generate_rsa_key_pair()[1])
+        ))
+
+        serial = tally.run_tally(election, self.private_key_pem, [alice, bob], workers=1)
+        TallyCheckpoint.objects.all().delete()
+        parallel = tally.run_tally(election, self.private_key_pem, [alice, bob], workers=2, chunk_size=1)
+
+        self.assertEqual(serial, ({alice: 2, bob: 1}, 1))
+        self.assertEqual(parallel, serial)
+
+
+class ClientSideEncryptionTests(ElectionTestMixin, TestCase):
+    encryption_scheme = SCHEME_X25519_AES_GCM
+
+    def encrypt_on_device(self, election, candidate_id, public_key=None):
+        payload = crypto_utils.encrypt_vote_x25519(
+            {'candidate_id': candidate_id, 'election_id': election.id}, public_key or self.public_key
+        )
+        return ballot_format.encode_ballot(SCHEME_X25519_AES_GCM, ballot_format.key_id(self.public_key), payload)
+
+    def commit_and_reveal_ballot(self, user, election, committed_ballot, revealed_ballot=None):
+        client = APIClient()
+        client.force_authenticate(user)
+        commit_response = client.post('/api/vote/commit/', {
+            'election_id': election.id,
+            'ballot_sha256': hashlib.sha256(committed_ballot).hexdigest(),
+            'nonce': 'device-nonce'
+        }, format='json')
+        self.assertEqual(commit_response.status_code, 201, commit_response.data)
+        return client.post('/api/vote/', {
+            'election_id': election.id,
+            'encrypted_ballot': base64.b64encode(revealed_ballot or committed_ballot).decode(),
+            'nonce': 'device-nonce'
+        }, format='json')
+
+    def test_device_encrypted_ballots_are_stored_as_sent_and_tallied(self):
+        election, candidates = self.make_election(client_side_encryption=True)
+        alice, bob, _ = (candidate.id for candidate in candidates)
+        ballots = [self.encrypt_on_device(election, candidate_id) for candidate_id in (alice, bob, alice)]
+
+        for index, ballot in enumerate(ballots):
+            with mock.patch.object(crypto_utils, 'encrypt_vote_x25519') as server_encrypt:
+                response = self.commit_and_reveal_ballot(make_user(index), election, ballot)
+            self.assertEqual(response.status_code, 201, response.data)
+            server_encrypt.assert_not_called()
+
+        stored = [bytes(data) for data in Ballot.objects.filter(election=election).order_by('id').values_list('encrypted_vote_data', flat=True)]
+        self.assertEqual(stored, ballots)
+        self.assertEqual(tally.run_tally(election, self.private_key_pem, [alice, bob]), ({alice: 2, bob: 1}, 0))
+
+    def test_deferred_check_rejects_a_ballot_other_than_the_committed_one(self):
+        election, candidates = self.make_election(client_side_encryption=True, defer_reveal_checks=True)
+        alice, bob, _ = (candidate.id for candidate in candidates)
+        self.assertEqual(self.commit_and_reveal_ballot(make_user(0), election, self.encrypt_on_device(election, alice)).status_code, 201)
+        response = self.commit_and_reveal_ballot(
+            make_user(1), election, self.encrypt_on_device(election, alice), self.encrypt_on_device(election, bob)
+        )
+        self.assertEqual(response.status_code, 201, response.data) # Not checked yet
+
+        self.assertEqual(reveal_checks.check_pending_reveals(election, self.private_key_pem), (2, 1))
+        self.assertEqual(tally.run_tally(election, self.private_key_pem, [alice, bob]), ({alice: 1}, 1))
+
+    def test_ballot_must_match_commitment_and_election_key(self):
+        election, candidates = self.make_election(client_side_encryption=True)
+        alice, bob, _ = (candidate.id for candidate in candidates)
+
+        response = self.commit_and_reveal_ballot(
+            make_user(1), election, self.encrypt_on_device(election, alice), self.encrypt_on_device(election, bob)
+        )
+        self.assertEqual(response.status_code, 400)
+
+        wrong_key_ballot = bytearray(self.encrypt_on_device(election, alice))
+        wrong_key_ballot[2:2 + ballot_format.KEY_ID_LENGTH] = bytes(ballot_format.KEY_ID_LENGTH)
+        response = self.commit_and_reveal_ballot(make_user(2), election, bytes(wrong_key_ballot))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('encrypted_ballot', response.data)
+        self.assertFalse(Ballot.objects.filter(election=election).exists())
+
+
+class HomomorphicTallyEngineTests(ElectionTestMixin, TestCase):
+    encryption_scheme = SCHEME_EC_ELGAMAL
+
+    def test_homomorphic_tally_matches_counts_serial_and_parallel(self):
+        election, candidates = self.make_election()
+        alice, bob, carol = (candidate.id for candidate in candidates)
+        self.cast_encrypted_votes(election, [alice, bob, alice, alice, bob])
+        self.store_ballot(election, b'{"scheme": "bogus"}')
+
+        candidate_ids = [alice, bob, carol]
+        serial = tally.run_tally(election, self.private_key_pem, candidate_ids, workers=1)
+        TallyCheckpoint.objects.all().delete()
+        parallel = tally.run_tally(election, self.private_key_pem, candidate_ids, workers=2, chunk_size=2)
+
+        self.assertEqual(serial, ({alice: 3, bob: 2}, 1))
+        self.assertEqual(parallel, serial)
+
+    def test_homomorphic_tally_resumes_from_checkpoint(self):
+        election, candidates = self.make_election()
+        alice, bob, carol = (candidate.id for candidate in candidates)
+        self.cast_encrypted_votes(election, [alice, bob, bob, carol])
+
+        tally.run_tally(election, self.private_key_pem, [alice, bob, carol], chunk_size=3)
+        checkpoint = TallyCheckpoint.objects.get(election=election)
+        self.assertEqual(json.loads(checkpoint.partial_counts_json)['ballots'], 4)
+
+        # Nothing left to add: the result comes entirely from the checkpointed aggregate
+        self.assertEqual(
+            tally.run_tally(election, self.private_key_pem, [alice, bob, carol]),
+            ({alice: 1, bob: 2, carol: 1}, 0)
+        )
+
+    def test_cast_votes_update_running_aggregate(self):
+        election, candidates = self.make_election()
+        alice, bob, carol = (candidate.id for candidate in candidates)
+        for index, candidate_id in enumerate([alice, carol, carol]):
+            response = self.commit_and_reveal(make_user(index), election, candidate_id)
+            self.assertEqual(response.status_code, 201, response.data)
+
+        self.assertEqual(sum(EncryptedTallyShard.objects.filter(election=election).values_list('ballot_count', flat=True)), 3)
+        # The tally is served from the shards, so no checkpoint is needed
+        self.assertEqual(
+            tally.run_tally(election, self.private_key_pem, [alice, bob, carol]),
+            ({alice: 1, carol: 2}, 0)
+        )
+        self.assertFalse(TallyCheckpoint.objects.filter(election=election).exists())
+
+
+class InlineExecutor:
+    """Stand-in for the tally job thread pool that runs submitted work immediately."""
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+@mock.patch.object(tally_jobs, '_executor', InlineExecutor())
+class TallyJobTests(ElectionTestMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(make_user(100, is_staff=True))
+
+    def test_tally_endpoint_queues_job_that_signs_counts_by_candidate_name(self):
+        election, candidates = self.make_election()
+        alice, bob, _ = (candidate.id for candidate in candidates)
+        self.cast_encrypted_votes(election, [alice, bob, bob])
+
+        response = self.client.post(
+            f'/api/admin/elections/{election.id}/tally-and-sign-results/',
+            {'election_rsa_private_key_pem': self.private_key_pem.decode('utf-8')},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 202)
+
+        job_response = self.client.get(f"/api/admin/tally-jobs/{response.data['job_id']}/")
+        self.assertEqual(job_response.data['state'], TallyJob.State.SUCCEEDED)
+        self.assertEqual((job_response.data['total_votes'], job_response.data['processed_votes']), (3, 3))
+
+        election.refresh_from_db()
+        self.assertEqual(json.loads(election.tallied_results_json), {'Alice': 1, 'Bob': 2})
+        self.assertEqual(election.results_merkle_root, bulletin_board.get_root(election.id)[1].hex())
+        self.assertEqual(election.results_signing_key_id, crypto_utils.get_system_signing_key().key_id)
+        self.assertTrue(crypto_utils.verify_signature(
+            tally_jobs.signed_results({'Alice': 1, 'Bob': 2}, election.results_ballot_count, election.results_merkle_root),
+            election.results_signature,
+            crypto_utils.get_system_ed25519_public_key()
+        ))
+        self.assertFalse(TallyCheckpoint.objects.filter(election=election).exists())
+
+    def test_job_does_not_overwrite_election_edits_made_while_it_ran(self):
+        election, candidates = self.make_election()
+        self.cast_encrypted_votes(election, [candidates[0].id])
+        job, _ = tally_jobs.create_tally_job(election)
+        run_tally = tally.run_tally
+
+        def run_tally_during_an_edit(*args, **kwargs):
+            Election.objects.filter(pk=election.pk).update(name='Renamed')
+            return run_tally(*args, **kwargs)
+
+        with mock.patch.object(tally, 'run_tally', run_tally_during_an_edit):
+            tally_jobs.run_tally_job(job.id, self.private_key_pem)
+
+        election.refresh_from_db()
+        self.assertEqual((election.name, json.loads(election.tallied_results_json)), ('Renamed', {'Alice': 1}))
+
+    def test_ballots_cast_during_the_tally_are_neither_counted_nor_signed(self):
+        election, candidates = self.make_election()
+        alice, bob, _ = (candidate.id for candidate in candidates)
+        self.cast_encrypted_votes(election, [alice, bob])
+        job, _ = tally_jobs.create_tally_job(election)
+        snapshot_ballots = tally.snapshot_ballots
+
+        def snapshot_then_vote(election):
+            snapshot = snapshot_ballots(election)
+            self.cast_encrypted_votes(election, [bob]) # The election is still open
+            return snapshot
+
+        with mock.patch.object(tally, 'snapshot_ballots', snapshot_then_vote):
+            job = tally_jobs.run_tally_job(job.id, self.private_key_pem)
+
+        election.refresh_from_db()
+        self.assertEqual((job.total_votes, job.processed_votes), (2, 2))
+        self.assertEqual(json.loads(election.tallied_results_json), {'Alice': 1, 'Bob': 1})
+        self.assertEqual(election.results_ballot_count, 2)
+        self.assertNotEqual(election.results_merkle_root, bulletin_board.get_root(election.id)[1].hex())
+
+    def test_active_job_is_reused(self):
+        election, _ = self.make_election()
+        active_job = TallyJob.objects.create(election=election, state=TallyJob.State.RUNNING)
+
+        job, created = tally_jobs.start_tally_job(election, self.private_key_pem)
+
+        self.assertEqual((job, created), (active_job, False))
+
+    def test_only_silent_running_jobs_go_stale_and_a_job_runs_once(self):
+        election, candidates = self.make_election()
+        self.cast_encrypted_votes(election, [candidates[0].id])
+        long_ago = timezone.now() - timedelta(hours=1)
+        queued_job = TallyJob.objects.create(election=election)
+        TallyJob.objects.filter(pk=queued_job.pk).update(updated_at=long_ago) # Waiting behind a busy worker
+
+        self.assertEqual(tally_jobs.create_tally_job(election), (queued_job, False))
+
+        self.assertEqual(tally_jobs.run_tally_job(queued_job.id, self.private_key_pem).state, TallyJob.State.SUCCEEDED)
+        with mock.patch.object(tally, 'run_tally') as run_tally:
+            self.assertEqual(tally_jobs.run_tally_job(queued_job.id, self.private_key_pem).state, TallyJob.State.SUCCEEDED)
+        run_tally.assert_not_called()
+
+        running_job = TallyJob.objects.create(election=election, state=TallyJob.State.RUNNING)
+        TallyJob.objects.filter(pk=running_job.pk).update(updated_at=long_ago)
+        job, created = tally_jobs.create_tally_job(election)
+        self.assertTrue(created)
+        running_job.refresh_from_db()
+        self.assertEqual(running_job.state, TallyJob.State.FAILED)
+
+
+class VoteCommitmentTests(ElectionTestMixin, TestCase):
+    def test_commit_query_budget_and_duplicate_commitment(self):
+        election, candidates = self.make_election()
+        client = APIClient()
+        client.force_authenticate(make_user(1))
+        vote_choice = {'election_id': election.id, 'candidate_id': candidates[0].id, 'nonce': 'test-nonce'}
+        election_states.get(election.id) # Warm the election state cache, as on a running server
+
+        # SELECT vote EXISTS, then savepoint, INSERT, UPDATE counter shard, release
+        with self.assertNumQueries(5):
+            response = client.post('/api/vote/commit/', vote_choice, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+
+        response = client.post('/api/vote/commit/', vote_choice, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(VoteCommitment.objects.filter(election=election).count(), 1)
+
+    def test_commit_rejects_candidate_of_another_election(self):
+        election, _ = self.make_election('First')
+        _, other_candidates = self.make_election('Second')
+        client = APIClient()
+        client.force_authenticate(make_user(1))
+
+        response = client.post('/api/vote/commit/', {'election_id': election.id, 'candidate_id': other_candidates[0].id, 'nonce': 'n'}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('candidate_id', response.data)
+
+
+class VoteRevealTests(ElectionTestMixin, TestCase):
+    def commit(self, user, election, candidate_id, nonce='test-nonce'):
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.post('/api/vote/commit/', {'election_id': election.id, 'candidate_id': candidate_id, 'nonce': nonce}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return client
+
+    def test_reveal_query_budget(self):
+        election, candidates = self.make_election()
+        client = self.commit(make_user(1), election, candidates[0].id)
+        election_public_keys.get(election) # Warm the key cache, as on a running server
+        # The election state cache was warmed by the commit
+
+        # Savepoint, SELECT commitment FOR UPDATE, INSERT vote, SELECT bulletin board FOR UPDATE,
+        # INSERT board node, UPDATE board, INSERT ballot, UPDATE commitment, UPDATE counter shard, release savepoint
+        with self.assertNumQueries(10):
+            response = client.post('/api/vote/', {'election_id': election.id, 'candidate_id': candidates[0].id, 'nonce': 'test-nonce'}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertTrue(VoteCommitment.objects.get(election=election).is_revealed)
+
+    def test_unique_constraint_rejects_second_vote_and_rolls_back(self):
+        election, candidates = self.make_election()
+        user = make_user(1)
+        client = self.commit(user, election, candidates[0].id)
+        # A vote stored by a concurrent request that has not marked the commitment yet
+        Vote.objects.create(user=user, election=election)
+
+        response = client.post('/api/vote/', {'election_id': election.id, 'candidate_id': candidates[0].id, 'nonce': 'test-nonce'}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Vote.objects.filter(user=user, election=election).count(), 1)
+        self.assertFalse(Ballot.objects.exists())
+        self.assertFalse(VoteCommitment.objects.get(election=election).is_revealed)
+
+    def test_reveal_rejects_candidate_of_another_election(self):
+        election, candidates = self.make_election('First')
+        _, other_candidates = self.make_election('Second')
+        client = self.commit(make_user(1), election, candidates[0].id)
+
+        response = client.post('/api/vote/', {'election_id': election.id, 'candidate_id': other_candidates[0].id, 'nonce': 'test-nonce'}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Vote.objects.exists())
+
+
+class ElectionCounterTests(ElectionTestMixin, TestCase):
+    def test_commits_and_reveals_are_counted_and_reported_as_turnout(self):
+        election, candidates = self.make_election()
+        for i in range(3):
+            self.assertEqual(self.commit_and_reveal(make_user(i), election, candidates[i % 2].id).status_code, 201)
+        client = APIClient()
+        client.force_authenticate(make_user(3))
+        client.post('/api/vote/commit/', {'election_id': election.id, 'candidate_id': candidates[0].id, 'nonce': 'n'}, format='json')
+        admin = APIClient()
+        admin.force_authenticate(make_user(100, is_staff=True))
+
+        with self.assertNumQueries(2): # Election, counter shards
+            response = admin.get(f'/api/admin/elections/{election.id}/turnout/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            (response.data['commitments'], response.data['ballots'], response.data['pending_reveals']),
+            (4, 3, 1)
+        )
+        self.assertEqual(ElectionCounterShard.objects.filter(election=election).count(), settings.ELECTION_COUNTER_SHARDS)
+
+    def test_reconcile_command_rebuilds_drifted_counters(self):
+        election, candidates = self.make_election()
+        for i in range(2):
+            self.commit_and_reveal(make_user(i), election, candidates[0].id)
+        ElectionCounterShard.objects.filter(election=election).update(ballots=0)
+        ElectionCounterShard.objects.filter(election=election, shard=0).update(ballots=5, decryption_errors=1)
+        output = StringIO()
+
+        call_command('reconcile_election_counters', election.id, stdout=output)
+
+        self.assertIn('ballots 5 -> 2, decryption_errors 1 -> 0', output.getvalue())
+        self.assertEqual(counters.get_counts(election.id), {'commitments': 2, 'ballots': 2, 'decryption_errors': 0})
+
+
+class InlineIngestQueue:
+    """Stand-in for the group commit writer thread that stores each submitted vote immediately."""
+    def submit(self, pending):
+        vote_ingest.write_batch([pending])
+        return pending.future.result()
+
+
+class GroupCommitTests(ElectionTestMixin, TestCase):
+    def test_batch_is_stored_together_and_duplicates_fail_alone(self):
+        election, candidates = self.make_election()
+        voters = [make_user(i) for i in range(3)]
+        Vote.objects.create(user=voters[1], election=election) # Already voted
+        batch = [self.pending_vote(user, election, candidates[0].id) for user in voters]
+
+        vote_ingest.write_batch(batch)
+
+        self.assertIsNotNone(batch[0].future.result().pk)
+        self.assertIsNotNone(batch[2].future.result().pk)
+        self.assertIsInstance(batch[1].future.exception(), IntegrityError)
+        self.assertEqual(Vote.objects.filter(election=election).count(), 3)
+        self.assertEqual(Ballot.objects.filter(election=election).count(), 2)
+        self.assertEqual(counters.get_counts(election.id)['ballots'], 2)
+        self.assertEqual(
+            set(VoteCommitment.objects.filter(is_revealed=True).values_list('user_id', flat=True)),
+            {voters[0].id, voters[2].id}
+        )
+
+    @mock.patch.object(vote_ingest, 'ingest_queue', InlineIngestQueue())
+    def test_reveal_goes_through_the_ingest_queue_in_group_mode(self):
+        election, candidates = self.make_election()
+        user = make_user(1)
+        with self.settings(VOTE_INGEST_MODE='group'):
+            response = self.commit_and_reveal(user, election, candidates[1].id)
+            self.assertEqual(response.status_code, 201, response.data)
+            self.assertEqual(self.commit_and_reveal(make_user(2), election, candidates[1].id).status_code, 201)
+            client = APIClient()
+            client.force_authenticate(user)
+            response = client.post('/api/vote/', {'election_id': election.id, 'candidate_id': candidates[1].id, 'nonce': 'test-nonce'}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            tally.run_tally(election, self.private_key_pem, [c.id for c in candidates]),
+            ({candidates[1].id: 2}, 0)
+        )
+
+
+class DeferredRevealCheckTests(ElectionTestMixin, TestCase):
+    def reveal_other_candidate(self, user, election, committed_id, revealed_id, nonce='test-nonce'):
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.post('/api/vote/commit/', {'election_id': election.id, 'candidate_id': committed_id, 'nonce': nonce}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return client.post('/api/vote/', {'election_id': election.id, 'candidate_id': revealed_id, 'nonce': nonce}, format='json')
+
+    def test_mismatched_reveal_is_accepted_then_left_out_of_the_tally(self):
+        election, candidates = self.make_election(defer_reveal_checks=True)
+        alice, bob, _ = (candidate.id for candidate in candidates)
+        for index, candidate_id in enumerate([alice, bob, bob]):
+            self.assertEqual(self.commit_and_reveal(make_user(index), election, candidate_id).status_code, 201)
+        response = self.reveal_other_candidate(make_user(3), election, bob, alice)
+
+        self.assertEqual(response.status_code, 201, response.data) # Not checked yet
+        pending = Ballot.objects.filter(election=election, pending_commitment_hash__isnull=False)
+        self.assertEqual(pending.count(), 4)
+        self.assertFalse(pending.filter(pending_nonce__isnull=False).exists()) # The nonce is inside the ciphertext
+
+        job, _ = tally_jobs.create_tally_job(election)
+        job = tally_jobs.run_tally_job(job.id, self.private_key_pem)
+
+        election.refresh_from_db()
+        self.assertEqual(json.loads(election.tallied_results_json), {'Alice': 1, 'Bob': 2})
+        self.assertEqual((job.total_votes, job.decryption_errors), (4, 1))
+        self.assertEqual(election.results_ballot_count, 4) # The rejected ballot stays on the board
+        self.assertEqual(Ballot.objects.filter(election=election, rejected=True).count(), 1)
+        self.assertFalse(pending.exists())
+
+    @mock.patch.object(vote_ingest, 'ingest_queue', InlineIngestQueue())
+    def test_group_commit_reveals_are_checked_across_workers(self):
+        election, candidates = self.make_election(defer_reveal_checks=True)
+        alice, bob, _ = (candidate.id for candidate in candidates)
+        with self.settings(VOTE_INGEST_MODE='group'):
+            for index, candidate_id in enumerate([alice, bob, alice]):
+                self.assertEqual(self.commit_and_reveal(make_user(index), election, candidate_id).status_code, 201)
+            self.assertEqual(self.reveal_other_candidate(make_user(3), election, alice, bob).status_code, 201)
+            self.assertEqual(self.reveal_other_candidate(make_user(4), election, bob, bob, nonce='other').status_code, 201)
+        commitment_hash = VoteCommitment.objects.get(user__email='voter4@example.com').commitment_hash
+        Ballot.objects.filter(pending_commitment_hash=commitment_hash).update(encrypted_vote_data=b'tampered' * 8)
+
+        self.assertEqual(reveal_checks.check_pending_reveals(election, self.private_key_pem, workers=2, chunk_size=2), (5, 2))
+        self.assertEqual(reveal_checks.check_pending_reveals(election, self.private_key_pem), (0, 0))
+        self.assertEqual(
+            tally.run_tally(election, self.private_key_pem, [alice, bob]),
+            ({alice: 2, bob: 1}, 2)
+        )
+
+    def test_elgamal_elections_cannot_defer_checks(self):
+        serializer = AdminElectionSerializer(data={
+            'name': 'Deferred', 'start_time': timezone.now(), 'end_time': timezone.now() + timedelta(days=1),
+            'encryption_scheme': SCHEME_EC_ELGAMAL, 'defer_reveal_checks': True,
+        })
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('defer_reveal_checks', serializer.errors)
+
+
+class BallotLogTests(ElectionTestMixin, TestCase):
+    def setUp(self):
+        log_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(log_dir.cleanup)
+        self.addCleanup(ballot_log.ballot_log_writer.close)
+        settings_override = self.settings(BALLOT_STORE='log', BALLOT_LOG_DIR=log_dir.name, BALLOT_LOG_SEGMENT_BYTES=600)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_ballots_are_appended_to_segments_and_tallied_from_them(self):
+        election, candidates = self.make_election()
+        alice, bob, _ = [candidate.id for candidate in candidates]
+        for index, candidate_id in enumerate([alice, bob, bob]):
+            response = self.commit_and_reveal(make_user(index), election, candidate_id)
+            self.assertEqual(response.status_code, 201, response.data)
+
+        ballots = list(Ballot.objects.filter(election=election).order_by('id'))
+        self.assertTrue(all(ballot.ballot_segment is not None and not ballot.encrypted_vote_data for ballot in ballots))
+        self.assertEqual([ballot.ballot_segment for ballot in ballots], [1, 1, 2]) # RSA records are ~350 bytes
+        self.assertEqual(
+            ballot_format.parse_ballot(ballot_log.load_ballot(ballots[0])).key_id,
+            ballot_format.key_id(self.public_key)
+        )
+        self.assertEqual(tally.run_tally(election, self.private_key_pem, [alice, bob]), ({alice: 1, bob: 2}, 0))
+
+    def test_corrupted_record_stops_the_tally_and_the_export(self):
+        election, candidates = self.make_election()
+        for index, candidate in enumerate(candidates[:2]):
+            self.assertEqual(self.commit_and_reveal(make_user(index), election, candidate.id).status_code, 201)
+        ballot = Ballot.objects.filter(election=election).earliest('id')
+        with open(ballot_log.segment_path(election.id, ballot.ballot_segment), 'r+b') as segment_file:
+            segment_file.seek(ballot.ballot_offset + ballot_log.RECORD_HEADER.size + 20)
+            segment_file.write(b'\xff')
+
+        message = f"Ballot {ballot.id} cannot be read from the ballot log"
+        with self.assertRaisesMessage(ValueError, message):
+            tally.run_tally(election, self.private_key_pem, [candidate.id for candidate in candidates])
+        with self.assertRaisesMessage(CommandError, message):
+            call_command('export_ballots', election.id, output=os.path.join(settings.BALLOT_LOG_DIR, 'export.jsonl'))
+
+    def test_batch_retried_after_a_duplicate_keeps_its_ballots(self):
+        election, candidates = self.make_election()
+        voters = [make_user(i) for i in range(3)]
+        batch = [
+            self.pending_vote(user, election, candidates[0].id, encrypted_vote_data=f'ballot {i}'.encode())
+            for i, user in enumerate(voters)
+        ]
+        insert_ballots = Ballot.objects.bulk_create
+        inserts = []
+
+        def duplicate_in_batch(ballots, *args, **kwargs):
+            # The whole batch fails after its ballots went to the log, then voter 1's retry does too
+            inserts.append(ballots)
+            if len(inserts) == 1 or ballots[0] is batch[1].ballot:
+                raise IntegrityError('duplicate key')
+            return insert_ballots(ballots, *args, **kwargs)
+
+        with mock.patch.object(Ballot.objects, 'bulk_create', side_effect=duplicate_in_batch):
+            vote_ingest.write_batch(batch)
+
+        self.assertEqual(len(inserts), 4)
+        self.assertIsInstance(batch[1].future.exception(), IntegrityError)
+        ballots = Ballot.objects.filter(election=election)
+        self.assertEqual(sorted(ballot_log.load_ballot(ballot) for ballot in ballots), [b'ballot 0', b'ballot 2'])
+        self.assertEqual(
+            bulletin_board.get_root(election.id),
+            (2, reference_merkle_root([
+                bulletin_board.leaf_hash(bulletin_board.ballot_digest(ballot_log.load_ballot(ballot))) for ballot in ballots.order_by('id')
+            ]))
+        )
+
+
+def reference_merkle_root(leaves):
+    """RFC 6962 Merkle tree hash, computed recursively from all the leaves."""
+    if not leaves:
+        return bulletin_board.EMPTY_ROOT
+    if len(leaves) == 1:
+        return leaves[0]
+    split = 1 << ((len(leaves) - 1).bit_length() - 1)
+    return bulletin_board.node_hash(reference_merkle_root(leaves[:split]), reference_merkle_root(leaves[split:]))
+
+
+class BulletinBoardTests(ElectionTestMixin, TestCase):
+    def test_incremental_tree_matches_rfc6962_and_proofs_verify(self):
+        election, _ = self.make_election()
+        digests = []
+        for batch_size in (1, 1, 3, 2, 6): # 13 ballots, appended as the ingest queue would
+            ballots = [Ballot(election=election, encrypted_vote_data=os.urandom(48)) for _ in range(batch_size)]
+            bulletin_board.append_ballots(ballots)
+            digests += [bulletin_board.ballot_digest(ballot.encrypted_vote_data) for ballot in ballots]
+            size, root = bulletin_board.get_root(election.id)
+            self.assertEqual((size, root), (len(digests), reference_merkle_root([bulletin_board.leaf_hash(d) for d in digests])))
+
+        for index, digest in enumerate(digests):
+            with self.assertNumQueries(3): # Leaf, board, proof nodes
+                proof = bulletin_board.inclusion_proof(election.id, digest)
+            self.assertEqual((proof['leaf_index'], proof['tree_size']), (index, 13))
+            self.assertLessEqual(len(proof['proof']), 4)
+            self.assertTrue(bulletin_board.verify_inclusion(digest, index, 13, proof['proof'], proof['root']))
+            self.assertFalse(bulletin_board.verify_inclusion(digests[index - 1], index, 13, proof['proof'], proof['root']))
+
+    def test_reveal_returns_ballot_hash_with_public_inclusion_proof(self):
+        election, candidates = self.make_election()
+        self.assertEqual(self.commit_and_reveal(make_user(1), election, candidates[0].id).status_code, 201)
+        response = self.commit_and_reveal(make_user(2), election, candidates[1].id)
+        self.assertEqual(response.status_code, 201, response.data)
+        ballot_sha256 = response.data['ballot_sha256']
+
+        proof_url = f'/api/elections/{election.id}/inclusion-proof/'
+        response = APIClient().get(proof_url, {'ballot_sha256': ballot_sha256})
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual((response.data['leaf_index'], response.data['tree_size']), (1, 2))
+        self.assertTrue(bulletin_board.verify_inclusion(
+            bytes.fromhex(ballot_sha256), 1, 2, [bytes.fromhex(node) for node in response.data['proof']],
+            bytes.fromhex(response.data['root'])
+        ))
+        self.assertEqual(APIClient().get(proof_url, {'ballot_sha256': '0' * 64}).status_code, 404)
+        self.assertEqual(APIClient().get(proof_url, {'ballot_sha256': 'xyz'}).status_code, 400)
+
+
+class ElectionListTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.elections = {}
+        for name, is_active, start, end in [
+            ('open', True, -1, 1), ('upcoming', True, 1, 2), ('ended', True, -2, -1), ('inactive', False, -1, 1),
+        ]:
+            self.elections[name] = Election.objects.create(
+                name=name, is_active=is_active, start_time=now + timedelta(days=start), end_time=now + timedelta(days=end)
+            )
+            Candidate.objects.create(election=self.elections[name], name=f'Candidate of {name}')
+        self.client = APIClient()
+        self.client.force_authenticate(make_user(1))
+
+    def names(self, response):
+        self.assertEqual(response.status_code, 200, response.data)
+        return [election['name'] for election in response.data['results']]
+
+    def test_status_filters_match_is_open_for_voting(self):
+        self.assertEqual(self.names(self.client.get('/api/elections/?status=open')), ['open'])
+        self.assertEqual(self.names(self.client.get('/api/elections/?status=upcoming')), ['upcoming'])
+        self.assertEqual(sorted(self.names(self.client.get('/api/elections/?status=closed'))), ['ended', 'inactive'])
+        self.assertEqual(
+            [name for name, election in self.elections.items() if election.is_open_for_voting],
+            list(Election.objects.open_for_voting().values_list('name', flat=True))
+        )
+        self.assertEqual(self.client.get('/api/elections/?status=running').status_code, 400)
+
+    def test_pages_follow_cursor_newest_first_and_fields_skip_candidates(self):
+        with self.assertNumQueries(1): # No candidate prefetch
+            response = self.client.get('/api/elections/?page_size=2&fields=id,name,is_open_for_voting')
+        self.assertEqual(self.names(response), ['upcoming', 'inactive']) # Same start time as 'open': newest id first
+        self.assertEqual(set(response.data['results'][0]), {'id', 'name', 'is_open_for_voting'})
+
+        self.assertEqual(self.names(self.client.get(response.data['next'])), ['open', 'ended'])
+        self.assertIn('candidates', self.client.get('/api/elections/').data['results'][0])
+        self.assertEqual(self.client.get('/api/elections/?fields=id,secret').status_code, 400)
+
+    def test_ballot_status_of_every_listed_election_comes_with_the_list(self):
+        user = make_user(2)
+        VoteCommitment.objects.create(user=user, election=self.elections['open'], commitment_hash=b'c')
+        VoteCommitment.objects.create(user=user, election=self.elections['ended'], commitment_hash=b'c')
+        Vote.objects.create(user=user, election=self.elections['ended'])
+        VoteCommitment.objects.create(user=make_user(3), election=self.elections['upcoming'], commitment_hash=b'c')
+        self.client.force_authenticate(user)
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/elections/?fields=id,name,has_committed,has_voted')
+
+        self.assertEqual(
+            {election['name']: (election['has_committed'], election['has_voted']) for election in response.data['results']},
+            {'upcoming': (False, False), 'open': (True, False), 'inactive': (False, False), 'ended': (True, True)}
+        )
+        response = self.client.get(f"/api/elections/{self.elections['open'].id}/")
+        self.assertEqual((response.data['has_committed'], response.data['has_voted']), (True, False))
+
+
+class ElectionChangeFeedTests(ElectionTestMixin, TestCase):
+    def test_feed_sends_changed_elections_and_tombstones_and_304_when_idle(self):
+        client = APIClient()
+        client.force_authenticate(make_user(1))
+        election, candidates = self.make_election('First')
+        removed, _ = self.make_election('Second')
+        response = client.get('/api/elections/changes/?fields=id,name,candidates')
+        version = response.data['version']
+        self.assertEqual(sorted(e['name'] for e in response.data['elections']), ['First', 'Second'])
+
+        poll = f'/api/elections/changes/?since={version}&fields=id,name,candidates'
+        response = client.get(poll)
+        self.assertEqual(response.data['elections'], [])
+        with self.assertNumQueries(1): # Latest version
+            response = client.get(poll, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        removed_id = removed.id
+        candidates[0].delete()
+        removed.delete()
+        response = client.get(f'/api/elections/changes/?since={version}&fields=id,candidates')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([e['id'] for e in response.data['elections']], [election.id])
+        self.assertEqual(len(response.data['elections'][0]['candidates']), 2)
+        self.assertEqual(response.data['deleted'], [removed_id])
+        self.assertGreater(response.data['version'], version)
+        self.assertEqual(response.data['version'], change_feed.latest_version())
+
+    def test_etag_varies_with_since_and_fields_and_feed_leaves_out_ballot_status(self):
+        election, _ = self.make_election('First')
+        voter = make_user(1)
+        client = APIClient()
+        client.force_authenticate(voter)
+        response = client.get('/api/elections/changes/?fields=id,name')
+        etag = response['ETag']
+
+        for query in ('?fields=id', '?since=1&fields=id,name'):
+            response = client.get(f'/api/elections/changes/{query}', HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+
+        response = client.get('/api/elections/changes/')
+        self.assertNotIn('has_committed', response.data['elections'][0])
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+        etag = response['ETag']
+        VoteCommitment.objects.create(election=election, user=voter, commitment_hash=b'c')
+        self.assertEqual(client.get('/api/elections/changes/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(client.get('/api/elections/changes/?fields=id,has_voted').status_code, 400)
+
+
+class ElectionPublicKeyCacheTests(ElectionTestMixin, TestCase):
+    def test_keys_are_parsed_once_and_evicted_lru(self):
+        cache = ElectionPublicKeyCache(max_size=1)
+        first, _ = self.make_election('First')
+        second, _ = self.make_election('Second')
+
+        public_key = cache.get(first)
+        self.assertIs(cache.get(first), public_key)
+        cache.get(second) # Evicts the first election's key
+        cache.get(first)
+
+        self.assertEqual(public_key.public_numbers(), self.public_key.public_numbers())
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 3)
+        self.assertEqual(cache.stats()['evictions'], 2)
+
+    def test_election_save_invalidates_cached_key(self):
+        election_public_keys.clear()
+        election, _ = self.make_election()
+        election_public_keys.get(election)
+        self.assertEqual(election_public_keys.stats()['size'], 1)
+
+        election.save()
+
+        self.assertEqual(election_public_keys.stats()['size'], 0)
+
+
+class ElectionResultsCacheTests(ElectionTestMixin, TestCase):
+    def setUp(self):
+        election_results.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(make_user(1))
+
+    def close_election(self, election, results):
+        election.end_time = timezone.now() - timedelta(minutes=1)
+        election.tallied_results_json = json.dumps(results)
+        election.results_signature = 'signature'
+        election.save()
+
+    def test_closed_election_results_are_rendered_once_and_revalidated_by_etag(self):
+        election, _ = self.make_election()
+        self.close_election(election, {'Alice': 1, 'Bob': 3})
+        url = f'/api/elections/{election.id}/results/'
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['results']['Bob'], {'votes': 3, 'percentage': '75.0%'})
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+        etag = response['ETag']
+
+        with self.assertNumQueries(2): # Only the results signature is read; the body comes from the cache
+            self.assertEqual(self.client.get(url).content, response.content)
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((not_modified.status_code, not_modified['ETag']), (304, etag))
+
+        self.close_election(election, {'Alice': 2, 'Bob': 3}) # New results written by a tally
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(json.loads(response.content)['results']['Alice']['votes'], 2)
+
+    def test_results_of_a_tally_saved_by_another_worker_are_not_served_stale(self):
+        election, _ = self.make_election()
+        self.close_election(election, {'Alice': 1, 'Bob': 3})
+        url = f'/api/elections/{election.id}/results/'
+        etag = self.client.get(url)['ETag']
+
+        # Written without signals, as this worker sees a tally saved by another one
+        Election.objects.filter(pk=election.pk).update(tallied_results_json=json.dumps({'Alice': 2, 'Bob': 3}), results_signature='new signature')
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['results']['Alice']['votes'], 2)
+
+    def test_open_election_results_are_not_cached(self):
+        election, _ = self.make_election()
+
+        response = self.client.get(f'/api/elections/{election.id}/results/')
+
+        self.assertEqual(response.data['results'], "Results are not available at this time.")
+        self.assertNotIn('ETag', response)
+        self.assertEqual(election_results.stats()['size'], 0)
+
+
+class ElectionStateCacheTests(ElectionTestMixin, TestCase):
+    def test_state_is_loaded_once_and_evicted_lru(self):
+        cache = ElectionStateCache(LocalMemoryBackend(max_size=1, timeout=60))
+        first, candidates = self.make_election('First')
+        second, _ = self.make_election('Second')
+
+        state = cache.get(first.id)
+        with self.assertNumQueries(0):
+            self.assertIs(cache.get(first.id), state)
+        cache.get(second.id) # Evicts the first election's state
+        cache.get(first.id)
+
+        self.assertTrue(state.is_open_for_voting)
+        self.assertEqual(state.candidate_ids, frozenset(candidate.id for candidate in candidates))
+        self.assertEqual(state.key_id, ballot_format.key_id(self.public_key))
+        self.assertIsNone(cache.get(0))
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 4)
+
+    def test_election_and_candidate_changes_invalidate_state(self):
+        election, candidates = self.make_election()
+        self.assertTrue(election_states.get(election.id).is_open_for_voting)
+
+        election.is_active = False
+        election.save()
+        self.assertFalse(election_states.get(election.id).is_open_for_voting)
+
+        new_candidate = Candidate.objects.create(election=election, name='Dave')
+        self.assertIn(new_candidate.id, election_states.get(election.id).candidate_ids)
+        candidates[0].delete()
+        self.assertNotIn(candidates[0].id, election_states.get(election.id).candidate_ids)
+
+@mock.patch.object(key_pool, 'refill_in_background', lambda scheme: None)
+class ElectionKeyPoolTests(TestCase):
+    def test_pooled_private_keys_are_not_stored_as_usable_pems(self):
+        key_pool.fill_pool(SCHEME_RSA_AES_GCM, target=1)
+        stored = bytes(PooledElectionKey.objects.get().encrypted_private_key)
+
+        self.assertNotIn(b'PRIVATE KEY', stored)
+        with self.assertRaises(ValueError):
+            serialization.load_pem_private_key(stored, password=None)
+
+        with self.settings(ELECTION_KEY_POOL_SECRET='another secret'): # Sealed under another secret: discarded
+            private_key_pem, _ = key_pool.claim_key_pair(SCHEME_RSA_AES_GCM)
+        self.assertIn('BEGIN PRIVATE KEY', private_key_pem)
+        self.assertFalse(PooledElectionKey.objects.exists())
+
+    def test_claim_takes_pooled_key_and_falls_back_when_empty(self):
+        self.assertEqual(key_pool.fill_pool(SCHEME_RSA_AES_GCM, target=1), 1)
+        pooled = PooledElectionKey.objects.get()
+
+        private_key_pem, public_key_pem = key_pool.claim_key_pair(SCHEME_RSA_AES_GCM)
+        self.assertEqual(public_key_pem, pooled.public_key_pem)
+        self.assertEqual(
+            crypto_utils.public_key_fingerprint(serialization.load_pem_private_key(private_key_pem.encode(), password=None).public_key()),
+            crypto_utils.public_key_fingerprint(serialization.load_pem_public_key(public_key_pem.encode()))
+        )
+        self.assertFalse(PooledElectionKey.objects.exists())
+
+        private_key_pem, public_key_pem = key_pool.claim_key_pair(SCHEME_RSA_AES_GCM)
+        self.assertIn('BEGIN PUBLIC KEY', public_key_pem)
+        self.assertNotEqual(public_key_pem, pooled.public_key_pem)
 
-# Create your tests here.
@@ -4,13 +4,15 @@ from .views import (
     UserCreateView, ElectionViewSet, AdminElectionViewSet, 
     AdminCandidateViewSet, VoteView, UserProfileView,
     AdminUserViewSet, VerifyEmailView, ChangePasswordView,
-    PasswordResetRequestView, PasswordResetConfirmView, SubmitVoteCommitmentView
+    PasswordResetRequestView, PasswordResetConfirmView, SubmitVoteCommitmentView,
+    AdminTallyJobViewSet, AdminCacheStatsView
 )
 
 router = DefaultRouter()
 router.register(r'elections', ElectionViewSet, basename='election') # For voters
 router.register(r'admin/elections', AdminElectionViewSet, basename='admin-election') # For admins
 router.register(r'admin/candidates', AdminCandidateViewSet, basename='admin-candidate') # For admins
+router.register(r'admin/tally-jobs', AdminTallyJobViewSet, basename='admin-tally-job') # For admins
 
 # --- THIS IS THE ROUTER REGISTRATION TO VERIFY OR ADD ---
 router.register(r'admin/users', AdminUserViewSet, basename='admin-user')
@@ -26,4 +28,5 @@ urlpatterns = [
     path('password-reset/request/', PasswordResetRequestView.as_view(), name='password-reset-request'),
     path('password-reset/confirm/', PasswordResetConfirmView.as_view(), name='password-reset-confirm'),
      path('vote/commit/', SubmitVoteCommitmentView.as_view(), name='vote-commit'),
+    path('admin/cache-stats/', AdminCacheStatsView.as_view(), name='admin-cache-stats'),
 ]
\ No newline at end of file
@@ -8,12 +8,13 @@ from rest_framework.views import APIView
 from rest_framework import serializers as drf_serializers # <<< IMPORT serializers module
 from .models import EmailVerificationToken # <<< IMPORT
 from django.utils import timezone # Import timezone
-from e_voting.crypto_utils import crypto_utils
+from e_voting.crypto_utils import crypto_utils, SCHEME_RSA_AES_GCM
 from cryptography.hazmat.primitives import serialization # For serializing keys
 from .serializers import (
     UserProfileSerializer, UserSerializer, ElectionSerializer, CandidateSerializer, VoteCommitmentRequestSerializer,
     VoteSerializer, ElectionResultSerializer, ChangePasswordSerializer,
-    PasswordResetConfirmSerializer, PasswordResetRequestSerializer, AdminElectionSerializer
+    PasswordResetConfirmSerializer, PasswordResetRequestSerializer, AdminElectionSerializer,
+    TallyJobSerializer
 )
 from rest_framework import generics, viewsets, status, parsers
 from accounts.models import PasswordResetToken
@@ -22,52 +23,29 @@ from django.template.loader import render_to_string
 from django.utils.html import strip_tags
 from django.conf import settings
 from django.utils import timezone
+from django.http import Http404, HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+from django.db.models import Exists, OuterRef
  
 from django.contrib.auth import get_user_model
-from .models import VoteCommitment # Ensure VoteCommitment is imported
+from .models import VoteCommitment, TallyJob # Ensure VoteCommitment is imported
+from . import tally_jobs, key_pool, vote_ingest, bulletin_board, counters, change_feed
+from .key_cache import election_public_keys
+from .election_cache import election_states
+from .results_cache import election_results, cache_control
+from .pagination import ElectionCursorPagination
 import json
+import re
  
 User = get_user_model() # Call the function to get the correct User model
  
-class SubmitVoteCommitmentView(generics.CreateAPIView): # Or just APIView
-    serializer_class = VoteCommitmentRequestSerializer
-    permission_classes = [IsAuthenticated]
- 
-    def perform_create(self, serializer): # Called by CreateAPIView if serializer.is_valid()
-        user = self.request.user
-        election = serializer.validated_data['election_id'] # This is the Election instance
-        candidate_id = serializer.validated_data['candidate_id']
-        nonce = serializer.validated_data['nonce']
- 
-        vote_data_to_commit = {'candidate_id': candidate_id, 'election_id': election.id}
-        
-        commitment_hash = crypto_utils.generate_vote_commitment(vote_data_to_commit, nonce)
- 
-        VoteCommitment.objects.create(
-            user=user,
-            election=election,
-            commitment_hash=commitment_hash
-        )
- 
 class SubmitVoteCommitmentView(APIView):
     permission_classes = [IsAuthenticated]
  
     def post(self, request, *args, **kwargs):
         serializer = VoteCommitmentRequestSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
-            user = request.user
-            election = serializer.validated_data['election_id'] # Election instance
-            candidate_id = serializer.validated_data['candidate_id'] # Candidate ID
-            nonce = serializer.validated_data['nonce']
- 
-            vote_data_to_commit = {'candidate_id': candidate_id, 'election_id': election.id}
-            commitment_hash = crypto_utils.generate_vote_commitment(vote_data_to_commit, nonce)
- 
-            VoteCommitment.objects.create(
-                user=user,
-                election=election,
-                commitment_hash=commitment_hash
-            )
+            serializer.save() # Hashes the commitment; a duplicate is rejected by the unique constraint
             return Response({"message": "Vote commitment received successfully."}, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
  
@@ -310,17 +288,139 @@ class UserCreateView(generics.CreateAPIView):
         except Exception as e:
             print(f"Error sending verification email to {to_email}: {e}")
  
+def election_change_feed(request, queryset, serialize, variant=()):
+    """
+    Elections changed since ?since=<feed version> (see change_feed.py), serialized with
+    serialize(queryset), plus the ids of those deleted. The ETag covers the latest version,
+    since and variant (whatever else the serialized elections depend on): a client sending
+    it back in If-None-Match gets a 304 while nothing has changed.
+    """
+    since = request.query_params.get('since', '0')
+    if not since.isdigit():
+        return Response({"error": "since must be a feed version."}, status=status.HTTP_400_BAD_REQUEST)
+    version = change_feed.latest_version()
+    etag = change_feed.etag(version, int(since), *variant)
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match and etag in parse_etags(if_none_match):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+    since = int(since) if int(since) <= version else 0 # A version from the future (restored database): start over
+    changed, deleted = change_feed.changes_since(since, version) if since < version else ([], [])
+    response = Response({
+        "version": version,
+        "elections": serialize(queryset.filter(pk__in=changed).order_by('id')) if changed else [],
+        "deleted": deleted,
+    })
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache' # Only valid until the next change
+    return response
+ 
+# ?status= of the election list -> ElectionQuerySet method
+ELECTION_STATUS_FILTERS = {'open': 'open_for_voting', 'upcoming': 'upcoming', 'closed': 'closed'}
+# The caller's ballot status: left out of the change feed, whose versions and ETags only follow the elections
+BALLOT_STATUS_FIELDS = ('has_committed', 'has_voted')
+ 
 class ElectionViewSet(viewsets.ReadOnlyModelViewSet): # Read-only for regular users
-    queryset = Election.objects.all().prefetch_related('candidates')
+    queryset = Election.objects.all()
     serializer_class = ElectionSerializer
     permission_classes = [IsAuthenticated] # Must be logged in to view elections
+    pagination_class = ElectionCursorPagination
+ 
+    def get_requested_fields(self):
+        """Fields picked with ?fields=id,name,... or None for all of them (the change feed: all but the ballot status)."""
+        available = ElectionSerializer.Meta.fields
+        if self.action == 'changes':
+            available = [name for name in available if name not in BALLOT_STATUS_FIELDS]
+        fields = self.request.query_params.get('fields')
+        if not fields:
+            return available if self.action == 'changes' else None
+        requested = [name.strip() for name in fields.split(',') if name.strip()]
+        unknown = set(requested) - set(available)
+        if unknown:
+            raise drf_serializers.ValidationError({"fields": f"Unknown field(s): {', '.join(sorted(unknown))}."})
+        return requested
+ 
+    def get_queryset(self):
+        queryset = Election.objects.all()
+        if self.action == 'list':
+            # Filtered in the database (see ElectionQuerySet) rather than on is_open_for_voting per row
+            status_filter = self.request.query_params.get('status')
+            if status_filter:
+                if status_filter not in ELECTION_STATUS_FILTERS:
+                    raise drf_serializers.ValidationError({"status": f"Must be one of: {', '.join(ELECTION_STATUS_FILTERS)}."})
+                queryset = getattr(queryset, ELECTION_STATUS_FILTERS[status_filter])()
+        if self.action not in ('list', 'retrieve', 'changes'):
+            return queryset.prefetch_related('candidates')
+        fields = self.get_requested_fields()
+        if fields is None or 'candidates' in fields:
+            queryset = queryset.prefetch_related('candidates')
+        if fields is None or set(BALLOT_STATUS_FIELDS) & set(fields):
+            # The caller's ballot status, in the same query: each subquery is a lookup on the (user, election) unique index
+            user = self.request.user
+            queryset = queryset.annotate(
+                has_committed=Exists(VoteCommitment.objects.filter(election=OuterRef('pk'), user=user)),
+                has_voted=Exists(Vote.objects.filter(election=OuterRef('pk'), user=user)),
+            )
+        return queryset
+ 
+    def get_serializer(self, *args, **kwargs):
+        if self.action in ('list', 'retrieve', 'changes'):
+            kwargs.setdefault('fields', self.get_requested_fields())
+        return super().get_serializer(*args, **kwargs)
+ 
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        # Takes the same fields= option as the list, without the ballot status (clients read it from the list)
+        return election_change_feed(
+            request,
+            self.get_queryset(),
+            lambda elections: self.get_serializer(elections, many=True).data,
+            variant=(self.get_requested_fields(),)
+        )
  
     @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated])
     def results(self, request, pk=None):
-        election = self.get_object()
-        # The serializer will handle permission logic for showing results
-        serializer = ElectionResultSerializer(election, context={'request': request})
-        return Response(serializer.data)
+        state = election_states.get(int(pk)) if pk.isdigit() else None
+        if state is None:
+            raise Http404
+        if state.is_open_for_voting:
+            # Only admins see results while voting is open, and those change with every tally: not cached
+            election = self.get_object()
+            # The serializer will handle permission logic for showing results
+            serializer = ElectionResultSerializer(election, context={'request': request})
+            return Response(serializer.data)
+
+        rendered = election_results.get(state.id)
+        if rendered is None:
+            raise Http404
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match and any(etag == '*' or etag.removeprefix('W/') == rendered.etag for etag in parse_etags(if_none_match)):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(rendered.body, content_type='application/json')
+        response['ETag'] = rendered.etag
+        response['Cache-Control'] = cache_control()
+        return response
+
+    @action(detail=True, methods=['get'], permission_classes=[AllowAny], url_path='inclusion-proof')
+    def inclusion_proof(self, request, pk=None):
+        # Public, like a bulletin board: the proof only says the ballot with this hash was stored
+        ballot_sha256 = request.query_params.get('ballot_sha256', '').lower()
+        if not re.fullmatch(r'[0-9a-f]{64}', ballot_sha256):
+            return Response({"error": "ballot_sha256 must be the hex SHA-256 of your ballot."}, status=status.HTTP_400_BAD_REQUEST)
+        proof = bulletin_board.inclusion_proof(int(pk), bytes.fromhex(ballot_sha256)) if pk.isdigit() else None
+        if proof is None:
+            return Response({"error": "No such ballot on this election's bulletin board."}, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            "election_id": int(pk),
+            "ballot_sha256": ballot_sha256,
+            "leaf_index": proof['leaf_index'],
+            "tree_size": proof['tree_size'],
+            "root": proof['root'].hex(),
+            "proof": [node.hex() for node in proof['proof']],
+        })
  
 class AdminElectionViewSet(viewsets.ModelViewSet): # Full CRUD for admins
     queryset = Election.objects.all()
@@ -331,22 +431,13 @@ class AdminElectionViewSet(viewsets.ModelViewSet): # Full CRUD for admins
     _temp_generated_private_key_pem = None
  
     def perform_create(self, serializer):
-        private_key, public_key = crypto_utils.generate_rsa_key_pair()
-        
-        public_key_pem = public_key.public_bytes(
-            encoding=serialization.Encoding.PEM,
-            format=serialization.PublicFormat.SubjectPublicKeyInfo
-        ).decode('utf-8')
+        encryption_scheme = serializer.validated_data.get('encryption_scheme', SCHEME_RSA_AES_GCM)
+        # Claim a pre-generated key pair; falls back to generating one inline when the pool is empty
+        private_key_pem, public_key_pem = key_pool.claim_key_pair(encryption_scheme)
  
         # For this demo, we'll print the private key. In a real system, store it securely (e.g., encrypted file, HSM).
         # DO NOT DO THIS IN PRODUCTION.
-        private_key_pem = private_key.private_bytes(
-            encoding=serialization.Encoding.PEM,
-            format=serialization.PrivateFormat.PKCS8,
-            encryption_algorithm=serialization.NoEncryption() # No password for demo simplicity
-        ).decode('utf-8')
-        
-        print(f"--- Election RSA Keys for new election ---")
+        print(f"--- Election {encryption_scheme} Keys for new election ---")
         print(f"Public Key PEM:\n{public_key_pem}")
         print(f"Private Key PEM (SAVE THIS SECURELY - DO NOT COMMIT TO GIT IF REAL):\n{private_key_pem}")
         print(f"-------------------------------------------")
@@ -381,7 +472,10 @@ class AdminElectionViewSet(viewsets.ModelViewSet): # Full CRUD for admins
                 return Response({
                     "message": "Results were already tallied and signed.",
                     "results": parsed_results, # Return the parsed object
-                    "signature": election.results_signature
+                    "ballot_count": election.results_ballot_count,
+                    "merkle_root": election.results_merkle_root,
+                    "signature": election.results_signature,
+                    "signing_key_id": election.results_signing_key_id
                 }, status=status.HTTP_200_OK)
             except json.JSONDecodeError:
                 # Fall through to re-tally if stored JSON is corrupt
@@ -390,70 +484,69 @@ class AdminElectionViewSet(viewsets.ModelViewSet): # Full CRUD for admins
  
         election_rsa_private_key_pem = request.data.get('election_rsa_private_key_pem')
         if not election_rsa_private_key_pem:
-            return Response({"error": "Election's RSA private key PEM is required for tallying."}, status=status.HTTP_400_BAD_REQUEST)
+            return Response({"error": "Election's private key PEM is required for tallying."}, status=status.HTTP_400_BAD_REQUEST)
  
         try:
-            rsa_private_key_obj = serialization.load_pem_private_key(
+            serialization.load_pem_private_key(
                 election_rsa_private_key_pem.encode('utf-8'),
                 password=None,
                 backend=crypto_utils.backend
             )
         except Exception as e:
-            return Response({"error": f"Invalid or malformed RSA private key: {e}"}, status=status.HTTP_400_BAD_REQUEST)
- 
-        candidate_counts = {}
-        # Fetch all candidates for this election once to avoid N+1 queries for names
-        candidates_for_election = {c.id: c.name for c in Candidate.objects.filter(election=election)}
- 
-        encrypted_votes_qs = Vote.objects.filter(election=election)
-        if not encrypted_votes_qs.exists():
-            # Even if no votes, we might want to sign an empty result set
-            election.tallied_results_json = json.dumps({}) # Store empty results
-            election.results_signature = crypto_utils.sign_data({}, crypto_utils.get_system_ed25519_private_key())
-            election.save()
-            return Response({"message": "No votes cast to tally. Empty result set signed.", "results": {}, "signature": election.results_signature}, status=status.HTTP_200_OK)
- 
-        decryption_errors = 0
-        for vote in encrypted_votes_qs:
-            try:
-                encrypted_payload_dict = json.loads(vote.encrypted_vote_data)
-                decrypted_vote_data = crypto_utils.decrypt_vote(encrypted_payload_dict, rsa_private_key_obj)
-                candidate_id = decrypted_vote_data.get('candidate_id')
-                
-                if candidate_id and candidate_id in candidates_for_election:
-                    candidate_name = candidates_for_election[candidate_id]
-                    candidate_counts[candidate_name] = candidate_counts.get(candidate_name, 0) + 1
-                else:
-                    print(f"Warning: Vote {vote.id} had invalid candidate_id '{candidate_id}' after decryption or candidate not found in election.")
-                    decryption_errors += 1
-            except Exception as e:
-                print(f"Error decrypting vote {vote.id}: {e}")
-                decryption_errors += 1 # Count as an error
- 
-        if decryption_errors > 0:
-            print(f"Warning: {decryption_errors} vote(s) could not be decrypted or processed for election {election.id}.")
-            # Decide if you want to proceed with signing if there were errors, or return an error.
-            # For now, we'll proceed with what could be tallied.
+            return Response({"error": f"Invalid or malformed election private key: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+ 
+        # Decryption runs as a background TallyJob; the signed results are written to the
+        # election when it finishes. Poll admin/tally-jobs/<job_id>/ for progress.
+        job, created = tally_jobs.start_tally_job(
+            election,
+            election_rsa_private_key_pem.encode('utf-8'),
+            requested_by=request.user
+        )
+        return Response({
+            "message": "Tally job queued." if created else "A tally job is already in progress for this election.",
+            "job_id": job.id,
+            "state": job.state,
+        }, status=status.HTTP_202_ACCEPTED)
+ 
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def changes(self, request):
+        queryset = self.get_queryset().prefetch_related('candidates')
+        return election_change_feed(request, queryset, lambda elections: self.get_serializer(elections, many=True).data)
+ 
+    @action(detail=True, methods=['get'], permission_classes=[IsAdminUser])
+    def turnout(self, request, pk=None):
+        # Live counts from the election's counter shards: no scan of the vote tables
+        election = self.get_object()
+        counts = counters.get_counts(election.id)
+        return Response({
+            "election_id": election.id,
+            "commitments": counts['commitments'],
+            "ballots": counts['ballots'],
+            "pending_reveals": max(0, counts['commitments'] - counts['ballots']),
+            "decryption_errors": counts['decryption_errors'],
+        })
+ 
+class AdminTallyJobViewSet(viewsets.ReadOnlyModelViewSet):
+    serializer_class = TallyJobSerializer
+    permission_classes = [IsAdminUser]
  
-        final_results_obj = dict(sorted(candidate_counts.items()))
-        results_json_str = json.dumps(final_results_obj) # This is what will be signed
+    def get_queryset(self):
+        queryset = TallyJob.objects.all()
+        election_id = self.request.query_params.get('election')
+        if election_id:
+            queryset = queryset.filter(election_id=election_id)
+        return queryset
  
-        try:
-            system_ed25519_private_key = crypto_utils.get_system_ed25519_private_key()
-            signature = crypto_utils.sign_data(final_results_obj, system_ed25519_private_key) # Sign the object
-        except Exception as e:
-            print(f"Error signing results: {e}")
-            return Response({"error": "Could not sign election results due to a server error."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+class AdminCacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
  
-        election.results_signature = signature
-        election.tallied_results_json = results_json_str
-        election.save()
-        
+    def get(self, request):
         return Response({
-            "message": f"Results tallied and signed successfully. {decryption_errors} vote(s) had issues during decryption.",
-            "results": final_results_obj, # Send the object, not the string, so serializer can format it
-            "signature": signature
-        }, status=status.HTTP_200_OK)
+            "election_public_keys": election_public_keys.stats(),
+            "election_states": election_states.stats(),
+            "election_results": election_results.stats(),
+            "vote_ingest": vote_ingest.ingest_queue.stats(),
+        })
  
 class AdminCandidateViewSet(viewsets.ModelViewSet):
     queryset = Candidate.objects.all()
@@ -484,8 +577,8 @@ class VoteView(generics.CreateAPIView):
             raise e
             
         self.perform_create(serializer)
-        headers = self.get_success_headers(serializer.data)
-        return Response({"message": "Vote cast successfully!"}, status=status.HTTP_201_CREATED, headers=headers)
+        # The ballot hash lets the voter fetch an inclusion proof from the election's bulletin board
+        return Response({"message": "Vote cast successfully!", "ballot_sha256": serializer.ballot_sha256}, status=status.HTTP_201_CREATED)
     
 class UserProfileView(APIView):
     permission_classes = [IsAuthenticated]
@@ -0,0 +1,180 @@
+# backend/voting/vote_ingest.py
+"""
+Group commit for revealed votes.
+
+With VOTE_INGEST_MODE = 'group', a reveal request does its checks and
+encryption on its own thread and then hands the unsaved Vote (voter ledger
+entry) and Ballot to a single writer thread per process. The writer collects
+up to VOTE_INGEST_BATCH_SIZE votes, or whatever arrived within
+VOTE_INGEST_MAX_DELAY_MS of the first one (a batch holding every waiting
+request is written at once), and stores them in one transaction: one bulk
+INSERT each of the votes and the ballots, one UPDATE marking their
+commitments revealed, one bulletin board append, one counter update per
+election and one running aggregate update per ElGamal election. The ballots of a batch are
+stored in a random order. The request waits until that transaction has committed, so a 201
+still means the ballot is stored.
+
+A vote rejected by the (user, election) unique constraint only fails its own
+request: the batch is retried vote by vote in savepoints, and the request gets
+the IntegrityError, exactly as on the direct path.
+"""
+import queue
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import connections, transaction, IntegrityError
+
+from .models import Vote, Ballot, VoteCommitment
+from . import tally, ballot_log, bulletin_board, counters
+
+
+def is_enabled():
+    return getattr(settings, 'VOTE_INGEST_MODE', 'direct') == 'group'
+
+
+def get_batch_size():
+    return max(1, int(getattr(settings, 'VOTE_INGEST_BATCH_SIZE', 64)))
+
+
+def get_max_delay():
+    return max(0, int(getattr(settings, 'VOTE_INGEST_MAX_DELAY_MS', 5))) / 1000
+
+
+class PendingVote:
+    """An unsaved Vote and Ballot, the commitment they reveal and, for ElGamal, the payload to add to the running sum."""
+    def __init__(self, vote, ballot, commitment_id, homomorphic_payload=None):
+        self.vote = vote
+        self.ballot = ballot
+        self.commitment_id = commitment_id
+        self.homomorphic_payload = homomorphic_payload
+        self.encrypted_vote_data = ballot.encrypted_vote_data # move_to_log() empties the Ballot's copy
+        self.future = Future()
+
+    def reset(self):
+        """Undo what a rolled back _store() did to the unsaved Vote and Ballot, so they can be stored again."""
+        self.vote.pk = self.ballot.pk = None # Ids assigned by the rolled back INSERTs
+        self.ballot.encrypted_vote_data = self.encrypted_vote_data
+        self.ballot.ballot_segment = self.ballot.ballot_offset = None
+
+
+def _store(pending_votes):
+    Vote.objects.bulk_create([pending.vote for pending in pending_votes])
+    # In a random order, so a ballot's id and board position don't say which vote of the batch it belongs to
+    ballots = [pending.ballot for pending in pending_votes]
+    random.SystemRandom().shuffle(ballots)
+    bulletin_board.append_ballots(ballots) # One tree update per election for the whole batch
+    if ballot_log.is_enabled():
+        ballot_log.move_to_log(ballots) # One fsync per election for the whole batch
+    Ballot.objects.bulk_create(ballots)
+    VoteCommitment.objects.filter(pk__in=[pending.commitment_id for pending in pending_votes]).update(is_revealed=True)
+    votes_by_election = defaultdict(int)
+    payloads_by_election = defaultdict(list)
+    for pending in pending_votes:
+        votes_by_election[pending.vote.election_id] += 1
+        if pending.homomorphic_payload is not None:
+            payloads_by_election[pending.vote.election_id].append(pending.homomorphic_payload)
+    for election_id, count in votes_by_election.items():
+        counters.add(election_id, ballots=count)
+    for election_id, payloads in payloads_by_election.items():
+        tally.add_to_running_aggregate(election_id, payloads)
+
+
+def write_batch(batch):
+    """Store a batch of PendingVotes in one transaction and resolve their futures."""
+    failed = {}
+    try:
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    _store(batch)
+            except IntegrityError:
+                # Someone in the batch already voted: store the others one savepoint at a time.
+                # Ballot log records written by the rolled back attempt are left unreferenced.
+                for pending in batch:
+                    pending.reset()
+                for pending in batch:
+                    try:
+                        with transaction.atomic():
+                            _store([pending])
+                    except IntegrityError as e:
+                        pending.reset()
+                        failed[pending] = e
+    except Exception as e:
+        for pending in batch:
+            pending.future.set_exception(e)
+        raise
+    for pending in batch:
+        if pending in failed:
+            pending.future.set_exception(failed[pending])
+        else:
+            pending.future.set_result(pending.vote)
+
+
+class VoteIngestQueue:
+    def __init__(self, batch_size, max_delay):
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        self._waiting = 0 # Requests blocked in submit()
+        self.batches = 0
+        self.votes = 0
+
+    def submit(self, pending):
+        """Queue a PendingVote and block until its batch is committed. Returns the saved Vote."""
+        self._ensure_writer()
+        with self._writer_lock:
+            self._waiting += 1
+        try:
+            self._queue.put(pending)
+            return pending.future.result()
+        finally:
+            with self._writer_lock:
+                self._waiting -= 1
+
+    def _ensure_writer(self):
+        with self._writer_lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._run, name='vote-ingest', daemon=True)
+                self._writer.start()
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.batch_size:
+            if len(batch) >= self._waiting:
+                break # Nobody else is waiting: do not hold this batch back for votes that may never come
+            timeout = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                write_batch(batch)
+                self.batches += 1
+                self.votes += len(batch)
+            except Exception as e:
+                print(f"Error storing a batch of {len(batch)} vote(s): {e}")
+                connections.close_all() # Start the next batch on a fresh connection
+
+    def stats(self):
+        return {
+            "mode": 'group' if is_enabled() else 'direct',
+            "batches": self.batches,
+            "votes": self.votes,
+            "mean_batch_size": round(self.votes / self.batches, 1) if self.batches else 0.0,
+            "queued": self._queue.qsize(),
+        }
+
+
+ingest_queue = VoteIngestQueue(get_batch_size(), get_max_delay())
@@ -22,6 +22,9 @@ function CreateElectionPage() {
     new Date(new Date().getTime() + 7 * 24 * 60 * 60 * 1000) // Default: 7 days from now
   );
   const [isActive, setIsActive] = useState(true);
+  const [encryptionScheme, setEncryptionScheme] = useState("rsa-aes-gcm");
+  const [clientSideEncryption, setClientSideEncryption] = useState(false);
+  const [deferRevealChecks, setDeferRevealChecks] = useState(false);
  
   // Candidate Management State
   const [candidates, setCandidates] = useState([]); // Stores { name, description, photo (File object), preview (string URL) }
@@ -115,6 +118,9 @@ function CreateElectionPage() {
     formData.append("start_time", startDate.toISOString()); // Use Date object state
     formData.append("end_time", endDate.toISOString()); // Use Date object state
     formData.append("is_active", isActive);
+    formData.append("encryption_scheme", encryptionScheme);
+    formData.append("client_side_encryption", clientSideEncryption);
+    formData.append("defer_reveal_checks", encryptionScheme !== "ec-elgamal-p256" && deferRevealChecks);
  
     // Append candidates' textual data as a JSON string under a single key
     const candidatesTextData = candidates.map((c) => ({
@@ -191,11 +197,11 @@ function CreateElectionPage() {
             You will need it to tally the election results. This key will NOT be shown again.
           </p>
           <div>
-            <strong>Election Public RSA Key PEM:</strong>
+            <strong>Election Public Key PEM:</strong>
             <pre className="code-block">{generatedKeys.publicKeyPem}</pre>
           </div>
           <div style={{ marginTop: '10px' }}>
-            <strong>Election Private RSA Key PEM (SAVE THIS!):</strong>
+            <strong>Election Private Key PEM (SAVE THIS!):</strong>
             <pre className="code-block">{generatedKeys.privateKeyPem}</pre>
           </div>
           <p className="mt-2">Once you have saved the private key, you can proceed to manage elections.</p>
@@ -266,6 +272,44 @@ function CreateElectionPage() {
                 Activate Election Immediately?
               </label>
             </div>
+            <div className="form-group">
+              <label htmlFor="encryption_scheme">Ballot Encryption:</label>
+              <select
+                id="encryption_scheme"
+                value={encryptionScheme}
+                onChange={(e) => setEncryptionScheme(e.target.value)}
+              >
+                <option value="rsa-aes-gcm">RSA-OAEP + AES-GCM (decrypt every ballot)</option>
+                <option value="ec-elgamal-p256">
+                  Exponential ElGamal on P-256 (one decryption per candidate)
+                </option>
+                <option value="x25519-aes-gcm">X25519 + AES-GCM (fast key generation and decryption)</option>
+              </select>
+            </div>
+            {encryptionScheme !== "ec-elgamal-p256" && (
+              <>
+                <div className="form-group">
+                  <label className="checkbox-label">
+                    <input
+                      type="checkbox"
+                      checked={clientSideEncryption}
+                      onChange={(e) => setClientSideEncryption(e.target.checked)}
+                    />
+                    Encrypt ballots on voters' devices?
+                  </label>
+                </div>
+                <div className="form-group">
+                  <label className="checkbox-label">
+                    <input
+                      type="checkbox"
+                      checked={deferRevealChecks}
+                      onChange={(e) => setDeferRevealChecks(e.target.checked)}
+                    />
+                    Check votes against their commitments at tally time instead of when they are cast?
+                  </label>
+                </div>
+              </>
+            )}
           </div>
  
           <hr style={{ margin: "30px 0" }} />
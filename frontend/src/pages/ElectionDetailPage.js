@@ -3,6 +3,7 @@ import { useParams, useNavigate } from "react-router-dom";
 import apiClient from "../services/api";
 // import jwt_decode from "jwt-decode"; // Not strictly needed if backend derives user from token
 import authService from "../services/authService";
+import { encryptBallot } from "../services/ballotEncryption";
 import Modal from "../components/Modal"; // Your Modal component
 import "./ElectionDetailPage.css"; // Ensure this CSS file is created and imported
 
@@ -21,6 +22,7 @@ function ElectionDetailPage() {
   const [loading, setLoading] = useState(true);
   const navigate = useNavigate();
   const [currentNonce, setCurrentNonce] = useState("");
+  const [encryptedBallot, setEncryptedBallot] = useState(""); // Set when the election uses client-side encryption
   const [commitmentMade, setCommitmentMade] = useState(false);
   const [isCommitting, setIsCommitting] = useState(false);
   const [isCastingVote, setIsCastingVote] = useState(false);
@@ -71,11 +73,16 @@ function ElectionDetailPage() {
     setCurrentNonce(nonce); // Store nonce for the reveal step
 
     try {
-      await apiClient.post("/vote/commit/", {
-        election_id: parseInt(electionId),
-        candidate_id: parseInt(selectedCandidateId),
-        nonce: nonce,
-      });
+      const commitment = { election_id: parseInt(electionId), nonce: nonce };
+      if (election.client_side_encryption) {
+        // Encrypt on this device; the commitment covers the ballot's digest instead of the candidate
+        const ballot = await encryptBallot(election, parseInt(selectedCandidateId));
+        setEncryptedBallot(ballot.encryptedBallot);
+        commitment.ballot_sha256 = ballot.ballotSha256;
+      } else {
+        commitment.candidate_id = parseInt(selectedCandidateId);
+      }
+      await apiClient.post("/vote/commit/", commitment);
       setMessage(
         "Your vote choice has been securely committed. Please proceed to cast your final vote."
       );
@@ -88,6 +95,7 @@ function ElectionDetailPage() {
           "Failed to commit your vote choice."
       );
       setCurrentNonce(""); // Clear nonce on error
+      setEncryptedBallot("");
     } finally {
       setIsCommitting(false);
     }
@@ -130,7 +138,9 @@ function ElectionDetailPage() {
       await apiClient.post("vote/", {
         // This is the "reveal" and encrypt endpoint
         election_id: parseInt(electionId),
-        candidate_id: parseInt(selectedCandidateId),
+        ...(election.client_side_encryption
+          ? { encrypted_ballot: encryptedBallot } // Already encrypted on this device
+          : { candidate_id: parseInt(selectedCandidateId) }),
         nonce: currentNonce, // <<< SEND THE NONCE
       });
       setMessage(
@@ -138,6 +148,7 @@ function ElectionDetailPage() {
       );
       setCommitmentMade(false); // Reset for safety, though user can't vote again
       setCurrentNonce(""); // Clear nonce
+      setEncryptedBallot("");
       // setSelectedCandidateId(''); // Optionally clear selection
     } catch (err) {
       console.error(
@@ -208,7 +219,14 @@ function ElectionDetailPage() {
         </p>
       )}
 
+      {election.has_voted && !message && (
+        <p className="success-message mt-2">
+          You have already voted in this election.
+        </p>
+      )}
+
       {election.is_open_for_voting &&
+        !election.has_voted &&
         !(message && message.includes("Vote cast successfully!")) && (
           // If using the simpler button structure where form onSubmit is only for reveal:
           <form onSubmit={handleVoteAttempt} className="mt-3 voting-form">
@@ -3,9 +3,23 @@ import { Link } from "react-router-dom"; // Keep Link for navigation
 import apiClient from "../services/api";
 import Modal from "../components/Modal"; // Import your Modal component
 
+// Only what the list and the details modal show: no candidates or election keys
+const ELECTION_LIST_FIELDS =
+  "id,name,description,start_time,end_time,is_open_for_voting";
+
+// Values of the list's ?status= filter, applied by the server ("" lists every election)
+const ELECTION_STATUS_OPTIONS = [
+  { value: "", label: "All elections" },
+  { value: "open", label: "Open for voting" },
+  { value: "upcoming", label: "Upcoming" },
+  { value: "closed", label: "Closed" },
+];
+
 function ElectionListPage() {
   // State for fetched data
-  const [allElections, setAllElections] = useState([]); // Stores the original full list
+  const [allElections, setAllElections] = useState([]); // Elections of the pages loaded so far
+  const [nextPageUrl, setNextPageUrl] = useState(null); // Cursor link to the next page, if any
+  const [loadingMore, setLoadingMore] = useState(false);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState("");
 
@@ -17,14 +31,20 @@ function ElectionListPage() {
   // State for Search and Sort
   const [searchTerm, setSearchTerm] = useState("");
   const [sortBy, setSortBy] = useState("name_asc"); // Default sort: name ascending
+  const [statusFilter, setStatusFilter] = useState("");
 
   useEffect(() => {
     const fetchElections = async () => {
       setLoading(true);
       setError(""); // Clear previous errors
       try {
-        const response = await apiClient.get("elections/");
+        const params = { fields: ELECTION_LIST_FIELDS };
+        if (statusFilter) {
+          params.status = statusFilter; // Filtered by the server, so every page holds matching elections
+        }
+        const response = await apiClient.get("elections/", { params });
         setAllElections(response.data.results || response.data); // Handle DRF pagination
+        setNextPageUrl(response.data.next || null);
       } catch (err) {
         setError("Failed to fetch elections. Please try again later.");
         console.error("Fetch election list error:", err);
@@ -34,7 +54,21 @@ function ElectionListPage() {
       }
     };
     fetchElections();
-  }, []); // Empty dependency array: fetch only once on mount
+  }, [statusFilter]); // Fetch from the first page again whenever the status filter changes
+
+  const handleLoadMore = async () => {
+    setLoadingMore(true);
+    try {
+      const response = await apiClient.get(nextPageUrl); // The cursor link keeps the fields= and status= options
+      setAllElections((loaded) => [...loaded, ...response.data.results]);
+      setNextPageUrl(response.data.next || null);
+    } catch (err) {
+      setError("Failed to fetch elections. Please try again later.");
+      console.error("Fetch election list page error:", err);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
 
   // Memoized derived state for displayed elections (filtered and sorted)
   const displayedElections = useMemo(() => {
@@ -128,11 +162,27 @@ function ElectionListPage() {
           onChange={(e) => setSearchTerm(e.target.value)}
           style={{
             padding: "10px",
-            width: "60%",
+            width: "40%",
             borderRadius: "4px",
             border: "1px solid #ccc",
           }}
         />
+        <select
+          value={statusFilter}
+          onChange={(e) => setStatusFilter(e.target.value)}
+          style={{
+            padding: "10px",
+            borderRadius: "4px",
+            border: "1px solid #ccc",
+            minWidth: "160px",
+          }}
+        >
+          {ELECTION_STATUS_OPTIONS.map((option) => (
+            <option key={option.value} value={option.value}>
+              {option.label}
+            </option>
+          ))}
+        </select>
         <select
           value={sortBy}
           onChange={(e) => setSortBy(e.target.value)}
@@ -154,7 +204,7 @@ function ElectionListPage() {
       {/* Elections List */}
       {displayedElections.length === 0 ? (
         <p className="text-center mt-3">
-          {searchTerm
+          {searchTerm || statusFilter
             ? "No elections match your search criteria."
             : "No elections are currently available."}
         </p>
@@ -198,6 +248,17 @@ function ElectionListPage() {
           ))}
         </div>
       )}
+      {nextPageUrl && (
+        <div className="text-center mt-3">
+          <button
+            onClick={handleLoadMore}
+            className="button-secondary"
+            disabled={loadingMore}
+          >
+            {loadingMore ? "Loading..." : "Load more elections"}
+          </button>
+        </div>
+      )}
       {/* Election Details Modal */}
       {selectedElectionForDetails && (
         <Modal
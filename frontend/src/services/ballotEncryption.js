@@ -0,0 +1,106 @@
+// Encrypts ballots in the browser for elections with client_side_encryption,
+// producing the same binary format the server writes (backend/e_voting/ballot_format.py):
+//   version(1) | scheme code(1) | key id(8) | IV length(1) | tag length(1) | wrapped key length(2, BE)
+//   | wrapped key (RSA-OAEP) or ephemeral X25519 public key | IV | GCM tag | AES-GCM ciphertext
+const BALLOT_FORMAT_VERSION = 1;
+const SCHEME_CODES = { "rsa-aes-gcm": 1, "x25519-aes-gcm": 3 };
+const X25519_HKDF_INFO = new TextEncoder().encode("e-voting ballot x25519-aes-gcm v1");
+const TAG_LENGTH = 16;
+
+const subtle = () => window.crypto.subtle;
+
+const concatBytes = (...parts) => {
+  const out = new Uint8Array(parts.reduce((total, part) => total + part.length, 0));
+  let offset = 0;
+  for (const part of parts) {
+    out.set(part, offset);
+    offset += part.length;
+  }
+  return out;
+};
+
+const pemToDer = (pem) => {
+  const body = pem.replace(/-----[^-]+-----/g, "").replace(/\s+/g, "");
+  return Uint8Array.from(atob(body), (c) => c.charCodeAt(0));
+};
+
+const toBase64 = (bytes) => btoa(String.fromCharCode(...bytes));
+
+const toHex = (bytes) => Array.from(bytes, (b) => b.toString(16).padStart(2, "0")).join("");
+
+// AES-GCM via WebCrypto returns ciphertext || tag; the ballot format stores them separately
+const aesGcmEncrypt = async (rawKey, iv, plaintext) => {
+  const key = await subtle().importKey("raw", rawKey, "AES-GCM", false, ["encrypt"]);
+  const sealed = new Uint8Array(await subtle().encrypt({ name: "AES-GCM", iv }, key, plaintext));
+  return {
+    ciphertext: sealed.slice(0, sealed.length - TAG_LENGTH),
+    tag: sealed.slice(sealed.length - TAG_LENGTH),
+  };
+};
+
+const wrapKeyRsa = async (spki, aesKey) => {
+  const publicKey = await subtle().importKey("spki", spki, { name: "RSA-OAEP", hash: "SHA-256" }, false, ["encrypt"]);
+  return new Uint8Array(await subtle().encrypt({ name: "RSA-OAEP" }, publicKey, aesKey));
+};
+
+// Ephemeral X25519 exchange + HKDF-SHA256, matching CryptoUtils.encrypt_vote_x25519
+const deriveKeyX25519 = async (spki) => {
+  const recipientKey = await subtle().importKey("spki", spki, { name: "X25519" }, true, []);
+  const recipientRaw = new Uint8Array(await subtle().exportKey("raw", recipientKey));
+  const ephemeral = await subtle().generateKey({ name: "X25519" }, true, ["deriveBits"]);
+  const ephemeralRaw = new Uint8Array(await subtle().exportKey("raw", ephemeral.publicKey));
+  const sharedSecret = await subtle().deriveBits({ name: "X25519", public: recipientKey }, ephemeral.privateKey, 256);
+  const hkdfKey = await subtle().importKey("raw", sharedSecret, "HKDF", false, ["deriveBits"]);
+  const aesKey = await subtle().deriveBits(
+    {
+      name: "HKDF",
+      hash: "SHA-256",
+      salt: new Uint8Array(0),
+      info: concatBytes(X25519_HKDF_INFO, ephemeralRaw, recipientRaw),
+    },
+    hkdfKey,
+    256
+  );
+  return { aesKey: new Uint8Array(aesKey), keyField: ephemeralRaw };
+};
+
+/**
+ * Encrypt a vote for an election (as returned by the elections API).
+ * Returns { encryptedBallot, ballotSha256 }: the base64 ballot sent when revealing
+ * and the hex digest the commitment covers.
+ */
+export async function encryptBallot(election, candidateId) {
+  const schemeCode = SCHEME_CODES[election.encryption_scheme];
+  if (!schemeCode) {
+    throw new Error(`Ballots for scheme '${election.encryption_scheme}' cannot be encrypted in the browser.`);
+  }
+  const spki = pemToDer(election.rsa_public_key_pem);
+  const keyId = new Uint8Array(await subtle().digest("SHA-256", spki)).slice(0, 8);
+
+  let aesKey;
+  let keyField;
+  if (election.encryption_scheme === "x25519-aes-gcm") {
+    ({ aesKey, keyField } = await deriveKeyX25519(spki));
+  } else {
+    aesKey = window.crypto.getRandomValues(new Uint8Array(32));
+    keyField = await wrapKeyRsa(spki, aesKey);
+  }
+
+  const iv = window.crypto.getRandomValues(new Uint8Array(12));
+  const plaintext = new TextEncoder().encode(JSON.stringify({ candidate_id: candidateId, election_id: election.id }));
+  const { ciphertext, tag } = await aesGcmEncrypt(aesKey, iv, plaintext);
+
+  const header = new Uint8Array(14);
+  header[0] = BALLOT_FORMAT_VERSION;
+  header[1] = schemeCode;
+  header.set(keyId, 2);
+  header[10] = iv.length;
+  header[11] = tag.length;
+  new DataView(header.buffer).setUint16(12, keyField.length);
+
+  const ballot = concatBytes(header, keyField, iv, tag, ciphertext);
+  return {
+    encryptedBallot: toBase64(ballot),
+    ballotSha256: toHex(new Uint8Array(await subtle().digest("SHA-256", ballot))),
+  };
+}